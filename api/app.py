@@ -1,62 +1,1076 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from pathlib import Path
+import asyncio
+import hmac
+import json
+import time
+from typing import List, Optional
+
 import numpy as np
-import cv2
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import logging
 
-app = FastAPI()
+from .batching import MicroBatcher
+from .inference import InferenceEngine
+from .metrics import ApiMetrics
+from .model_registry import ModelRegistry, ServedModel, read_selection, write_selection
+from .motion import MotionGate, frame_signature
+from .packed import MEDIA_TYPE as PACKED_MEDIA_TYPE, accepts_packed, pack_response
+from .preprocess import PreparedImage, TensorPool, prepare_image, probe_image_size
+from .profiling import SlowRequestProfiler
+from .qos import QosController
+from .report_images import KINDS as REPORT_IMAGE_KINDS, ReportImages
+from .result_cache import ResultCache, engine_fingerprint
+from .sessions import REPORT_CONFIRMED, REPORT_DISMISSED, SessionManager, iso
+from .settings import Settings
+from .streaming import Frame, FrameStream, StreamStats, compact_result
+from .tiling import TilingPolicy, postprocess_tiles, prepare_tiles
+from .workers import Overloaded, WorkerPool
+
 logger = logging.getLogger(__name__)
 
+SESSION_EVICTION_INTERVAL_SECONDS = 60
+MODEL_SELECTION_POLL_SECONDS = 5
+
+
+async def evict_idle_sessions():
+    while True:
+        await asyncio.sleep(SESSION_EVICTION_INTERVAL_SECONDS)
+        for session_id in app.state.sessions.evict_expired():
+            if app.state.motion_gate is not None:
+                app.state.motion_gate.forget(session_id)
+            if app.state.qos is not None:
+                app.state.qos.forget(session_id)
+
+
+async def build_model(path: Path) -> ServedModel:
+    """
+    Load, warm up and attach a micro-batcher to the model at `path`. Runs on the default executor,
+    not the inference one, so a model being swapped in never queues behind or delays live requests.
+    """
+    settings = app.state.settings
+    loop = asyncio.get_running_loop()
+    engine = await loop.run_in_executor(None, InferenceEngine.from_settings, replace(settings, model_path=path))
+    batch_sizes = (1, settings.batch_max_size) if settings.batching_enabled else (1,)
+    warmup_ms = await loop.run_in_executor(None, engine.warm_up, batch_sizes, settings.warmup_runs)
+
+    batcher = None
+    if settings.batching_enabled:
+        batcher = MicroBatcher(
+            engine.run,
+            max_batch_size=settings.batch_max_size,
+            max_wait_ms=settings.batch_max_wait_ms,
+            executor=app.state.workers.inference_executor,
+            on_batch=observe_batch_size("micro_batch"),
+        )
+        await batcher.start()
+    # Process-pool workers can't write into our memory, so only thread mode recycles input tensors.
+    tensor_pool = None
+    if app.state.workers.kind == "thread":
+        tensor_pool = TensorPool(engine.input_size, capacity=settings.max_pending_requests)
+    return ServedModel(path.name, engine, batcher, tensor_pool, load_ms=engine.load_ms, warmup_ms=warmup_ms)
+
+
+async def unload_model(model: ServedModel):
+    if model.batcher is not None:
+        await model.batcher.stop()
+
+
+def serve_model(model: ServedModel):
+    """Called by the registry as `model` becomes active; requests already running keep their own model."""
+    state = app.state
+    state.engine = model.engine
+    state.batcher = model.batcher
+
+
+async def load_model(app: FastAPI):
+    """
+    Build, warm and wire up the engine in the background so the worker answers /health while it
+    loads; /ready only turns 200 once the first real request won't pay any cold-start cost.
+    Then load the shadow candidate, if any, and follow MODEL_SELECTION_FILE.
+    """
+    settings = app.state.settings
+    models = app.state.models
+    startup = app.state.startup
+    selection_file = settings.model_selection_file
+    selected = read_selection(selection_file) if selection_file is not None else None
+    try:
+        path = settings.model_path
+        if selected is not None and selected[1].get("active"):
+            try:
+                path = models.resolve(selected[1]["active"])
+            except ValueError as e:
+                logger.warning("Ignoring %s: %s", selection_file, e)
+        if path is None:
+            raise FileNotFoundError("No ONNX model found (set MODEL_PATH or MODEL_DIR)")
+        model = await models.activate(path)
+        startup["model_load_ms"] = round(model.load_ms, 1)
+        startup["model_cache"] = model.engine.cache_status
+        startup["warmup_ms"] = round(model.warmup_ms, 1)
+        await app.state.workers.warm_up()
+    except Exception as e:
+        app.state.model_error = str(e)
+        logger.exception("Failed to load detection model: %s", e)
+        return
+
+    startup["ready_ms"] = round((time.perf_counter() - app.state.started_at) * 1000, 1)
+    logger.info("Ready in %.0f ms (model load %.0f ms, cache %s, warm-up %.0f ms)", startup["ready_ms"],
+                startup["model_load_ms"], startup["model_cache"], startup["warmup_ms"])
+
+    if settings.shadow_model and selected is None:
+        try:
+            await models.set_candidate(models.resolve(settings.shadow_model), settings.shadow_fraction)
+        except Exception as e:
+            logger.error("Could not load shadow model %s: %s", settings.shadow_model, e)
+    if selection_file is not None:
+        await follow_model_selection(selection_file, selected)
+
+
+async def follow_model_selection(path: Path, applied):
+    """Apply MODEL_SELECTION_FILE whenever it changes, so every worker serves what any one of them was told to."""
+    models = app.state.models
+    last_mtime = None
+    if applied is not None:
+        last_mtime = applied[0]
+        try:
+            await models.apply(applied[1])
+        except Exception as e:
+            logger.error("Could not apply %s: %s", path, e)
+    while True:
+        await asyncio.sleep(MODEL_SELECTION_POLL_SECONDS)
+        selected = read_selection(path)
+        if selected is None or selected[0] == last_mtime:
+            continue
+        last_mtime = selected[0]
+        try:
+            await models.apply(selected[1])
+        except Exception as e:
+            logger.error("Could not apply %s: %s", path, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The ONNX session and its thread pools are built once per worker, never per request.
+    settings = Settings.from_env()
+    app.state.settings = settings
+    app.state.started_at = time.perf_counter()
+    app.state.startup = {}
+    app.state.workers = WorkerPool.from_settings(settings)
+    app.state.engine = None
+    app.state.batcher = None
+    app.state.model_change = None
+    app.state.models = ModelRegistry(build_model, unload_model, model_dir=settings.model_dir, on_swap=serve_model,
+                                     shadow_max_in_flight=settings.shadow_max_in_flight)
+    app.state.motion_gate = MotionGate.from_settings(settings) if settings.motion_gating_enabled else None
+    app.state.sessions = SessionManager.from_settings(settings)
+    app.state.report_images = ReportImages.from_settings(settings) if settings.report_images_enabled else None
+    if app.state.report_images is not None:
+        await app.state.report_images.start()
+        app.state.sessions.on_evict = lambda session: app.state.report_images.release(session.frame_keys())
+    app.state.stream_stats = StreamStats()
+    # Utilization as admitted requests over admission capacity, shared by every session's QoS state.
+    app.state.qos = (QosController.from_settings(
+        settings, load=lambda: app.state.workers.in_flight / max(app.state.workers.max_pending, 1))
+        if settings.qos_enabled else None)
+    app.state.result_cache = ResultCache.from_settings(settings) if settings.result_cache_enabled else None
+    app.state.tiling = TilingPolicy.from_settings(settings)
+    app.state.metrics = ApiMetrics() if settings.metrics_enabled else None
+    if app.state.metrics is not None:
+        register_state_metrics(app.state.metrics)
+    app.state.profiler = SlowRequestProfiler.from_settings(settings)
+    if app.state.profiler is not None:
+        app.state.profiler.start()
+    app.state.model_error = None
+
+    loader = None
+    if settings.mock_inference:
+        logger.warning("MOCK_INFERENCE is enabled; /detect returns canned detections")
+    else:
+        loader = asyncio.create_task(load_model(app))
+
+    janitor = asyncio.create_task(evict_idle_sessions())
+
+    yield
+
+    janitor.cancel()
+    if loader is not None:
+        loader.cancel()
+    await app.state.models.close()
+    if app.state.result_cache is not None:
+        await app.state.result_cache.close()
+    if app.state.report_images is not None:
+        await app.state.report_images.stop()
+    if app.state.profiler is not None:
+        app.state.profiler.stop()
+    app.state.workers.shutdown()
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts and times every HTTP request by handler (the endpoint function's name, which keeps label
+    cardinality bounded) and hands slow ones to the sampling profiler. Plain ASGI rather than
+    BaseHTTPMiddleware, which would add a task and a stream copy per request.
+    """
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        metrics = getattr(app.state, "metrics", None)
+        profiler = getattr(app.state, "profiler", None)
+        if metrics is None and profiler is None:
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        if metrics is not None:
+            metrics.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            end = time.perf_counter()
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            if metrics is not None:
+                metrics.in_flight.dec()
+                metrics.requests.inc(handler, str(status))
+                metrics.request_duration.observe(end - start, handler)
+            if profiler is not None:
+                profiler.request_finished(handler, start, end)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def observe_batch_size(source: str):
+    """Callback feeding the batch-size histogram, or None when metrics are off."""
+    metrics = app.state.metrics
+    if metrics is None:
+        return None
+    return lambda size: metrics.batch_size.observe(size, source)
+
+
+def observe_stage(stage: str, ms: float):
+    if app.state.metrics is not None:
+        app.state.metrics.stage_duration.observe(ms / 1000.0, stage)
+
+
+def register_state_metrics(metrics: ApiMetrics):
+    """Expose counters other components already keep; they are read only when /metrics is scraped."""
+    state = app.state
+    r = metrics.registry
+    r.callback("hazard_model_ready", "1 once the model is loaded and warmed up (or mock mode).",
+               lambda: 1 if model_status() in ("loaded", "mock") else 0)
+    r.callback("hazard_admitted_requests", "Detection requests holding an admission slot.",
+               lambda: state.workers.in_flight)
+    r.callback("hazard_admission_rejected_total", "Requests rejected with 503 because the queue was full.",
+               lambda: state.workers.rejected, kind="counter")
+    r.callback("hazard_batcher_queue_depth", "Tensors waiting for the micro-batcher.",
+               lambda: state.batcher.stats()["queue_depth"] if state.batcher is not None else None)
+    r.callback("hazard_result_cache_lookups_total", "Result cache lookups by outcome.",
+               lambda: ({("hit",): state.result_cache.hits, ("miss",): state.result_cache.misses}
+                        if state.result_cache is not None else None),
+               kind="counter", labelnames=("result",))
+    r.callback("hazard_result_cache_entries", "Results held in this worker's cache.",
+               lambda: state.result_cache.stats()["entries"] if state.result_cache is not None else None)
+    r.callback("hazard_motion_gate_frames_total", "Frames checked by the motion gate, by outcome.",
+               lambda: ({("reused",): state.motion_gate.reused,
+                         ("inferred",): state.motion_gate.checked - state.motion_gate.reused}
+                        if state.motion_gate is not None else None),
+               kind="counter", labelnames=("result",))
+    r.callback("hazard_sessions_active", "Detection sessions that have not ended.",
+               lambda: state.sessions.stats()["active"])
+    r.callback("hazard_report_frames_total", "Report frames kept by reference, by outcome.",
+               lambda: ({("written",): state.report_images.written, ("dropped",): state.report_images.dropped}
+                        if state.report_images is not None else None),
+               kind="counter", labelnames=("outcome",))
+    r.callback("hazard_qos_sessions", "Sessions at each quality-of-service level.",
+               lambda: ({(level,): count for level, count in state.qos.stats()["sessions_by_level"].items()}
+                        if state.qos is not None else None),
+               labelnames=("level",))
+    r.callback("hazard_model_info", "The model being served, by file name and version (always 1).",
+               lambda: ({(state.models.active.name, state.models.active.version): 1}
+                        if state.models.active is not None else None),
+               labelnames=("name", "version"))
+    r.callback("hazard_model_swaps_total", "Models swapped in, including the one loaded at startup.",
+               lambda: state.models.swaps, kind="counter")
+    r.callback("hazard_shadow_frames_total", "Frames replayed on the shadowed candidate model.",
+               lambda: state.models.shadow.frames if state.models.candidate is not None else None, kind="counter")
+    r.callback("hazard_shadow_agreement", "Mean detection agreement (F1) between the candidate and the active model.",
+               lambda: (state.models.shadow.stats()["agreement"] if state.models.candidate is not None else None))
+    r.callback("hazard_streams_active", "Open WebSocket detection streams.",
+               lambda: state.stream_stats.stats()["active"])
+    r.callback("hazard_stream_frames_total", "WebSocket stream frames by outcome.",
+               lambda: {(outcome,): value for outcome, value in state.stream_stats.stats().items()
+                        if outcome in ("processed", "dropped")},
+               kind="counter", labelnames=("outcome",))
+
+
+def model_status() -> str:
+    if app.state.settings.mock_inference:
+        return "mock"
+    if app.state.model_error is not None:
+        return f"error: {app.state.model_error}"
+    if app.state.engine is None:
+        return "loading"
+    return "loaded"
+
+
+def mock_detections():
+    return [
+        {
+            "box": [100, 150, 250, 300],  # [x1, y1, x2, y2]
+            "label": "pothole",
+            "score": 0.92,
+            "class_id": 1
+        },
+        {
+            "box": [400, 200, 450, 480],  # [x1, y1, x2, y2]
+            "label": "crack",
+            "score": 0.85,
+            "class_id": 0
+        }
+    ]
+
+
+async def run_detection(model: ServedModel, prepared: PreparedImage):
+    """Run the model on a prepared image, through its micro-batcher when batching is enabled."""
+    pool = app.state.workers
+    engine = model.engine
+    timings = {"decode": prepared.decode_ms, "preprocess": prepared.preprocess_ms}
+
+    batcher = model.batcher
+    if batcher is not None:
+        result = await batcher.submit(prepared.tensor)
+        rows = result.rows
+        timings["queue_wait"] = result.queue_wait_ms
+        timings["inference"] = result.inference_ms
+    else:
+        inference_start = time.perf_counter()
+        rows = (await pool.run_inference(engine.run, prepared.tensor[None]))[0]
+        timings["inference"] = (time.perf_counter() - inference_start) * 1000
+
+    postprocess_start = time.perf_counter()
+    detections = await pool.run_local(
+        engine.postprocess, rows, prepared.params, prepared.width, prepared.height
+    )
+    timings["postprocess"] = (time.perf_counter() - postprocess_start) * 1000
+    return detections, timings
+
+
+def shadow_inference(engine: InferenceEngine, file_bytes: bytes):
+    prepared = prepare_image(file_bytes, engine.input_size)
+    if prepared is None:
+        raise ValueError("Invalid image data")
+    inference_start = time.perf_counter()
+    rows = engine.run(prepared.tensor[None])[0]
+    inference_ms = (time.perf_counter() - inference_start) * 1000
+    return engine.postprocess(rows, prepared.params, prepared.width, prepared.height), inference_ms
+
+
+async def shadow_detection(candidate: ServedModel, file_bytes: bytes):
+    """
+    A shadowed frame on the candidate model: (detections, inference ms), bypassing every batcher and
+    cache. The whole frame runs on the worker pool's shadow thread, never on the executors serving
+    live requests, so shadowing does not delay them beyond sharing the CPU.
+    """
+    return await app.state.workers.run_shadow(shadow_inference, candidate.engine, file_bytes)
+
+
+async def run_tiled_detection(engine: InferenceEngine, file_bytes: bytes, policy: TilingPolicy):
+    """
+    Sliced inference (api/tiling.py): the whole frame and its tiles go to the model as one batch,
+    bypassing the micro-batcher. Returns (detections, width, height, tile count, timings), or None
+    when the bytes are not a decodable image.
+    """
+    pool = app.state.workers
+    tiles = await pool.run(prepare_tiles, file_bytes, engine.input_size, policy)
+    if tiles is None:
+        return None
+    timings = {"decode": tiles.decode_ms, "preprocess": tiles.preprocess_ms}
+
+    inference_start = time.perf_counter()
+    rows = await pool.run_inference(engine.run, tiles.tensors)
+    timings["inference"] = (time.perf_counter() - inference_start) * 1000
+    observer = observe_batch_size("tiles")
+    if observer is not None:
+        observer(len(tiles.windows))
+
+    postprocess_start = time.perf_counter()
+    detections = await pool.run_local(postprocess_tiles, engine, rows, tiles, policy)
+    timings["postprocess"] = (time.perf_counter() - postprocess_start) * 1000
+    return detections, tiles.width, tiles.height, len(tiles.windows) - 1, timings
+
+
+def tiling_policy(mode: Optional[str]) -> TilingPolicy:
+    """The configured tiling policy with the request's `tiling` query parameter applied."""
+    try:
+        return app.state.tiling.with_mode(mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def detection_response(detections, width, height, timings, request_start, reused=False, session=None, tiles=0,
+                       frame_bytes=None, model_version=None, cached=False):
+    """
+    The InferenceResponse contract shared by /detect/{session_id} and each /detect-batch entry.
+    `model_version` identifies the weights that served it (the "mock" model with MOCK_INFERENCE).
+    `reused` marks a motion-gated repeat of the session's previous frame, which the session does not
+    count again; `cached` marks a result-cache hit, which is a new frame for the session like any other.
+    With a session, the frame is folded into its tracker and the response carries any reports it
+    created plus the session's running stats. A frame that creates reports is kept by reference
+    for their image endpoints; reports never carry the image itself. Session responses also carry
+    the QoS hint for the client's next frame (api/qos.py).
+    """
+    response = {
+        "detections": detections,
+        "original_image_size": {"width": width, "height": height},
+        "detections_count": len(detections),
+        "processing_time": round((time.perf_counter() - request_start) * 1000, 2),  # ms
+        "timings": {stage: round(ms, 2) for stage, ms in timings.items()},
+        "reused": reused or cached,  # True when motion gating or the result cache supplied the detections
+        "has_new_reports": False,
+        "has_session_stats": False
+    }
+    if model_version is not None:
+        response["model_version"] = model_version
+    if app.state.metrics is not None:
+        app.state.metrics.observe_stages(timings)
+    if tiles:
+        response["tiles"] = tiles  # sliced inference ran on this many tiles plus the whole frame
+    if session is not None:
+        new_reports = session.record_frame(detections, reused=reused)
+        if new_reports and frame_bytes is not None and app.state.report_images is not None:
+            frame_key = app.state.report_images.keep_frame(frame_bytes, references=len(new_reports))
+            for report in new_reports:
+                report.frame_key = frame_key
+                report.frame_box = list(report.box)
+        response["has_new_reports"] = bool(new_reports)
+        response["new_reports"] = [report.to_dict() for report in new_reports]
+        response["has_session_stats"] = True
+        response["session_stats"] = session.stats()
+        if app.state.qos is not None:
+            response["qos"] = app.state.qos.advise(session.session_id, response["processing_time"])
+    return response
+
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    """Liveness: the process is up, whether or not the model is ready."""
+    return {"status": "ok", "model_status": model_status()}
 
-@app.post("/detect/{session_id}")
-async def detect(session_id: str, file: UploadFile = File(...)):
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness for the load balancer: 200 only once the model is loaded and warmed up."""
+    status = model_status()
+    ready = status in ("loaded", "mock")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "model_status": status,
+                 "startup": app.state.startup},
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, per-stage latency, batching, cache and stream metrics."""
+    if app.state.metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=0)")
+    return PlainTextResponse(app.state.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def stats():
+    batcher = app.state.batcher
+    return {
+        "batching": batcher.stats() if batcher is not None else None,
+        "workers": app.state.workers.stats(),
+        "motion_gate": app.state.motion_gate.stats() if app.state.motion_gate is not None else None,
+        "sessions": app.state.sessions.stats(),
+        "streams": app.state.stream_stats.stats(),
+        "result_cache": app.state.result_cache.stats() if app.state.result_cache is not None else None,
+        "qos": app.state.qos.stats() if app.state.qos is not None else None,
+        "report_images": app.state.report_images.stats() if app.state.report_images is not None else None,
+        "models": app.state.models.stats(),
+        "startup": app.state.startup,
+    }
+
+
+def require_model_admin(authorization: Optional[str]):
+    token = app.state.settings.model_admin_token
+    if token is None:
+        raise HTTPException(status_code=403, detail="Model management is disabled (MODEL_ADMIN_TOKEN is not set)")
+    scheme, _, supplied = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid model admin token")
+
+
+def change_models(selection: dict, apply_locally):
     """
-    This is a mock detection endpoint.
-    It simulates running an ML model and returns a hardcoded, but contract-compliant,
-    InferenceResponse. This is crucial for unblocking client-side development.
+    Start a model change in the background. With MODEL_SELECTION_FILE the new selection is only
+    written there, and every worker (this one included) applies it on its next poll; otherwise
+    `apply_locally()` changes this worker's registry.
     """
+    change = app.state.model_change
+    if app.state.models.loading is not None or (change is not None and not change.done()):
+        raise HTTPException(status_code=409, detail="Another model is still loading")
+    path = app.state.settings.model_selection_file
+    if path is not None:
+        write_selection(path, selection)
+        return {"message": "Model selection updated", "selection": selection,
+                "applies_within_s": MODEL_SELECTION_POLL_SECONDS}
+
+    async def run():
+        try:
+            await apply_locally()
+        except Exception as e:
+            logger.error("Model change to %s failed: %s", selection, e)
+
+    app.state.model_change = asyncio.create_task(run())
+    return {"message": "Model change started", "selection": selection}
+
+
+def resolve_model_or_404(name: str) -> Path:
     try:
-        # We still read the file to simulate work and ensure the request is valid.
-        file_bytes = await file.read()
-        if not file_bytes:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        return app.state.models.resolve(name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-        # Simulate image processing
-        np_array = np.frombuffer(file_bytes, np.uint8)
-        image = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        if image is None:
+
+@app.get("/models")
+async def list_models():
+    """The active model, the shadowed candidate with its comparison so far, and the models that can be loaded."""
+    return app.state.models.stats()
+
+
+@app.post("/models/{name}/activate", status_code=202)
+async def activate_model(name: str, authorization: Optional[str] = Header(None)):
+    """
+    Load and warm up a model from the model directory, then swap it in; the current model serves
+    until the swap. A model that is being shadowed is already warm and swaps in immediately.
+    Poll GET /models for the outcome.
+    """
+    require_model_admin(authorization)
+    path = resolve_model_or_404(name)
+    models = app.state.models
+    selection = {**models.selection(), "active": name}
+    if selection["candidate"] == name:
+        selection.update(candidate=None, shadow_fraction=0.0)
+    return change_models(selection, lambda: models.activate(path))
+
+
+@app.post("/models/{name}/shadow", status_code=202)
+async def shadow_model(name: str, fraction: float = 0.1, authorization: Optional[str] = Header(None)):
+    """Load a candidate beside the active model and replay `fraction` of live frames on it in the background."""
+    require_model_admin(authorization)
+    if not 0 < fraction <= 1:
+        raise HTTPException(status_code=400, detail="fraction must be in (0, 1]")
+    path = resolve_model_or_404(name)
+    models = app.state.models
+    selection = {**models.selection(), "candidate": name, "shadow_fraction": fraction}
+    if models.candidate is not None and models.candidate.name == name:
+        async def apply_locally():
+            models.shadow_fraction = fraction
+    else:
+        async def apply_locally():
+            await models.set_candidate(path, fraction)
+    return change_models(selection, apply_locally)
+
+
+@app.post("/models/candidate/promote", status_code=202)
+async def promote_candidate(authorization: Optional[str] = Header(None)):
+    """Swap the (already warm) shadowed candidate in as the active model."""
+    require_model_admin(authorization)
+    models = app.state.models
+    if models.candidate is None:
+        raise HTTPException(status_code=404, detail="No candidate model loaded")
+    selection = {"active": models.candidate.name, "candidate": None, "shadow_fraction": 0.0}
+    return change_models(selection, models.promote)
+
+
+@app.delete("/models/candidate")
+async def drop_candidate(authorization: Optional[str] = Header(None)):
+    require_model_admin(authorization)
+    models = app.state.models
+    selection = {**models.selection(), "candidate": None, "shadow_fraction": 0.0}
+    if app.state.settings.model_selection_file is not None:
+        write_selection(app.state.settings.model_selection_file, selection)
+    else:
+        models.drop_candidate()
+    return {"message": "Candidate dropped", "selection": selection}
+
+
+def require_single_worker():
+    """
+    Sessions (tracker, motion gate, QoS, report images) live in this process's memory, and with
+    api.serve --workers > 1 the next request for a session can reach any worker, so refuse them.
+    """
+    workers = app.state.settings.serve_workers
+    if workers > 1:
+        raise HTTPException(status_code=501, detail=f"Sessions need a single worker process; this instance "
+                                                    f"runs {workers} (use /detect-batch, or api.serve --workers 1)")
+
+
+def get_session_or_404(session_id: str):
+    require_single_worker()
+    session = app.state.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+@app.post("/session/start")
+async def start_session():
+    require_single_worker()
+    session = app.state.sessions.start()
+    return {"session_id": session.session_id, "started_at": iso(session.created_at)}
+
+
+@app.get("/session/{session_id}/summary")
+async def session_summary(session_id: str):
+    return get_session_or_404(session_id).summary()
+
+
+@app.post("/session/{session_id}/end")
+async def end_session(session_id: str):
+    require_single_worker()
+    session = app.state.sessions.end(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if app.state.motion_gate is not None:
+        app.state.motion_gate.forget(session_id)
+    if app.state.qos is not None:
+        app.state.qos.forget(session_id)
+    return {"message": "Session ended", **session.summary()}
+
+
+def report_caption(report) -> str:
+    return f"{report.hazard_type} {report.confidence:.0%}"
+
+
+def update_report_status(session_id: str, report_id: str, status: str):
+    report = get_session_or_404(session_id).set_report_status(report_id, status)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    images = app.state.report_images
+    if status == REPORT_CONFIRMED and report.image_key is None and report.frame_key and images is not None:
+        # A confirmed report gets stored by the web server; keep its images past this session.
+        report.image_key = images.save_view(report.frame_key, report.report_id, report.frame_box,
+                                            report_caption(report))
+    return {"message": f"Report {status}", "report": report.to_dict()}
+
+
+@app.post("/session/{session_id}/report/{report_id}/confirm")
+async def confirm_report(session_id: str, report_id: str):
+    return update_report_status(session_id, report_id, REPORT_CONFIRMED)
+
+
+@app.post("/session/{session_id}/report/{report_id}/dismiss")
+async def dismiss_report(session_id: str, report_id: str):
+    return update_report_status(session_id, report_id, REPORT_DISMISSED)
+
+
+@app.get("/session/{session_id}/report/{report_id}/{kind}")
+async def report_image(session_id: str, report_id: str, kind: str):
+    """
+    The frame a report was created from as JPEG: `image` (as uploaded), `plot` (with the report's
+    box drawn) or `thumbnail` (a small plot for dashboards). Rendered on first request, then cached.
+    """
+    if kind not in REPORT_IMAGE_KINDS:
+        raise HTTPException(status_code=404, detail="Not found")
+    report = get_session_or_404(session_id).reports.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    images = app.state.report_images
+    data = None
+    if images is not None and report.frame_key is not None:
+        data = await images.view(kind, report.frame_key, report.frame_box, report_caption(report),
+                                 app.state.workers.run, report.report_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Report image not available")
+    # A report's frame never changes, so clients and proxies may keep it.
+    return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+
+@app.get("/report-images/{frame_key}/{report_id}/{kind}")
+async def saved_report_image(frame_key: str, report_id: str, kind: str):
+    """
+    A confirmed report's `image`, `plot` or `thumbnail` by its `image_key` (frame key / report id).
+    Unlike the session route it keeps working after the session is evicted or the API restarts,
+    so this is what stored reports link to.
+    """
+    images = app.state.report_images
+    data = None
+    if kind in REPORT_IMAGE_KINDS and images is not None:
+        data = await images.saved_view(kind, f"{frame_key}/{report_id}", app.state.workers.run)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Report image not available")
+    return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+
+async def process_frame(session_id: str, file_bytes: bytes, request_start: float,
+                        tiling: Optional[TilingPolicy] = None) -> dict:
+    """
+    Run one camera frame through motion gating, the model and the session tracker.
+    Shared by POST /detect/{session_id} and the /ws/{session_id} stream; callers hold an admission slot.
+    """
+    models = app.state.models
+    if models.active is None and not app.state.settings.mock_inference:
+        raise HTTPException(status_code=503, detail="Detection model not loaded")
+    # The frame runs start to finish on the model active now, even if another is swapped in meanwhile.
+    with models.use() as model:
+        return await infer_frame(model, session_id, file_bytes, request_start, tiling or app.state.tiling)
+
+
+async def infer_frame(model: Optional[ServedModel], session_id: str, file_bytes: bytes, request_start: float,
+                      tiling: TilingPolicy) -> dict:
+    """process_frame() on a pinned model; None in mock mode."""
+    session = app.state.sessions.get_or_start(session_id)
+    workers = app.state.workers
+    if model is None:
+        decode_start = time.perf_counter()
+        size = await workers.run(probe_image_size, file_bytes)
+        timings = {"decode": (time.perf_counter() - decode_start) * 1000}
+        if size is None:
             logger.error("Invalid image data for session %s", session_id)
             raise HTTPException(status_code=400, detail="Invalid image data")
+        width, height = size
+        detections = mock_detections()
+        return detection_response(detections, width, height, timings, request_start, session=session,
+                                  frame_bytes=file_bytes, model_version="mock")
 
-        height, width, _ = image.shape
-
-        # MOCK RESPONSE: Create a hardcoded, but valid, response object.
-        mock_detections = [
-            {
-                "box": [100, 150, 250, 300],  # [x1, y1, x2, y2]
-                "label": "pothole",
-                "score": 0.92
-            },
-            {
-                "box": [400, 200, 450, 480],  # [x1, y1, x2, y2]
-                "label": "crack",
-                "score": 0.85
-            }
-        ]
+    engine = model.engine
 
-        return {
-            "detections": mock_detections,
-            "original_image_size": {"width": width, "height": height},
-            "detections_count": len(mock_detections),
-            "processing_time": 45.5, # ms
-            "has_new_reports": False,
-            "has_session_stats": False
-        }
+    # Byte-identical re-uploads (report retries, offline queue) skip decode and inference entirely.
+    result_cache = app.state.result_cache
+    cache_key = None
+    if result_cache is not None:
+        lookup_start = time.perf_counter()
+        cache_key = await result_cache.key_for(file_bytes, f"{engine_fingerprint(engine)}:{tiling.fingerprint}")
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            timings = {"cache": (time.perf_counter() - lookup_start) * 1000}
+            return detection_response(cached.detections, cached.width, cached.height, timings, request_start,
+                                      cached=True, session=session, frame_bytes=file_bytes,
+                                      model_version=model.version)
+
+    gate = app.state.motion_gate
+    signature = None
+    if gate is not None:
+        gate_start = time.perf_counter()
+        signature = await workers.run(frame_signature, file_bytes)
+        previous = gate.lookup(session_id, signature) if signature is not None else None
+        if previous is not None:
+            timings = {"gate": (time.perf_counter() - gate_start) * 1000}
+            return detection_response(previous.detections, previous.width, previous.height, timings, request_start,
+                                      reused=True, session=session, model_version=model.version)
+
+    tiles = 0
+    tensor_pool = model.tensor_pool
+    tensor = None
+    try:
+        if tiling.should_tile(file_bytes, engine.input_size):
+            tiled = await run_tiled_detection(engine, file_bytes, tiling)
+            if tiled is None:
+                logger.error("Invalid image data for session %s", session_id)
+                raise HTTPException(status_code=400, detail="Invalid image data")
+            detections, width, height, tiles, timings = tiled
+        else:
+            tensor = tensor_pool.acquire() if tensor_pool is not None else None
+            prepared = await workers.run(prepare_image, file_bytes, engine.input_size, tensor)
+            if prepared is None:
+                logger.error("Invalid image data for session %s", session_id)
+                raise HTTPException(status_code=400, detail="Invalid image data")
+            width, height = prepared.width, prepared.height
+            detections, timings = await run_detection(model, prepared)
+            app.state.models.shadow_frame(lambda candidate: shadow_detection(candidate, file_bytes),
+                                          detections, timings["inference"])
+        if signature is not None:
+            gate.update(session_id, signature, detections, width, height)
+        if cache_key is not None:
+            await result_cache.put(cache_key, detections, width, height)
+    finally:
+        if tensor is not None:
+            tensor_pool.release(tensor)
+
+    return detection_response(detections, width, height, timings, request_start, session=session, tiles=tiles,
+                              frame_bytes=file_bytes, model_version=model.version)
+
+
+@app.post("/detect/{session_id}")
+async def detect(session_id: str, request: Request, file: UploadFile = File(...), tiling: Optional[str] = None):
+    """
+    Run hazard detection on one uploaded frame.
+    Returns the InferenceResponse contract; with MOCK_INFERENCE set the detections are canned
+    so client-side development does not need a model. Clients sending
+    `Accept: application/x-hazard-detections` get the packed binary form (api/packed.py) instead.
+    `?tiling=off|auto|always` overrides TILING_MODE for high-resolution uploads (api/tiling.py).
+    The serving model's version is in `model_version` and the X-Model-Version header.
+    """
+    require_single_worker()
+    try:
+        request_start = time.perf_counter()
+        policy = tiling_policy(tiling)
+
+        with app.state.workers.admit():
+            file_bytes = await file.read()
+            observe_stage("read", (time.perf_counter() - request_start) * 1000)
+            if not file_bytes:
+                raise HTTPException(status_code=400, detail="Empty file uploaded")
+            response = await process_frame(session_id, file_bytes, request_start, policy)
 
-    except HTTPException:
+        serialize_start = time.perf_counter()
+        if accepts_packed(request.headers.get("accept")):
+            result = Response(content=pack_response(response), media_type=PACKED_MEDIA_TYPE)
+        else:
+            result = JSONResponse(content=response)  # rendered here, so the serialize stage is measurable
+        result.headers["X-Model-Version"] = response["model_version"]  # the packed form has no field for it
+        observe_stage("serialize", (time.perf_counter() - serialize_start) * 1000)
+        return result
+
+    except (HTTPException, Overloaded):
         raise
     except Exception as e:
         logger.exception("Unexpected error during detection for session %s: %s", session_id, e)
         raise HTTPException(status_code=500, detail="Failed to process image")
+
+
+@app.websocket("/ws/{session_id}")
+async def detection_stream(websocket: WebSocket, session_id: str, format: str = "json",
+                           tiling: Optional[str] = None):
+    """
+    Live detection channel for one session, without per-frame HTTP overhead.
+    The client sends each JPEG frame as a binary message; the server answers every processed frame
+    with a compact `result` message carrying the frame's 1-based sequence number. Several frames are
+    processed at once, and when the client outpaces the server only the newest waiting frame is
+    kept: skipped frames get a `dropped` message. Text message {"type": "ping"} gets a `pong`.
+    With `?format=packed`, results are sent as binary messages in the api/packed.py layout (the
+    frame number is in its header); dropped, error and pong messages stay JSON text.
+    `?tiling=` works as on POST /detect.
+    """
+    packed = format == "packed"
+    try:
+        require_single_worker()
+        policy = app.state.tiling.with_mode(tiling)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(message):
+        async with send_lock:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_json(message)
+
+    async def process(frame: Frame):
+        try:
+            with app.state.workers.admit():
+                if not frame.data:
+                    raise HTTPException(status_code=400, detail="Empty frame")
+                response = await process_frame(session_id, frame.data, frame.received_at, policy)
+            serialize_start = time.perf_counter()
+            if packed:
+                message = pack_response(response, frame.frame_id)
+            else:
+                message = compact_result(frame.frame_id, response)
+            observe_stage("serialize", (time.perf_counter() - serialize_start) * 1000)
+        except HTTPException as e:
+            message = {"type": "error", "frame_id": frame.frame_id, "status": e.status_code, "detail": e.detail}
+        except Overloaded as e:
+            message = {"type": "error", "frame_id": frame.frame_id, "status": 503, "detail": str(e),
+                       "retry_after": e.retry_after}
+        except Exception as e:
+            logger.exception("Unexpected error on stream frame %d for session %s: %s", frame.frame_id, session_id, e)
+            message = {"type": "error", "frame_id": frame.frame_id, "status": 500, "detail": "Failed to process image"}
+        if isinstance(message, dict):
+            message["dropped_frames"] = stream.dropped
+        try:
+            await send(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # client left while the frame was in flight; the receive loop tears the stream down
+
+    stream = FrameStream(process, max_in_flight=app.state.settings.stream_max_in_flight)
+    stream_stats = app.state.stream_stats
+    stream_stats.open(stream)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                stale = stream.push(message["bytes"])
+                if stale is not None:
+                    await send({"type": "dropped", "frame_id": stale.frame_id, "dropped_frames": stream.dropped})
+            elif message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if isinstance(control, dict) and control.get("type") == "ping":
+                    await send({"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await stream.close()
+        stream_stats.close(stream)
+
+
+async def mock_batch(files: List[UploadFile], request_start: float) -> dict:
+    """detect_batch() in mock mode: images are only probed for their size, detections are canned."""
+    workers = app.state.workers
+    with workers.admit():
+        payloads = await asyncio.gather(*(f.read() for f in files))
+        sizes = await asyncio.gather(*(
+            workers.run(probe_image_size, data) if data else asyncio.sleep(0) for data in payloads
+        ))
+
+    results = []
+    for upload, size in zip(files, sizes):
+        if size is None:
+            results.append({"filename": upload.filename, "error": "Invalid image data", "detections": []})
+            continue
+        entry = detection_response(mock_detections(), size[0], size[1], {}, request_start, model_version="mock")
+        entry["filename"] = upload.filename
+        results.append(entry)
+    return {
+        "results": results,
+        "count": len(results),
+        "batch_size": sum(size is not None for size in sizes),
+        "model_version": "mock",
+        "processing_time": round((time.perf_counter() - request_start) * 1000, 2),  # ms
+    }
+
+
+async def detect_chunk(model: ServedModel, payloads: List[bytes]):
+    """
+    One /detect-batch chunk as a single model call. Returns ((prepared image, detections) or None
+    for each undecodable payload, model-call ms). Input tensors come from the pinned model's pool.
+    """
+    workers = app.state.workers
+    engine = model.engine
+    pool = model.tensor_pool
+    tensors = [pool.acquire() if pool is not None else None for _ in payloads]
+    try:
+        prepared = await asyncio.gather(*(
+            workers.run(prepare_image, data, engine.input_size, tensor) for data, tensor in zip(payloads, tensors)
+        ))
+        valid = [item for item in prepared if item is not None]
+        if not valid:
+            return prepared, 0.0
+        inference_start = time.perf_counter()
+        rows = await workers.run_inference(engine.run, np.stack([item.tensor for item in valid]))
+        inference_ms = (time.perf_counter() - inference_start) * 1000
+    finally:
+        for tensor in tensors:
+            if tensor is not None:
+                pool.release(tensor)
+    observer = observe_batch_size("detect_batch")
+    if observer is not None:
+        observer(len(valid))
+
+    detections = iter(await workers.run_local(
+        engine.postprocess_batch, rows, [item.params for item in valid], [(item.width, item.height) for item in valid]
+    ))
+    return [(item, next(detections)) if item is not None else None for item in prepared], inference_ms
+
+
+@app.post("/detect-batch")
+async def detect_batch(files: List[UploadFile] = File(...), tiling: Optional[str] = None):
+    """
+    Run hazard detection on many uploaded images in one request.
+    Images go to the model in chunks of at most BATCH_MAX_SIZE, one model call each, so live
+    /detect batches interleave with a large upload instead of waiting behind it, and memory stays
+    bounded by the chunk. Each chunk is decoded in parallel into pooled input tensors, and takes one
+    admission slot, so an upload the server has no room for gets 503 rather than starving realtime
+    traffic. Each entry in `results` follows the /detect/{session_id} schema; undecodable images
+    get an `error` instead of failing the whole batch. Images that the tiling policy (`?tiling=`,
+    see POST /detect) slices run separately as their own tile batches.
+    """
+    try:
+        request_start = time.perf_counter()
+        policy = tiling_policy(tiling)
+        settings = app.state.settings
+        if len(files) > settings.max_batch_files:
+            raise HTTPException(
+                status_code=413, detail=f"Too many files (max {settings.max_batch_files} per batch)"
+            )
+
+        if app.state.models.active is None:
+            if not settings.mock_inference:
+                raise HTTPException(status_code=503, detail="Detection model not loaded")
+            return await mock_batch(files, request_start)
+
+        workers = app.state.workers
+        chunk_size = max(1, settings.batch_max_size)
+        with workers.admit(slots=-(-len(files) // chunk_size)), app.state.models.use() as model:
+            engine = model.engine
+            payloads = await asyncio.gather(*(f.read() for f in files))
+            sliced = [i for i, data in enumerate(payloads) if data and policy.should_tile(data, engine.input_size)]
+            batched = [i for i, data in enumerate(payloads) if data and i not in sliced]
+
+            detected = {}  # index -> (prepared image, detections, inference ms)
+            for start in range(0, len(batched), chunk_size):
+                chunk = batched[start:start + chunk_size]
+                found, inference_ms = await detect_chunk(model, [payloads[i] for i in chunk])
+                detected.update((i, (*item, inference_ms)) for i, item in zip(chunk, found) if item is not None)
+            tiled = {i: await run_tiled_detection(engine, payloads[i], policy) for i in sliced}
+
+        results = []
+        for i, upload in enumerate(files):
+            if tiled.get(i) is not None:
+                tile_detections, width, height, tiles, timings = tiled[i]
+                entry = detection_response(tile_detections, width, height, timings, request_start, tiles=tiles,
+                                           model_version=model.version)
+            elif i in detected:
+                item, detections, inference_ms = detected[i]
+                timings = {"decode": item.decode_ms, "preprocess": item.preprocess_ms, "inference": inference_ms}
+                entry = detection_response(detections, item.width, item.height, timings, request_start,
+                                           model_version=model.version)
+            else:
+                logger.error("Invalid image data in batch entry %d (%s)", i, upload.filename)
+                results.append({"filename": upload.filename, "error": "Invalid image data", "detections": []})
+                continue
+            entry["filename"] = upload.filename
+            results.append(entry)
+
+        return {
+            "results": results,
+            "count": len(results),
+            "batch_size": len(detected),
+            "model_version": model.version,
+            "processing_time": round((time.perf_counter() - request_start) * 1000, 2),  # ms
+        }
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error during batch detection: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to process images")
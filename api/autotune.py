@@ -0,0 +1,306 @@
+"""
+Empirical runtime tuning for the detection model.
+CPU flag strings say little about which runtime setup is actually fastest on a given container
+(shared vCPUs, cgroup CPU limits, cache sizes), so this times short inference trials on the machine
+that will serve: available execution providers and model variants, intra-/inter-op thread counts
+and batch sizes. The fastest measured configuration is written out as serving settings.
+
+The search is coordinate-wise to keep startup short: provider x variant with default threads,
+then threads for the winner, then batch size. The result is keyed by the CPU, onnxruntime build
+and model files (tuning_key), and later runs with the same key reuse it instead of measuring again.
+
+The intra-op thread count is written as AUTOTUNE_INTRA_OP_THREADS, not ORT_INTRA_OP_THREADS: it
+was measured for one process owning every core, so api.serve caps it at each worker's CPU slice,
+while an explicit ORT_INTRA_OP_THREADS still overrides both.
+
+    python -m api.autotune --objective throughput --output-dir .
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .inference import create_session
+from .model_cache import cpu_fingerprint, file_sha256
+from .settings import REPO_ROOT, Settings, resolve_model_path, variant_path
+
+logger = logging.getLogger(__name__)
+
+# CPU-side providers worth trying when the installed onnxruntime build ships them, best-known first.
+TUNABLE_PROVIDERS = ("OpenVINOExecutionProvider", "DnnlExecutionProvider", "CPUExecutionProvider")
+MODEL_VARIANTS = ("fp32", "opt", "int8-static", "int8-dynamic", "sim")
+OBJECTIVES = ("throughput", "latency")
+# Bumped whenever the written settings change meaning, so older cached results are measured again.
+CONFIG_FORMAT = 2
+
+
+@dataclass
+class Trial:
+    provider: str
+    variant: str
+    model_path: str
+    intra_op_threads: int
+    inter_op_threads: int
+    batch_size: int
+    latency_p50_ms: float = 0.0
+    latency_p95_ms: float = 0.0
+    throughput_ips: float = 0.0  # images per second
+    error: Optional[str] = None
+
+    def score(self, objective: str) -> float:
+        if self.error:
+            return float("-inf")
+        return self.throughput_ips if objective == "throughput" else -self.latency_p50_ms
+
+    def env(self) -> Dict[str, str]:
+        """Settings (api/settings.py) that reproduce this configuration."""
+        return {
+            "ORT_EXECUTION_PROVIDER": self.provider,
+            "MODEL_VARIANT": self.variant,
+            "AUTOTUNE_INTRA_OP_THREADS": str(self.intra_op_threads),
+            "ORT_INTER_OP_THREADS": str(self.inter_op_threads),
+            "BATCH_MAX_SIZE": str(self.batch_size),
+        }
+
+
+def available_providers() -> List[str]:
+    import onnxruntime as ort
+
+    installed = set(ort.get_available_providers())
+    return [p for p in TUNABLE_PROVIDERS if p in installed]
+
+
+def available_variants(base_model: Path) -> Dict[str, Path]:
+    variants = {"fp32": base_model}
+    for name in MODEL_VARIANTS[1:]:
+        path = variant_path(base_model, name)
+        if path.is_file():
+            variants[name] = path
+    return variants
+
+
+def cpu_budget() -> int:
+    """CPUs this process may use: the affinity mask honours cpusets, unlike os.cpu_count()."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def thread_counts(cpus: int) -> List[int]:
+    counts = {cpus}
+    n = 1
+    while n < cpus:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def run_trial(trial: Trial, input_size: int, trial_seconds: float, min_runs: int = 5) -> Trial:
+    """Time one configuration; failures (unsupported provider/op, static batch) are recorded, not raised."""
+    try:
+        session = create_session(Path(trial.model_path), trial.intra_op_threads, trial.inter_op_threads,
+                                 trial.provider)
+        model_input = session.get_inputs()[0]
+        shape = model_input.shape
+        fixed_batch = shape[0] if shape and isinstance(shape[0], int) else None
+        if fixed_batch and fixed_batch != trial.batch_size:
+            return replace(trial, error=f"model has a fixed batch size of {fixed_batch}")
+        size = shape[2] if len(shape) == 4 and isinstance(shape[2], int) else input_size
+
+        batch = np.random.default_rng(0).random((trial.batch_size, 3, size, size), dtype=np.float32)
+        feed = {model_input.name: batch}
+        session.run(None, feed)  # warm-up: first run allocates arenas and picks kernels
+
+        latencies = []
+        deadline = time.perf_counter() + trial_seconds
+        while len(latencies) < min_runs or time.perf_counter() < deadline:
+            start = time.perf_counter()
+            session.run(None, feed)
+            latencies.append((time.perf_counter() - start) * 1000)
+    except Exception as e:
+        return replace(trial, error=str(e).splitlines()[0][:200])
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    return replace(
+        trial,
+        latency_p50_ms=round(p50, 3),
+        latency_p95_ms=round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        throughput_ips=round(trial.batch_size * 1000 / p50, 2),
+    )
+
+
+def autotune(
+    base_model: Path,
+    input_size: int = 640,
+    objective: str = "throughput",
+    batch_sizes: Sequence[int] = (1, 2, 4, 8),
+    trial_seconds: float = 0.5,
+    budget_seconds: float = 120.0,
+    providers: Optional[Sequence[str]] = None,
+):
+    """Returns (best trial, all trials). Stops searching once `budget_seconds` is spent."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    started = time.perf_counter()
+    cpus = cpu_budget()
+    trials: List[Trial] = []
+
+    def measure(candidate: Trial) -> Trial:
+        result = run_trial(candidate, input_size, trial_seconds)
+        trials.append(result)
+        logger.info("%-28s %-12s intra=%-2d inter=%d batch=%-2d %s", result.provider, result.variant,
+                    result.intra_op_threads, result.inter_op_threads, result.batch_size,
+                    result.error or f"p50 {result.latency_p50_ms} ms, {result.throughput_ips} img/s")
+        return result
+
+    def best(candidates: List[Trial]) -> Trial:
+        return max(candidates, key=lambda t: t.score(objective))
+
+    def over_budget() -> bool:
+        return time.perf_counter() - started > budget_seconds
+
+    # 1. Provider x variant, all cores to one session, batch 1.
+    stage = []
+    for provider in providers or available_providers():
+        for variant, path in available_variants(base_model).items():
+            if stage and over_budget():
+                break
+            stage.append(measure(Trial(provider, variant, str(path), cpus, 1, 1)))
+    winner = best(stage)
+    if winner.error:
+        raise RuntimeError(f"No configuration could run {base_model}: {winner.error}")
+
+    # 2. Thread counts: intra-op sweep, then a few inter-op values (parallel execution mode).
+    stage = [winner]
+    for intra in thread_counts(cpus):
+        if intra != winner.intra_op_threads and not over_budget():
+            stage.append(measure(replace(winner, intra_op_threads=intra)))
+    winner = best(stage)
+    for inter in (2, 4):
+        if inter <= cpus and not over_budget():
+            stage.append(measure(replace(winner, inter_op_threads=inter)))
+    winner = best(stage)
+
+    # 3. Batch size. Batching can only add latency, so the latency objective keeps batch 1.
+    if objective == "throughput":
+        stage = [winner]
+        for batch_size in batch_sizes:
+            if batch_size != winner.batch_size and not over_budget():
+                stage.append(measure(replace(winner, batch_size=batch_size)))
+        winner = best(stage)
+
+    return winner, trials
+
+
+def tuning_key(base_model: Path, objective: str, batch_sizes: Sequence[int]) -> str:
+    """Everything a tuned configuration depends on: CPU and core budget, onnxruntime build, model files."""
+    import onnxruntime as ort
+
+    parts = [str(CONFIG_FORMAT), cpu_fingerprint(), str(cpu_budget()), ort.__version__,
+             ",".join(available_providers()), objective, ",".join(str(b) for b in batch_sizes)]
+    parts += [f"{name}={file_sha256(path)}" for name, path in sorted(available_variants(base_model).items())]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:20]
+
+
+def cached_config(output_dir: Path, key: str) -> Optional[dict]:
+    """model-config.json from an earlier run with the same tuning key, or None."""
+    try:
+        with open(output_dir / "model-config.json") as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return config if config.get("tuning_key") == key and config.get("selected") else None
+
+
+def write_env_file(config: dict, output_dir: Path):
+    """Write .env.model (sourceable settings) for a model-config.json document."""
+    best = config["selected"]
+    with open(output_dir / ".env.model", "w") as f:
+        f.write("# Generated by api/autotune.py from measured inference trials\n")
+        f.write(f"# Generated at: {config['generated_at']}\n")
+        f.write(f"# Objective: {config['objective']}; measured p50 {best['latency_p50_ms']} ms, "
+                f"p95 {best['latency_p95_ms']} ms, {best['throughput_ips']} img/s at batch {best['batch_size']}\n")
+        for key, value in config["environment_variables"].items():
+            f.write(f"{key}={value}\n")
+
+
+def write_config(best: Trial, trials: List[Trial], output_dir: Path, objective: str, base_model: Path,
+                 key: Optional[str] = None):
+    """Write model-config.json (full measurements) and .env.model (sourceable settings)."""
+    import onnxruntime as ort
+
+    generated_at = datetime.now(timezone.utc).isoformat()
+    env = {"MODEL_PATH": str(base_model), **best.env()}
+    config = {
+        "generated_at": generated_at,
+        "tuning_key": key,
+        "objective": objective,
+        "selected": asdict(best),
+        "environment_variables": env,
+        "trials": [asdict(t) for t in trials],
+        "host": {
+            "cpus": cpu_budget(),
+            "python_version": sys.version.split()[0],
+            "onnxruntime_version": ort.__version__,
+            "available_providers": available_providers(),
+        },
+    }
+    with open(output_dir / "model-config.json", "w") as f:
+        json.dump(config, f, indent=2)
+    write_env_file(config, output_dir)
+    return config
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="FP32 base model (default: MODEL_PATH / MODEL_DIR resolution)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default=os.getenv("AUTOTUNE_OBJECTIVE", "throughput"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--trial-seconds", type=float, default=0.5)
+    parser.add_argument("--budget-seconds", type=float, default=float(os.getenv("AUTOTUNE_BUDGET_SECONDS", 120)))
+    parser.add_argument("--output-dir", type=Path, default=REPO_ROOT)
+    parser.add_argument("--force", action="store_true", help="measure even when a cached result matches")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    settings = Settings.from_env()
+    base_model = (Path(args.model) if args.model
+                  else resolve_model_path(os.getenv("MODEL_PATH"), os.getenv("MODEL_DIR")))
+    if base_model is None or not base_model.is_file():
+        logger.error("No ONNX model to tune (MODEL_PATH=%s)", base_model)
+        return 1
+
+    key = tuning_key(base_model, args.objective, args.batch_sizes)
+    config = None if args.force else cached_config(args.output_dir, key)
+    if config is not None:
+        write_env_file(config, args.output_dir)
+        logger.info("Reusing the configuration tuned at %s for this CPU and model", config["generated_at"])
+        return 0
+
+    try:
+        best, trials = autotune(base_model, settings.input_size, args.objective, args.batch_sizes,
+                                args.trial_seconds, args.budget_seconds)
+    except RuntimeError as e:
+        logger.error("%s", e)
+        return 1
+    write_config(best, trials, args.output_dir, args.objective, base_model, key)
+    logger.info("Selected %s / %s, intra=%d inter=%d batch=%d: p50 %s ms, %s img/s (%d trials)",
+                best.provider, best.variant, best.intra_op_threads, best.inter_op_threads, best.batch_size,
+                best.latency_p50_ms, best.throughput_ips, len(trials))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Dynamic micro-batching for model calls.
+Concurrent requests submit preprocessed tensors; a single background task coalesces them into
+one NCHW batch (up to max_batch_size), runs the model once and hands each caller back its own
+slice of the output. A request reaching an idle batcher is dispatched at once; only while an
+earlier batch still occupies the model does the next one wait for companions, up to max_wait_ms
+or until that batch finishes, since it could not start any sooner.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    rows: np.ndarray
+    batch_size: int
+    queue_wait_ms: float
+    inference_ms: float
+
+
+@dataclass
+class _Pending:
+    tensor: np.ndarray
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        run_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        executor=None,
+        on_batch: Optional[Callable[[int], None]] = None,
+    ):
+        self.run_batch = run_batch
+        self.on_batch = on_batch  # called with each batch's size, e.g. to feed a histogram
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatched: Set[asyncio.Task] = set()
+        self._running = 0  # batches handed to the executor and not yet finished
+        self._idle: Optional[asyncio.Event] = None
+
+        # Metrics: totals plus a window of recent queue delays for percentiles.
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self._recent_waits = deque(maxlen=1024)
+        self._recent_sizes = deque(maxlen=1024)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._loop(), name="micro-batcher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._dispatched):
+            task.cancel()
+        await asyncio.gather(*self._dispatched, return_exceptions=True)
+        # Fail anything still waiting so no request hangs on shutdown.
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, tensor: np.ndarray) -> BatchResult:
+        """Queue one (3, H, W) tensor and wait for its slice of the batched model output."""
+        if self._queue is None:
+            raise RuntimeError("Batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(tensor, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without waiting.
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if self._running == 0 or remaining <= 0:
+                break
+            getter = asyncio.ensure_future(self._queue.get())
+            idle = asyncio.ensure_future(self._idle.wait())
+            await asyncio.wait((getter, idle), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            idle.cancel()
+            if getter.done():
+                batch.append(getter.result())
+            else:
+                getter.cancel()  # a cancelled get leaves any item in the queue
+        return batch
+
+    async def _loop(self):
+        while True:
+            batch = await self._collect()
+            batch = [p for p in batch if not p.future.cancelled()]
+            if not batch:
+                continue
+            self._running += 1
+            self._idle.clear()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatched.add(task)
+            task.add_done_callback(self._dispatched.discard)
+
+    async def _dispatch(self, batch):
+        started = time.perf_counter()
+        try:
+            stacked = np.stack([p.tensor for p in batch])
+            rows = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_batch, stacked)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                logger.exception("Batched inference failed for %d items: %s", len(batch), e)
+            failure = e if isinstance(e, Exception) else RuntimeError("Batcher stopped")
+            for p in batch:
+                if not p.future.done():
+                    p.future.set_exception(failure)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        finally:
+            self._running -= 1
+            if self._running == 0:
+                self._idle.set()
+        inference_ms = (time.perf_counter() - started) * 1000
+
+        self._record(batch, started)
+        for i, p in enumerate(batch):
+            if not p.future.done():
+                p.future.set_result(BatchResult(
+                    rows=rows[i],
+                    batch_size=len(batch),
+                    queue_wait_ms=(started - p.enqueued_at) * 1000,
+                    inference_ms=inference_ms,
+                ))
+
+    def _record(self, batch, started):
+        self.batches += 1
+        self.items += len(batch)
+        if len(batch) == self.max_batch_size:
+            self.full_batches += 1
+        self._recent_sizes.append(len(batch))
+        self._recent_waits.extend((started - p.enqueued_at) * 1000 for p in batch)
+        if self.on_batch is not None:
+            self.on_batch(len(batch))
+
+    def stats(self) -> dict:
+        waits = np.asarray(self._recent_waits, dtype=np.float64)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "fill_rate": round(self.items / (self.batches * self.max_batch_size), 4) if self.batches else 0.0,
+            "full_batch_ratio": round(self.full_batches / self.batches, 4) if self.batches else 0.0,
+            "recent_avg_batch_size": round(float(np.mean(self._recent_sizes)), 3) if self._recent_sizes else 0.0,
+            "queue_wait_ms": {
+                "p50": round(float(np.percentile(waits, 50)), 3) if waits.size else 0.0,
+                "p95": round(float(np.percentile(waits, 95)), 3) if waits.size else 0.0,
+                "max": round(float(waits.max()), 3) if waits.size else 0.0,
+            },
+        }
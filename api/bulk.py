@@ -0,0 +1,452 @@
+"""
+Offline bulk detection over recorded dashcam videos and image folders.
+Runs the same engine as the API (letterbox -> model -> batched NMS) as a batch job:
+
+1. a reader thread stream-decodes each source with OpenCV and hands every `stride`-th frame to a
+   bounded queue, so decoding runs ahead of inference by at most `queue_size` frames;
+2. the main thread takes frames off the queue in batches, letterboxes them on a thread pool
+   straight into one reusable batch tensor, runs the model once per batch and postprocesses the
+   whole batch in one pass;
+3. detections are appended to JSONL (one line per sampled frame) or Parquet part files as they
+   are produced, with the frame index and its timestamp in the video.
+
+Every `checkpoint_every` frames the output is flushed and a checkpoint records, per source, the
+next frame to read and how much output is committed. Rerunning the same command resumes there:
+output written after the last checkpoint is discarded and those frames are processed again, so
+every sampled frame appears exactly once. Memory depends on the queue and batch sizes, never on
+video length.
+
+    python -m api.bulk drives/ --out detections.jsonl --stride 5
+    python -m api.bulk trip.mp4 more-trips/ --out detections.parquet   # needs pyarrow
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .preprocess import decode_for_model, letterbox_into
+from .settings import Settings
+
+logger = logging.getLogger(__name__)
+
+VIDEO_SUFFIXES = frozenset({".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm", ".ts"})
+IMAGE_SUFFIXES = frozenset({".jpg", ".jpeg", ".png", ".bmp", ".webp"})
+CHECKPOINT_VERSION = 1
+_POLL_SECONDS = 0.1
+
+
+@dataclass
+class Frame:
+    origin: str  # the video or image folder this frame was read from
+    source: str  # the video or image file
+    index: int  # position in the video, or in the sorted image folder
+    timestamp_ms: Optional[float]  # None for still images
+    image: np.ndarray  # BGR, possibly decoded at reduced scale
+    width: int  # original dimensions, which detection boxes refer to
+    height: int
+
+
+@dataclass
+class SourceDone:
+    """Queued after a source's last frame."""
+    source: str
+
+
+def discover(paths: Sequence[Path]) -> List[Tuple[str, Path]]:
+    """
+    Expand inputs into ("video", file) and ("images", folder) sources. A directory contributes
+    each video below it, and itself (or any subfolder) as an image source if it holds images.
+    """
+    sources = []
+    for path in map(Path, paths):
+        if path.is_file():
+            if path.suffix.lower() in VIDEO_SUFFIXES:
+                sources.append(("video", path))
+            else:
+                logger.warning("Skipping %s: not a video (image inputs are folders)", path)
+            continue
+        if not path.is_dir():
+            raise FileNotFoundError(f"No such file or directory: {path}")
+        for folder in [path, *sorted(p for p in path.rglob("*") if p.is_dir())]:
+            files = sorted(p for p in folder.iterdir() if p.is_file())
+            sources.extend(("video", p) for p in files if p.suffix.lower() in VIDEO_SUFFIXES)
+            if any(p.suffix.lower() in IMAGE_SUFFIXES for p in files):
+                sources.append(("images", folder))
+    return sources
+
+
+def read_video(path: Path, stride: int = 1, start: int = 0) -> Iterator[Frame]:
+    """
+    Decode frames `start`, ... of a video and yield those whose index is a multiple of `stride`.
+    Skipped frames are only grabbed, not converted to BGR.
+    """
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        index = 0
+        if start > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+            index = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+            if index != start:
+                # Not seekable (or imprecisely so): reopen and step there frame by frame.
+                capture.release()
+                capture = cv2.VideoCapture(str(path))
+                index = 0
+                while index < start and capture.grab():
+                    index += 1
+        while capture.grab():
+            if index % stride == 0:
+                ok, image = capture.retrieve()
+                if ok:
+                    timestamp = index * 1000.0 / fps if fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC)
+                    height, width = image.shape[:2]
+                    yield Frame(str(path), str(path), index, round(timestamp, 1), image, width, height)
+                else:
+                    logger.warning("Could not decode frame %d of %s", index, path)
+            index += 1
+    finally:
+        capture.release()
+
+
+def read_images(folder: Path, stride: int = 1, start: int = 0, input_size: Optional[int] = None) -> Iterator[Frame]:
+    """Yield every `stride`-th image of a folder in name order, decoded at reduced scale where the letterbox allows."""
+    files = sorted(p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES)
+    for index in range(start, len(files)):
+        if index % stride:
+            continue
+        decoded = decode_for_model(files[index].read_bytes(), input_size)
+        if decoded is None:
+            logger.warning("Could not decode %s", files[index])
+            continue
+        image, width, height, _ = decoded
+        yield Frame(str(folder), str(files[index]), index, None, image, width, height)
+
+
+def atomic_write_json(path: Path, data: dict):
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class JsonlWriter:
+    """One JSON line per sampled frame. Committed state is the byte length of the file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+
+    def open(self, state: Optional[dict]):
+        """Start fresh, or cut the file back to the offset a checkpoint committed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if state and (not self.path.is_file() or self.path.stat().st_size < state["offset"]):
+            raise ValueError(f"{self.path} is shorter than its checkpoint; rerun with --restart to start over")
+        self._file = open(self.path, "ab" if state else "wb")
+        if state:
+            self._file.truncate(state["offset"])
+            self._file.seek(state["offset"])
+
+    def write(self, records: List[dict]):
+        self._file.write(b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records))
+
+    def commit(self) -> dict:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.tell()}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetWriter:
+    """
+    A directory of Parquet part files, one written per checkpoint, which pyarrow and pandas read
+    as one dataset. Rows wait in memory only until the next checkpoint.
+    """
+
+    def __init__(self, path: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead") from e
+        self._pa, self._pq = pa, pq
+        self.path = Path(path)
+        self.schema = pa.schema([
+            ("source", pa.string()),
+            ("frame", pa.int64()),
+            ("timestamp_ms", pa.float64()),
+            ("width", pa.int32()),
+            ("height", pa.int32()),
+            ("model_version", pa.string()),
+            ("detections", pa.list_(pa.struct([
+                ("box", pa.list_(pa.float32(), 4)),
+                ("label", pa.string()),
+                ("score", pa.float32()),
+                ("class_id", pa.int32()),
+            ]))),
+        ])
+        self._rows: List[dict] = []
+        self.parts = 0
+
+    def open(self, state: Optional[dict]):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.parts = state["parts"] if state else 0
+        # Parts past the checkpoint belong to frames that will be processed again.
+        for part in self.path.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+
+    def write(self, records: List[dict]):
+        self._rows.extend(records)
+
+    def commit(self) -> dict:
+        if self._rows:
+            part = self.path / f"part-{self.parts:05d}.parquet"
+            tmp = part.with_name(f".{part.name}.tmp")
+            self._pq.write_table(self._pa.Table.from_pylist(self._rows, schema=self.schema), tmp)
+            os.replace(tmp, part)
+            self.parts += 1
+            self._rows = []
+        return {"parts": self.parts}
+
+    def close(self):
+        self._rows = []
+
+
+def open_writer(path: Path):
+    return ParquetWriter(path) if Path(path).suffix.lower() == ".parquet" else JsonlWriter(path)
+
+
+class BulkRunner:
+    """
+    Drives `engine` (an InferenceEngine, or anything with `input_size`, `model_version`, `run()`
+    and `postprocess_batch()`) over a list of sources into `writer`, checkpointing to
+    `checkpoint_path`.
+    """
+
+    def __init__(self, engine, writer, checkpoint_path: Path, stride: int = 1, batch_size: int = 8,
+                 queue_size: int = 32, preprocess_workers: int = 0, checkpoint_every: int = 500):
+        if stride < 1 or batch_size < 1:
+            raise ValueError("stride and batch_size must be at least 1")
+        self.engine = engine
+        self.writer = writer
+        self.checkpoint_path = Path(checkpoint_path)
+        self.stride = stride
+        self.batch_size = getattr(engine, "fixed_batch_size", None) or batch_size
+        self.queue_size = max(queue_size, self.batch_size)
+        self.preprocess_workers = preprocess_workers or os.cpu_count() or 1
+        self.checkpoint_every = checkpoint_every
+        self.frames = 0
+        self.detections = 0
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        if not self.checkpoint_path.is_file():
+            return None
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        expected = {"version": CHECKPOINT_VERSION, "stride": self.stride, "model_version": self.engine.model_version}
+        mismatched = {k: checkpoint.get(k) for k, v in expected.items() if checkpoint.get(k) != v}
+        if mismatched:
+            raise ValueError(f"{self.checkpoint_path} was written with {mismatched}, not {expected}; "
+                             "rerun with --restart to start over")
+        return checkpoint
+
+    def _save_checkpoint(self, progress: Dict[str, dict]):
+        atomic_write_json(self.checkpoint_path, {
+            "version": CHECKPOINT_VERSION,
+            "stride": self.stride,
+            "model_version": self.engine.model_version,
+            "output": self.writer.commit(),
+            "sources": progress,
+        })
+
+    def _read(self, sources: Sequence[Tuple[str, Path]], progress: Dict[str, dict], frames: queue.Queue,
+              stop: threading.Event):
+        """Reader thread: queue frames (blocking while the queue is full) until done or told to stop."""
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    frames.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for kind, path in sources:
+                state = progress[str(path)]
+                if state["done"]:
+                    continue
+                if kind == "video":
+                    reader = read_video(path, self.stride, state["next_frame"])
+                else:
+                    reader = read_images(path, self.stride, state["next_frame"], self.engine.input_size)
+                for frame in reader:
+                    if not put(frame):
+                        return
+                if not put(SourceDone(str(path))):
+                    return
+            put(None)
+        except Exception as e:  # surfaced by the consumer
+            put(e)
+
+    def _process(self, batch: List[Frame], buffer: np.ndarray, pool: ThreadPoolExecutor) -> List[dict]:
+        def prepare(i):
+            frame = batch[i]
+            return letterbox_into(frame.image, buffer[i], frame.width, frame.height)
+
+        params = list(pool.map(prepare, range(len(batch))))
+        rows = self.engine.run(buffer[:len(batch)])
+        found = self.engine.postprocess_batch(rows, params, [(f.width, f.height) for f in batch])
+        return [
+            {
+                "source": frame.source,
+                "frame": frame.index,
+                "timestamp_ms": frame.timestamp_ms,
+                "width": frame.width,
+                "height": frame.height,
+                "model_version": self.engine.model_version,
+                "detections": detections,
+            }
+            for frame, detections in zip(batch, found)
+        ]
+
+    def run(self, sources: Sequence[Tuple[str, Path]], restart: bool = False) -> dict:
+        checkpoint = None if restart else self._load_checkpoint()
+        progress = {str(path): {"next_frame": 0, "done": False} for _, path in sources}
+        if checkpoint:
+            progress.update({k: v for k, v in checkpoint["sources"].items() if k in progress})
+            logger.info("Resuming from %s (%d of %d sources done)", self.checkpoint_path,
+                        sum(s["done"] for s in progress.values()), len(progress))
+        self.writer.open(checkpoint["output"] if checkpoint else None)
+
+        size = self.engine.input_size
+        buffer = np.empty((self.batch_size, 3, size, size), dtype=np.float32)
+        frames: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read, args=(sources, progress, frames, stop),
+                                  name="bulk-reader", daemon=True)
+        start = time.perf_counter()
+        since_checkpoint = 0
+        reader.start()
+        try:
+            with ThreadPoolExecutor(self.preprocess_workers, thread_name_prefix="bulk-preprocess") as pool:
+                finished = False
+                while not finished:
+                    batch: List[Frame] = []
+                    done: Optional[SourceDone] = None
+                    while len(batch) < self.batch_size:
+                        item = frames.get()
+                        if isinstance(item, Exception):
+                            raise item
+                        if item is None:
+                            finished = True
+                            break
+                        if isinstance(item, SourceDone):
+                            done = item
+                            break
+                        batch.append(item)
+
+                    if batch:
+                        records = self._process(batch, buffer, pool)
+                        self.writer.write(records)
+                        for frame in batch:
+                            progress[frame.origin]["next_frame"] = frame.index + 1
+                        self.frames += len(batch)
+                        self.detections += sum(len(r["detections"]) for r in records)
+                        since_checkpoint += len(batch)
+                    if done is not None:
+                        progress[done.source]["done"] = True
+                    if done is not None or since_checkpoint >= self.checkpoint_every:
+                        self._save_checkpoint(progress)
+                        since_checkpoint = 0
+                        logger.info("%d frames, %d detections, %.1f frames/s", self.frames, self.detections,
+                                    self.frames / (time.perf_counter() - start))
+                self._save_checkpoint(progress)
+        finally:
+            stop.set()
+            reader.join()
+            self.writer.close()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "sources": len(sources),
+            "frames": self.frames,
+            "detections": self.detections,
+            "elapsed_s": round(elapsed, 2),
+            "frames_per_s": round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", type=Path, help="Video files and/or folders of videos or images")
+    parser.add_argument("--out", type=Path, required=True, help="Output .jsonl file or .parquet directory")
+    parser.add_argument("--stride", type=int, default=1, help="Process every Nth frame")
+    parser.add_argument("--batch-size", type=int, default=0, help="Frames per model call (default BATCH_MAX_SIZE)")
+    parser.add_argument("--queue-size", type=int, default=32, help="Decoded frames buffered ahead of inference")
+    parser.add_argument("--workers", type=int, default=0, help="Preprocessing threads (default: one per CPU)")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="Frames between checkpoints")
+    parser.add_argument("--checkpoint", type=Path, help="Checkpoint file (default: <out>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and overwrite the output")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(message)s")
+
+    from .inference import InferenceEngine
+
+    settings = Settings.from_env()
+    try:
+        sources = discover(args.inputs)
+        writer = open_writer(args.out)
+    except (FileNotFoundError, RuntimeError) as e:
+        logger.error("%s", e)
+        return 1
+    if not sources:
+        logger.error("No videos or images found in %s", ", ".join(map(str, args.inputs)))
+        return 1
+    try:
+        engine = InferenceEngine.from_settings(settings)
+    except Exception as e:
+        logger.error("Could not load the model: %s", e)
+        return 1
+
+    runner = BulkRunner(
+        engine, writer,
+        checkpoint_path=args.checkpoint or args.out.with_name(f"{args.out.name}.checkpoint.json"),
+        stride=args.stride,
+        batch_size=args.batch_size or settings.batch_max_size,
+        queue_size=args.queue_size,
+        preprocess_workers=args.workers,
+        checkpoint_every=args.checkpoint_every,
+    )
+    try:
+        summary = runner.run(sources, restart=args.restart)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+    logger.info("Done: %s", json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+ONNX Runtime inference engine for the hazard detection model.
+The engine is created once per worker at startup and shared by every request:
+building an InferenceSession (graph optimization, thread pools) is far too slow for the request path.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import model_cache
+from .postprocess import postprocess_batch, to_rows
+from .preprocess import PAD_VALUE, LetterboxParams, letterbox
+
+logger = logging.getLogger(__name__)
+
+
+def load_labels(path: Path) -> List[str]:
+    """Read web/labels.json ({"0": "crack", "1": "pothole"}) into an index-ordered list."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if isinstance(raw, list):
+        return [str(label) for label in raw]
+    return [str(raw[key]) for key in sorted(raw, key=int)]
+
+
+def create_session(model_path: Path, intra_op_threads: int = 0, inter_op_threads: int = 1,
+                   provider: str = "CPUExecutionProvider", save_optimized_to: Optional[Path] = None,
+                   preoptimized: bool = False, save_weights_to: Optional[str] = None,
+                   share_weights: bool = False):
+    """
+    Build an ONNX Runtime session. Inter-op threads only matter in parallel execution mode, so
+    that mode is used exactly when more than one is requested. Providers other than the CPU one
+    (e.g. OpenVINO) keep the CPU provider as fallback for nodes they can't run.
+    `save_optimized_to` serializes the optimized graph; `preoptimized` loads such a graph as is.
+    `save_weights_to` writes that graph's initializers to a separate file beside it.
+    `share_weights` disables prepacking: otherwise MatMul weights get a private repacked copy
+    instead of being read from a memory-mapped weights file that other processes share.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = (
+        ort.GraphOptimizationLevel.ORT_DISABLE_ALL if preoptimized else ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+    if save_optimized_to is not None:
+        options.optimized_model_filepath = str(save_optimized_to)
+    if save_weights_to is not None:
+        options.add_session_config_entry("session.optimized_model_external_initializers_file_name", save_weights_to)
+        options.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", "1024")
+    if share_weights:
+        options.add_session_config_entry("session.disable_prepacking", "1")
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+
+    providers = [provider] if provider == "CPUExecutionProvider" else [provider, "CPUExecutionProvider"]
+    return ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+
+
+class InferenceEngine:
+    """Owns the ONNX Runtime session and runs letterbox -> model -> NMS for decoded images."""
+
+    def __init__(
+        self,
+        model_path: Path,
+        labels: Sequence[str],
+        input_size: int = 640,
+        confidence_threshold: float = 0.25,
+        iou_threshold: float = 0.45,
+        max_detections: int = 100,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 1,
+        execution_provider: str = "CPUExecutionProvider",
+        cache_dir: Optional[Path] = None,
+        share_weights: bool = False,
+    ):
+        self.model_path = Path(model_path)
+        load_start = time.perf_counter()
+        model_sha256 = model_cache.file_sha256(self.model_path)
+        # Identifies the served weights in result-cache keys; a redeployed model never reuses old results.
+        self.model_version = model_sha256[:12]
+        if share_weights and cache_dir is None:
+            logger.warning("Model weights can only be shared through the model cache; loading a private copy")
+        cached = model_cache.lookup(self.model_path, cache_dir, execution_provider, model_sha256,
+                                    external_weights=share_weights)
+        self.session = create_session(
+            cached.load_path, intra_op_threads, inter_op_threads, execution_provider,
+            save_optimized_to=cached.save_path, preoptimized=cached.status == "hit",
+            save_weights_to=cached.weights_file, share_weights=share_weights,
+        )
+        model_cache.commit(cached, self.model_path)
+        self.cache_status = cached.status
+        self.load_ms = (time.perf_counter() - load_start) * 1000
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+        # A model exported at a fixed resolution or batch size overrides the configured values.
+        shape = model_input.shape
+        self.input_size = shape[2] if len(shape) == 4 and isinstance(shape[2], int) else input_size
+        self.fixed_batch_size = shape[0] if shape and isinstance(shape[0], int) else None
+
+        self.labels = list(labels)
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+
+        logger.info(
+            "Loaded %s in %.0f ms (cache %s, input %s, %d labels, intra_op=%d, inter_op=%d, %s)",
+            self.model_path.name, self.load_ms, self.cache_status, self.input_size, len(self.labels),
+            intra_op_threads, inter_op_threads, self.session.get_providers()[0],
+        )
+
+    @classmethod
+    def from_settings(cls, settings) -> "InferenceEngine":
+        if settings.model_path is None or not settings.model_path.is_file():
+            raise FileNotFoundError(f"No ONNX model found (MODEL_PATH={settings.model_path})")
+        return cls(
+            model_path=settings.model_path,
+            labels=load_labels(settings.labels_path),
+            input_size=settings.input_size,
+            confidence_threshold=settings.confidence_threshold,
+            iou_threshold=settings.iou_threshold,
+            max_detections=settings.max_detections,
+            intra_op_threads=settings.intra_op_threads,
+            inter_op_threads=settings.inter_op_threads,
+            execution_provider=settings.execution_provider,
+            cache_dir=settings.model_cache_dir,
+            share_weights=settings.share_model_weights,
+        )
+
+    @property
+    def model_name(self) -> str:
+        return self.model_path.name
+
+    def warm_up(self, batch_sizes: Sequence[int] = (1,), runs: int = 1) -> float:
+        """
+        Run dummy batches so the first real request doesn't pay for arena allocation and kernel
+        selection; each batch size the micro-batcher can produce has its own first-run cost.
+        Returns the time taken in ms.
+        """
+        start = time.perf_counter()
+        for batch_size in sorted(set(batch_sizes)):
+            batch = np.full((batch_size, 3, self.input_size, self.input_size), PAD_VALUE / 255.0, dtype=np.float32)
+            for _ in range(runs):
+                self.run(batch)
+        return (time.perf_counter() - start) * 1000
+
+    def preprocess(self, image: np.ndarray) -> Tuple[np.ndarray, LetterboxParams]:
+        return letterbox(image, self.input_size)
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Run the model on an NCHW float32 batch and return the raw output as (B, N, C) rows."""
+        step = self.fixed_batch_size
+        if step and batch.shape[0] != step:
+            # Static-batch exports can't take a stacked batch; feed it through in model-sized chunks.
+            return np.concatenate([self.run(batch[i:i + step]) for i in range(0, batch.shape[0], step)])
+        output = self.session.run([self.output_name], {self.input_name: batch})[0]
+        return to_rows(output, len(self.labels))
+
+    def candidates(
+        self, rows: np.ndarray, params: LetterboxParams, width: int, height: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Filter and NMS one image's prediction rows; returns boxes in original pixels, scores and class ids."""
+        return self.candidates_batch(rows[None], [params], [(width, height)])[0]
+
+    def candidates_batch(
+        self, rows: np.ndarray, params: Sequence[LetterboxParams], sizes: Sequence[Tuple[int, int]]
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """candidates() for a whole (B, N, C) batch in one vectorized pass; `sizes` are original (width, height)."""
+        return postprocess_batch(rows, params, sizes, len(self.labels), self.confidence_threshold,
+                                 self.iou_threshold, self.max_detections)
+
+    def to_detections(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray) -> List[Dict]:
+        return [
+            {
+                "box": [round(float(v), 1) for v in box],
+                "label": self.labels[int(class_id)] if int(class_id) < len(self.labels) else str(int(class_id)),
+                "score": round(float(score), 4),
+                "class_id": int(class_id),
+            }
+            for box, score, class_id in zip(boxes, scores, class_ids)
+        ]
+
+    def postprocess(self, rows: np.ndarray, params: LetterboxParams, width: int, height: int) -> List[Dict]:
+        """Filter, NMS and map one image's prediction rows back to original pixel coordinates."""
+        return self.to_detections(*self.candidates(rows, params, width, height))
+
+    def postprocess_batch(
+        self, rows: np.ndarray, params: Sequence[LetterboxParams], sizes: Sequence[Tuple[int, int]]
+    ) -> List[List[Dict]]:
+        """postprocess() for a whole batch: one filter/NMS/rescale pass instead of one per image."""
+        return [self.to_detections(*found) for found in self.candidates_batch(rows, params, sizes)]
+
+    def detect(self, image: np.ndarray) -> Tuple[List[Dict], Dict[str, float]]:
+        """Run the full pipeline on one decoded BGR image and return detections plus per-stage timings in ms."""
+        height, width = image.shape[:2]
+
+        start = time.perf_counter()
+        tensor, params = self.preprocess(image)
+        preprocessed = time.perf_counter()
+        rows = self.run(tensor[None])
+        inferred = time.perf_counter()
+        detections = self.postprocess(rows[0], params, width, height)
+        done = time.perf_counter()
+
+        timings = {
+            "preprocess": (preprocessed - start) * 1000,
+            "inference": (inferred - preprocessed) * 1000,
+            "postprocess": (done - inferred) * 1000,
+        }
+        return detections, timings
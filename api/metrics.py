@@ -0,0 +1,191 @@
+"""
+Prometheus metrics for the detection API, rendered in the text exposition format on GET /metrics.
+A small in-process implementation instead of prometheus_client: the hot path only does a dict
+lookup and a bisect per observation. Observations happen on the event loop thread, so the
+metrics take no locks. Values that other components already count (admission rejections,
+cache and motion-gate hits, sessions) are read through callbacks at scrape time, so their
+counting costs nothing extra.
+"""
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+# Seconds; covers 1 ms decode stages up to multi-second tiled or overloaded requests.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, formatted labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Labels, List[int]] = {}  # per bucket, not cumulative; last slot is +Inf
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def samples(self):
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),)), cumulative
+            base = _format_labels(self.labelnames, labels)
+            yield "_sum", base, self._sums[labels]
+            yield "_count", base, cumulative
+
+
+class CallbackMetric(Metric):
+    """A counter or gauge whose value is read from `fn` at scrape time: a number, or {label values: number}."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], Union[float, Dict[Labels, float]]],
+                 kind: str = "gauge", labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                yield "", _format_labels(self.labelnames, labels), v
+        else:
+            yield "", "", value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, fn, kind="gauge", labelnames=()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, fn, kind, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ApiMetrics:
+    """The metrics the API records on its hot path; everything else is registered as callbacks in api/app.py."""
+
+    def __init__(self, registry: Registry = None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.requests = r.counter("hazard_http_requests_total", "HTTP requests by handler and status code.",
+                                  ("handler", "status"))
+        self.request_duration = r.histogram("hazard_http_request_duration_seconds",
+                                            "HTTP request latency by handler.", ("handler",))
+        self.in_flight = r.gauge("hazard_http_requests_in_flight", "HTTP requests currently being served.")
+        self.stage_duration = r.histogram(
+            "hazard_stage_duration_seconds",
+            "Per-stage detection latency (read, cache, gate, decode, preprocess, queue_wait, inference, "
+            "postprocess, serialize).",
+            ("stage",),
+        )
+        self.batch_size = r.histogram("hazard_batch_size", "Images per model call.", ("source",),
+                                      buckets=BATCH_SIZE_BUCKETS)
+
+    def observe_stages(self, timings: Dict[str, float]):
+        """Record a detection's per-stage timings (milliseconds, as in the response's `timings`)."""
+        for stage, ms in timings.items():
+            self.stage_duration.observe(ms / 1000.0, stage)
+
+    def render(self) -> str:
+        return self.registry.render()
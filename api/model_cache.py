@@ -0,0 +1,91 @@
+"""
+On-disk cache of ONNX Runtime-optimized models.
+Graph optimization is most of the cost of building an InferenceSession. The first worker on a
+machine saves the optimized graph; later cold starts load it with optimizations disabled. The
+fully optimized graph may contain layouts specific to the CPU and runtime that produced it, so
+the cache key covers the model bytes, onnxruntime version, execution provider and CPU.
+
+With `external_weights`, the optimized graph keeps its initializers in a separate file next to it.
+ONNX Runtime memory-maps such a file rather than copying it, so every worker process on the
+machine maps the same page-cache pages and the weights are resident once (see api/serve.py).
+"""
+import hashlib
+import logging
+import os
+import platform
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK = 1 << 20
+
+
+@dataclass
+class CachedModel:
+    load_path: Path  # what to hand to InferenceSession
+    save_path: Optional[Path]  # where the session should serialize its optimized graph (cache miss)
+    status: str  # "hit", "miss" or "disabled"
+    key: Optional[str] = None
+    weights_file: Optional[str] = None  # on a miss with external weights: file name for the initializers
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cpu_fingerprint() -> str:
+    model = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("model name", "flags", "Features")):
+                    model += line
+    except OSError:
+        pass
+    return f"{platform.machine()}:{hashlib.sha256(model.encode()).hexdigest()[:12]}"
+
+
+def cache_key(model_path: Path, provider: str, model_sha256: Optional[str] = None) -> str:
+    import onnxruntime as ort
+
+    parts = (model_sha256 or file_sha256(model_path), ort.__version__, provider, cpu_fingerprint())
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:20]
+
+
+def lookup(model_path: Path, cache_dir: Optional[Path], provider: str,
+           model_sha256: Optional[str] = None, external_weights: bool = False) -> CachedModel:
+    if cache_dir is None:
+        return CachedModel(model_path, None, "disabled")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        key = cache_key(model_path, provider, model_sha256)
+    except OSError as e:
+        logger.warning("Model cache unavailable (%s); loading %s directly", e, model_path.name)
+        return CachedModel(model_path, None, "disabled")
+
+    cached = cache_dir / f"{model_path.stem}-{key}{'.shared' if external_weights else ''}.onnx"
+    if cached.is_file():
+        return CachedModel(cached, None, "hit", key)
+    # Unique temp name: several workers may miss at once, and only complete files get renamed in.
+    # The graph refers to its weights file by name, so that one is written under its final (unique) name.
+    weights_file = f"{model_path.stem}-{key}.{os.getpid()}.weights" if external_weights else None
+    return CachedModel(model_path, cache_dir / f".{cached.name}.{os.getpid()}.tmp", "miss", key, weights_file)
+
+
+def commit(entry: CachedModel, model_path: Path):
+    """Move a freshly serialized optimized graph into place; a failed write only costs the next cold start."""
+    if entry.status != "miss" or entry.save_path is None:
+        return
+    suffix = ".shared.onnx" if entry.weights_file else ".onnx"
+    final = entry.save_path.parent / f"{model_path.stem}-{entry.key}{suffix}"
+    try:
+        os.replace(entry.save_path, final)
+        logger.info("Cached optimized model at %s", final)
+    except OSError as e:
+        logger.warning("Could not cache optimized model: %s", e)
@@ -0,0 +1,347 @@
+"""
+Model versions served by one worker, swapped without a restart.
+A new model is built, warmed up and given its own micro-batcher in the background while the
+current one keeps serving. The swap itself is one reference assignment on the event loop, and each
+request pins the model it started on, so no request ever mixes two models; the previous model is
+torn down once the last request using it has finished.
+
+A candidate can instead be loaded next to the active model and shadowed: a sample of live frames
+is run through it in the background after the real response is computed, and its latency and
+agreement with the active model's detections are tracked until it is promoted or dropped.
+
+Each worker has its own registry. With several workers (api.serve), MODEL_SELECTION_FILE holds the
+desired selection; every worker polls it, so a change made through any worker reaches all of them.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .postprocess import iou_matrix
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ServedModel:
+    """
+    An engine with the micro-batcher and input-tensor pool sized for it, plus how many requests
+    currently hold it. Requests take all three from the model they pinned, never from app state.
+    """
+    name: str
+    engine: object
+    batcher: Optional[object] = None
+    tensor_pool: Optional[object] = None
+    load_ms: float = 0.0
+    warmup_ms: float = 0.0
+    loaded_at: float = field(default_factory=time.time)
+    users: int = 0
+    retired: bool = False
+    _idle: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def version(self) -> str:
+        return self.engine.model_version
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "input_size": self.engine.input_size,
+            "loaded_at": round(self.loaded_at, 3),
+            "load_ms": round(self.load_ms, 1),
+            "warmup_ms": round(self.warmup_ms, 1),
+            "in_use": self.users,
+        }
+
+
+def detection_agreement(a: Sequence[dict], b: Sequence[dict], iou_threshold: float = 0.5) -> float:
+    """
+    F1 of matching `b` against `a`: detections match when their labels agree and their boxes
+    overlap by at least `iou_threshold` (greedy, highest IoU first). 1.0 when both are empty.
+    """
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    ious = iou_matrix(np.asarray([d["box"] for d in a], dtype=np.float32),
+                      np.asarray([d["box"] for d in b], dtype=np.float32))
+    same_label = np.asarray([[da["label"] == db["label"] for db in b] for da in a])
+    ious = np.where(same_label & (ious >= iou_threshold), ious, 0.0)
+    matched = 0
+    while ious.size and ious.max() > 0:
+        i, j = np.unravel_index(ious.argmax(), ious.shape)
+        ious[i, :] = 0
+        ious[:, j] = 0
+        matched += 1
+    return 2 * matched / (len(a) + len(b))
+
+
+def _percentiles(values) -> dict:
+    data = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(data, 50)), 3) if data.size else 0.0,
+        "p95": round(float(np.percentile(data, 95)), 3) if data.size else 0.0,
+    }
+
+
+class ShadowStats:
+    """Comparison of a candidate with the active model over the frames shadowed so far."""
+
+    def __init__(self, window: int = 1024):
+        self.frames = 0
+        self.errors = 0
+        self.agreement_sum = 0.0
+        self.active_detections = 0
+        self.candidate_detections = 0
+        self._active_ms = deque(maxlen=window)
+        self._candidate_ms = deque(maxlen=window)
+
+    def record(self, active: Sequence[dict], candidate: Sequence[dict], active_ms: float, candidate_ms: float):
+        self.frames += 1
+        self.agreement_sum += detection_agreement(active, candidate)
+        self.active_detections += len(active)
+        self.candidate_detections += len(candidate)
+        self._active_ms.append(active_ms)
+        self._candidate_ms.append(candidate_ms)
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "errors": self.errors,
+            "agreement": round(self.agreement_sum / self.frames, 4) if self.frames else None,
+            "detections_per_frame": {
+                "active": round(self.active_detections / self.frames, 3) if self.frames else 0.0,
+                "candidate": round(self.candidate_detections / self.frames, 3) if self.frames else 0.0,
+            },
+            # Model-call time as each model served the frame: the active one's may be a micro-batch.
+            "inference_ms": {"active": _percentiles(self._active_ms), "candidate": _percentiles(self._candidate_ms)},
+        }
+
+
+class ModelRegistry:
+    """
+    `load(path)` builds, warms up and returns a ServedModel; `unload(model)` releases one that no
+    request holds any more (stops its batcher). Both are coroutines supplied by the app; `on_swap`
+    is called with each newly active model. Event-loop only, so no locks beyond the load lock.
+    """
+
+    def __init__(self, load: Callable[[Path], Awaitable[ServedModel]],
+                 unload: Callable[[ServedModel], Awaitable[None]], model_dir: Optional[Path] = None,
+                 on_swap: Optional[Callable[[ServedModel], None]] = None, shadow_max_in_flight: int = 2):
+        self._load = load
+        self._unload = unload
+        self.model_dir = Path(model_dir) if model_dir is not None else None
+        self.on_swap = on_swap
+        self.shadow_max_in_flight = shadow_max_in_flight
+        self.active: Optional[ServedModel] = None
+        self.candidate: Optional[ServedModel] = None
+        self.shadow_fraction = 0.0
+        self.shadow = ShadowStats()
+        self.loading: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.swaps = 0
+        self._load_lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._shadow_in_flight = 0
+
+    def resolve(self, name: str) -> Path:
+        """A model file in the model directory by bare name; anything else raises ValueError."""
+        if self.model_dir is None or not name or Path(name).name != name or not name.endswith(".onnx"):
+            raise ValueError(f"Unknown model {name!r}")
+        path = self.model_dir / name
+        if not path.is_file():
+            raise ValueError(f"Unknown model {name!r}")
+        return path
+
+    def available(self) -> List[str]:
+        if self.model_dir is None or not self.model_dir.is_dir():
+            return []
+        return sorted(p.name for p in self.model_dir.glob("*.onnx"))
+
+    @contextmanager
+    def use(self, model: Optional[ServedModel] = None):
+        """Pin `model` (default: the active one, possibly None) for the duration of a request."""
+        model = model if model is not None else self.active
+        if model is None:
+            yield None
+            return
+        model.users += 1
+        try:
+            yield model
+        finally:
+            model.users -= 1
+            if model.retired and model.users == 0:
+                model._idle.set()
+
+    async def _build(self, path: Path) -> ServedModel:
+        async with self._load_lock:
+            self.loading = path.name
+            try:
+                model = await self._load(path)
+            except Exception as e:
+                self.last_error = f"{path.name}: {e}"
+                raise
+            finally:
+                self.loading = None
+        self.last_error = None
+        return model
+
+    def _retire(self, model: Optional[ServedModel]):
+        """Tear `model` down in the background once no request holds it."""
+        if model is None or model.retired:
+            return
+        model.retired = True
+        if model.users == 0:
+            model._idle.set()
+
+        async def teardown():
+            await model._idle.wait()
+            await self._unload(model)
+            logger.info("Unloaded model %s (%s)", model.name, model.version)
+
+        self._spawn(teardown())
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _swap(self, model: ServedModel):
+        previous, self.active = self.active, model
+        if self.on_swap is not None:
+            self.on_swap(model)
+        self.swaps += 1
+        logger.info("Serving model %s (%s)%s", model.name, model.version,
+                    f", replacing {previous.name} ({previous.version})" if previous is not None else "")
+        self._retire(previous)
+
+    async def activate(self, path: Path) -> ServedModel:
+        """Load and warm `path` while the current model keeps serving, then swap it in."""
+        if self.candidate is not None and self.candidate.name == Path(path).name:
+            return await self.promote()
+        model = await self._build(Path(path))
+        self._swap(model)
+        return model
+
+    async def set_candidate(self, path: Path, fraction: float) -> ServedModel:
+        """Load `path` beside the active model and shadow `fraction` of frames through it."""
+        model = await self._build(Path(path))
+        self._retire(self.candidate)
+        self.candidate = model
+        self.shadow_fraction = min(max(fraction, 0.0), 1.0)
+        self.shadow = ShadowStats()
+        logger.info("Shadowing %.0f%% of frames through %s (%s)", self.shadow_fraction * 100, model.name,
+                    model.version)
+        return model
+
+    async def promote(self) -> ServedModel:
+        """Make the (already warm) candidate the active model."""
+        model = self.candidate
+        if model is None:
+            raise ValueError("No candidate model loaded")
+        self.candidate = None
+        self.shadow_fraction = 0.0
+        self._swap(model)
+        return model
+
+    def drop_candidate(self):
+        self._retire(self.candidate)
+        self.candidate = None
+        self.shadow_fraction = 0.0
+
+    def shadow_frame(self, run: Callable[[ServedModel], Awaitable[Tuple[List[dict], float]]],
+                     detections: List[dict], inference_ms: float) -> bool:
+        """
+        Maybe replay a frame the active model just served on the candidate, in the background.
+        `run(candidate)` returns the candidate's (detections, inference_ms) and should keep off the
+        executors serving live requests (the app uses the worker pool's shadow thread). Frames arriving
+        while `shadow_max_in_flight` comparisons are pending are not shadowed, which bounds that backlog.
+        """
+        candidate = self.candidate
+        if (candidate is None or self._shadow_in_flight >= self.shadow_max_in_flight
+                or random.random() >= self.shadow_fraction):
+            return False
+        stats = self.shadow
+
+        async def compare():
+            self._shadow_in_flight += 1
+            try:
+                with self.use(candidate):
+                    shadow_detections, shadow_ms = await run(candidate)
+                stats.record(detections, shadow_detections, inference_ms, shadow_ms)
+            except Exception as e:
+                stats.errors += 1
+                logger.warning("Shadow inference on %s failed: %s", candidate.name, e)
+            finally:
+                self._shadow_in_flight -= 1
+
+        self._spawn(compare())
+        return True
+
+    def selection(self) -> dict:
+        return {
+            "active": self.active.name if self.active is not None else None,
+            "candidate": self.candidate.name if self.candidate is not None else None,
+            "shadow_fraction": self.shadow_fraction,
+        }
+
+    async def apply(self, selection: dict):
+        """Bring this worker to a selection written by write_selection() (from any worker)."""
+        active, candidate = selection.get("active"), selection.get("candidate")
+        if active and (self.active is None or self.active.name != active):
+            await self.activate(self.resolve(active))
+        if candidate and (self.candidate is None or self.candidate.name != candidate):
+            await self.set_candidate(self.resolve(candidate), float(selection.get("shadow_fraction", 0.0)))
+        elif not candidate and self.candidate is not None:
+            self.drop_candidate()
+        elif candidate:
+            self.shadow_fraction = float(selection.get("shadow_fraction", self.shadow_fraction))
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for model in (self.active, self.candidate):
+            if model is not None:
+                await self._unload(model)
+        self.active = self.candidate = None
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "candidate": self.candidate.describe() if self.candidate is not None else None,
+            "shadow_fraction": self.shadow_fraction,
+            "shadow": self.shadow.stats() if self.candidate is not None else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "swaps": self.swaps,
+            "available": self.available(),
+        }
+
+
+def read_selection(path: Path) -> Optional[Tuple[float, dict]]:
+    """(mtime, selection) of a selection file, or None when it doesn't exist or can't be parsed."""
+    try:
+        mtime = path.stat().st_mtime
+        with open(path, encoding="utf-8") as f:
+            return mtime, json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_selection(path: Path, selection: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(selection, f)
+    os.replace(tmp, path)
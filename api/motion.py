@@ -0,0 +1,116 @@
+"""
+Temporal frame skipping for live camera sessions.
+Consecutive frames from a slow-moving vehicle are often near-identical. Each frame gets a tiny
+grayscale signature from a 1/8-scale JPEG decode (a fraction of a full decode's cost); when it is
+close enough to the session's last inferred frame, the previous detections are returned instead
+of running the model again.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from .preprocess import jpeg_dimensions
+
+SIGNATURE_SIZE = (32, 32)
+
+
+@dataclass
+class FrameSignature:
+    thumbnail: np.ndarray  # float32 grayscale, SIGNATURE_SIZE
+    width: int
+    height: int
+
+
+@dataclass
+class SessionFrame:
+    """The last frame a session actually ran through the model."""
+    signature: FrameSignature
+    detections: List[dict]
+    width: int
+    height: int
+    inferred_at: float
+    reuse_count: int = 0
+
+
+def frame_signature(file_bytes) -> Optional[FrameSignature]:
+    """Downscaled grayscale thumbnail of an upload; None when the bytes are not a decodable image."""
+    small = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+    dims = jpeg_dimensions(file_bytes) or (small.shape[1] * 8, small.shape[0] * 8)
+    thumbnail = cv2.resize(small, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    return FrameSignature(thumbnail=thumbnail, width=dims[0], height=dims[1])
+
+
+def frame_difference(a: FrameSignature, b: FrameSignature) -> float:
+    """Mean absolute gray-level difference (0-255) between two signatures, after removing global brightness shift."""
+    delta = a.thumbnail - b.thumbnail
+    delta -= delta.mean()
+    return float(np.abs(delta).mean())
+
+
+class MotionGate:
+    """
+    Remembers the last inferred frame per session and decides whether a new frame needs inference.
+    Reuse is capped by `max_reuse` consecutive frames and `max_age_ms` so a static scene still gets
+    re-checked regularly; the least recently used sessions are forgotten beyond `max_sessions`.
+    """
+
+    def __init__(self, threshold: float = 2.0, max_reuse: int = 5, max_age_ms: float = 1000.0,
+                 max_sessions: int = 1024):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.max_age = max_age_ms / 1000.0
+        self.max_sessions = max_sessions
+        self._frames: "OrderedDict[str, SessionFrame]" = OrderedDict()
+        self.checked = 0
+        self.reused = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "MotionGate":
+        return cls(
+            threshold=settings.motion_threshold,
+            max_reuse=settings.motion_max_reuse,
+            max_age_ms=settings.motion_max_age_ms,
+        )
+
+    def lookup(self, session_id: str, signature: FrameSignature) -> Optional[SessionFrame]:
+        """Return the session's last inferred frame when this one is close enough to reuse it, else None."""
+        self.checked += 1
+        last = self._frames.get(session_id)
+        if last is None:
+            return None
+        self._frames.move_to_end(session_id)
+
+        if (last.signature.width, last.signature.height) != (signature.width, signature.height):
+            return None
+        if last.reuse_count >= self.max_reuse or time.monotonic() - last.inferred_at > self.max_age:
+            return None
+
+        if frame_difference(last.signature, signature) > self.threshold:
+            return None
+
+        last.reuse_count += 1
+        self.reused += 1
+        return last
+
+    def update(self, session_id: str, signature: FrameSignature, detections: List[dict], width: int, height: int):
+        self._frames[session_id] = SessionFrame(signature, detections, width, height, time.monotonic())
+        self._frames.move_to_end(session_id)
+        while len(self._frames) > self.max_sessions:
+            self._frames.popitem(last=False)
+
+    def forget(self, session_id: str):
+        self._frames.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._frames),
+            "checked": self.checked,
+            "reused": self.reused,
+            "reuse_rate": round(self.reused / self.checked, 4) if self.checked else 0.0,
+        }
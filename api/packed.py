@@ -0,0 +1,103 @@
+"""
+Packed binary encoding of detection results, negotiated with `Accept: application/x-hazard-detections`.
+At 10+ fps with dense scenes the per-detection JSON objects dominate bandwidth and client parse
+time, so the packed form is struct-of-arrays that a browser can view with typed arrays, no parsing:
+
+    header   32 bytes, little-endian (HEADER below)
+    boxes    float32[count * 4]   x1, y1, x2, y2 in original image pixels
+    classes  uint16[count]        index into web/labels.json
+    scores   float16[count]
+    extra    UTF-8 JSON, `extra_len` bytes; the fields that are not fixed-size, when present:
+             new_reports, qos (pacing hint, api/qos.py) and model_version
+
+Each array starts at an offset aligned for its typed-array view.
+public/js/result_normalizer.js decodes it with decodePackedResult().
+"""
+import json
+import struct
+from typing import Optional
+
+import numpy as np
+
+MEDIA_TYPE = "application/x-hazard-detections"
+MAGIC = b"HZDT"
+VERSION = 1
+# magic, version, flags, reserved, frame_id, width, height, count, processing_time_ms, extra_len
+HEADER = struct.Struct("<4sBBHIIIIfI")
+
+FLAG_REUSED = 1
+FLAG_NEW_REPORTS = 2
+# Optional response fields carried verbatim in the extra JSON.
+EXTRA_FIELDS = ("qos", "model_version")
+
+
+def accepts_packed(accept: Optional[str]) -> bool:
+    """True when the Accept header asks for the packed format (explicitly, not via */*)."""
+    if not accept:
+        return False
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() != MEDIA_TYPE:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def pack_response(response: dict, frame_id: int = 0) -> bytes:
+    """Encode a /detect response dict (see detection_response in api/app.py)."""
+    detections = response["detections"]
+    count = len(detections)
+    boxes = np.array([d["box"] for d in detections], dtype="<f4").reshape(count, 4)
+    classes = np.array([d["class_id"] for d in detections], dtype="<u2")
+    scores = np.array([d["score"] for d in detections], dtype="<f2")
+
+    flags = FLAG_REUSED if response.get("reused") else 0
+    fields = {name: response[name] for name in EXTRA_FIELDS if response.get(name) is not None}
+    if response.get("has_new_reports"):
+        flags |= FLAG_NEW_REPORTS
+        fields["new_reports"] = response["new_reports"]
+    extra = json.dumps(fields, separators=(",", ":")).encode() if fields else b""
+
+    size = response["original_image_size"]
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, frame_id, size["width"], size["height"], count,
+                         response["processing_time"], len(extra))
+    return b"".join((header, boxes.tobytes(), classes.tobytes(), scores.tobytes(), extra))
+
+
+def unpack_response(data: bytes) -> dict:
+    """Decode a packed payload back into the JSON response shape (detections without labels)."""
+    magic, version, flags, _, frame_id, width, height, count, processing_time, extra_len = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a packed detection payload")
+
+    offset = HEADER.size
+    boxes = np.frombuffer(data, dtype="<f4", count=count * 4, offset=offset).reshape(count, 4)
+    offset += boxes.nbytes
+    classes = np.frombuffer(data, dtype="<u2", count=count, offset=offset)
+    offset += classes.nbytes
+    scores = np.frombuffer(data, dtype="<f2", count=count, offset=offset)
+    offset += scores.nbytes
+    extra = json.loads(data[offset:offset + extra_len]) if extra_len else {}
+
+    decoded = {
+        "frame_id": frame_id,
+        "detections": [
+            {"box": box.tolist(), "class_id": int(class_id), "score": float(score)}
+            for box, class_id, score in zip(boxes, classes, scores)
+        ],
+        "original_image_size": {"width": width, "height": height},
+        "detections_count": count,
+        "processing_time": processing_time,
+        "reused": bool(flags & FLAG_REUSED),
+        "has_new_reports": bool(flags & FLAG_NEW_REPORTS),
+        "new_reports": extra.get("new_reports", []),
+    }
+    decoded.update((name, extra[name]) for name in EXTRA_FIELDS if name in extra)
+    return decoded
@@ -0,0 +1,165 @@
+"""
+Vectorized postprocessing of raw YOLO outputs: confidence filtering, class-aware NMS and
+inverse-letterbox rescaling to the original image, for a whole batch at once.
+
+Decoding, confidence filtering and rescaling are array operations over the whole batch. NMS is
+the sequential part: greedy NMS runs once per kept box, and each step scans every remaining
+candidate, so one shared pass over the whole batch would cost (boxes kept in the batch) x
+(candidates in the batch). It therefore runs per image, class-aware through per-class coordinate
+offsets, and stops as soon as `max_detections` boxes are kept: later boxes could only be cut by
+the cap. (IoU-matrix formulations such as Cluster-NMS avoid the per-box loop but are O(N^2) per
+pass; with NumPy on CPU they measured 3-18x slower than greedy at 500-4000 candidates.)
+
+Model coordinates map back per axis with the factors of the resize that actually happened
+(original width / letterboxed width), not 1/scale: the letterboxed size is rounded to whole
+pixels, so 1/scale drifts by up to half a model pixel across the image. drawDetections() in
+src/utils/yolo-runtime.js maps boxes the same way.
+"""
+import functools
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .preprocess import LetterboxParams
+
+# Per-image cap on candidates entering NMS, as in Ultralytics (max_nms); only hit by degenerate outputs.
+MAX_CANDIDATES = 30000
+
+
+class Detections(NamedTuple):
+    boxes: np.ndarray  # (K, 4) float32 xyxy in original image pixels
+    scores: np.ndarray  # (K,) float32
+    class_ids: np.ndarray  # (K,) int64
+
+
+def to_rows(output: np.ndarray, num_classes: int) -> np.ndarray:
+    """Normalize a raw YOLO output batch to (B, N, C) rows.
+
+    YOLOv8 exports (B, 4 + nc, N); YOLOv5 exports (B, N, 5 + nc) with an objectness column.
+    """
+    if output.ndim == 2:
+        output = output[None]
+    if output.shape[1] in (4 + num_classes, 5 + num_classes) and output.shape[2] > output.shape[1]:
+        output = output.transpose(0, 2, 1)
+    return output
+
+
+def class_scores(rows: np.ndarray, num_classes: int) -> np.ndarray:
+    """Per-class confidences of (..., N, C) prediction rows, folding in YOLOv5's objectness."""
+    if rows.shape[-1] == 5 + num_classes:
+        return rows[..., 5:] * rows[..., 4:5]
+    return rows[..., 4:4 + num_classes]
+
+
+def decode_rows(rows: np.ndarray, num_classes: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split (..., N, C) prediction rows into xyxy boxes, best-class scores and class ids."""
+    scores_per_class = class_scores(rows, num_classes)
+    class_ids = scores_per_class.argmax(axis=-1)
+    scores = np.take_along_axis(scores_per_class, class_ids[..., None], axis=-1)[..., 0]
+
+    cx, cy, w, h = rows[..., 0], rows[..., 1], rows[..., 2], rows[..., 3]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=-1)
+    return boxes, scores, class_ids
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, max_keep: Optional[int] = None) -> np.ndarray:
+    """Greedy non-maximum suppression over xyxy boxes; IoU against the kept box is computed for all others at once.
+    With `max_keep`, stops after that many boxes, which are the same first boxes a full pass would keep."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0 and (max_keep is None or len(keep) < max_keep):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+        h = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, groups: np.ndarray, iou_threshold: float,
+                max_keep: Optional[int] = None) -> np.ndarray:
+    """NMS in one pass where boxes only suppress within their group (e.g. their class)."""
+    if scores.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Shift each group into its own coordinate range so no two groups ever overlap.
+    span = float(boxes.max() - min(float(boxes.min()), 0.0)) + 1.0
+    return nms(boxes + (groups[:, None] * span).astype(boxes.dtype), scores, iou_threshold, max_keep)
+
+
+def postprocess_batch(
+    output: np.ndarray,
+    params: Sequence[LetterboxParams],
+    sizes: Sequence[Tuple[int, int]],
+    num_classes: int,
+    confidence_threshold: float = 0.25,
+    iou_threshold: float = 0.45,
+    max_detections: int = 100,
+) -> List[Detections]:
+    """
+    Turn a raw model output batch (YOLOv8 or YOLOv5 layout) into per-image detections.
+    `params[i]` is image i's letterbox and `sizes[i]` its original (width, height); each image's
+    detections come back in descending score order, at most `max_detections` of them.
+    """
+    rows = to_rows(output, num_classes)
+    batch = rows.shape[0]
+    # Only the best class score is needed to filter; boxes and class ids are decoded for survivors alone.
+    # Taking the maximum column by column is far faster than reducing over the short last axis.
+    scores_per_class = class_scores(rows, num_classes)
+    best = functools.reduce(np.maximum, (scores_per_class[..., k] for k in range(num_classes)))
+    image_ids, anchors = np.nonzero(best >= confidence_threshold)  # sorted by image
+    counts = np.bincount(image_ids, minlength=batch)
+    if counts.max(initial=0) > MAX_CANDIDATES:
+        image_ids, anchors = _cap_candidates(best, image_ids, anchors, counts)
+        counts = np.bincount(image_ids, minlength=batch)
+    boxes, scores, class_ids = decode_rows(rows[image_ids, anchors].astype(np.float32, copy=False), num_classes)
+
+    # Per-image NMS over each image's slice of the candidates; results stay in score order.
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    keep = [start + batched_nms(boxes[start:end], scores[start:end], class_ids[start:end], iou_threshold,
+                                max_detections)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    keep = np.concatenate(keep) if keep else np.zeros(0, dtype=np.int64)
+    boxes, scores, class_ids, image_ids = boxes[keep], scores[keep], class_ids[keep], image_ids[keep]
+
+    # Inverse letterbox for every kept box at once, with per-image offsets, factors and bounds.
+    offset = np.array([(p.offset_x, p.offset_y) for p in params], dtype=np.float32)[image_ids]
+    factor = np.array([(w / p.new_width, h / p.new_height) for p, (w, h) in zip(params, sizes)],
+                      dtype=np.float32)[image_ids]
+    bound = np.array(sizes, dtype=np.float32).reshape(-1, 2)[image_ids]
+    boxes = (boxes - np.tile(offset, 2)) * np.tile(factor, 2)
+    np.clip(boxes, 0, np.tile(bound, 2), out=boxes)
+
+    split = np.searchsorted(image_ids, np.arange(1, batch))
+    return [Detections(b, s, c) for b, s, c in zip(np.split(boxes, split), np.split(scores, split),
+                                                   np.split(class_ids, split))]
+
+
+def _cap_candidates(scores, image_ids, anchors, counts):
+    """Keep each image's MAX_CANDIDATES best-scoring candidates."""
+    keep = []
+    for image in np.flatnonzero(counts):
+        index = np.flatnonzero(image_ids == image)
+        if index.size > MAX_CANDIDATES:
+            top = np.argpartition(scores[image, anchors[index]], -MAX_CANDIDATES)[-MAX_CANDIDATES:]
+            index = index[top]
+        keep.append(index)
+    keep = np.sort(np.concatenate(keep))
+    return image_ids[keep], anchors[keep]
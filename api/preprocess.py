@@ -0,0 +1,257 @@
+"""
+Decoding and letterbox preprocessing for the detection model.
+Uploads only ever feed a 640-px letterbox, so JPEGs are decoded at reduced resolution through
+libjpeg's DCT scaling whenever that still leaves enough pixels, and resize, BGR->RGB, HWC->CHW
+and normalization write straight into reusable buffers instead of allocating per request.
+"""
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Ultralytics letterboxes with gray padding during training, so we do the same at inference.
+PAD_VALUE = 114
+
+_REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# Start-of-frame markers carry the image size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but don't.
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_MAX_SCRATCH_SHAPES = 4
+
+_scratch = threading.local()
+
+
+@dataclass(frozen=True)
+class LetterboxParams:
+    """Same fields as computeLetterboxParams() in src/utils/yolo-runtime.js."""
+    scale: float
+    new_width: int
+    new_height: int
+    offset_x: int
+    offset_y: int
+
+
+@dataclass
+class PreparedImage:
+    """A decoded, letterboxed upload ready for the model. Module-level so it pickles across process pools."""
+    tensor: np.ndarray
+    params: LetterboxParams
+    width: int
+    height: int
+    decode_ms: float
+    preprocess_ms: float
+    decode_factor: int = 1
+
+
+def compute_letterbox_params(width: int, height: int, target_size: int) -> LetterboxParams:
+    scale = min(target_size / width, target_size / height)
+    # Round half up like Math.round() in the browser's computeLetterboxParams(); round() rounds half to even.
+    new_width = math.floor(width * scale + 0.5)
+    new_height = math.floor(height * scale + 0.5)
+    return LetterboxParams(
+        scale=scale,
+        new_width=new_width,
+        new_height=new_height,
+        offset_x=(target_size - new_width) // 2,
+        offset_y=(target_size - new_height) // 2,
+    )
+
+
+def jpeg_dimensions(data) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from a JPEG's SOF segment without decoding; None for non-JPEG data."""
+    size = len(data)
+    if size < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < size:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers have no length
+            i += 2
+            continue
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return (width, height) if width and height else None
+        if marker == 0xDA:  # scan data before any SOF: malformed
+            return None
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def image_dimensions(data) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG, PNG, WebP or BMP header without decoding; None for anything else."""
+    dims = jpeg_dimensions(data)
+    if dims is not None:
+        return dims
+    head = bytes(data[:30])
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR" and len(head) >= 24:
+        return int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            return int.from_bytes(head[26:28], "little") & 0x3FFF, int.from_bytes(head[28:30], "little") & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        return None
+    if head.startswith(b"BM") and len(head) >= 26:
+        height = int.from_bytes(head[22:26], "little", signed=True)  # negative for top-down rows
+        return int.from_bytes(head[18:22], "little", signed=True), abs(height)
+    return None
+
+
+def reduction_factor(width: int, height: int, target_size: int) -> int:
+    """Largest DCT scale (2, 4 or 8) whose output is still at least the letterboxed size, else 1."""
+    params = compute_letterbox_params(width, height, target_size)
+    for factor in (8, 4, 2):
+        if width // factor >= params.new_width and height // factor >= params.new_height:
+            return factor
+    return 1
+
+
+def decode_for_model(file_bytes, target_size: Optional[int] = None):
+    """
+    Decode an upload for a `target_size` letterbox. Returns (image, width, height, factor) where
+    width/height are the original dimensions, or None when the bytes are not a decodable image.
+    np.frombuffer only wraps the upload bytes; nothing is copied before libjpeg reads them.
+    """
+    buffer = np.frombuffer(file_bytes, dtype=np.uint8)
+    dims = jpeg_dimensions(file_bytes) if target_size else None
+    factor = reduction_factor(dims[0], dims[1], target_size) if dims else 1
+
+    image = cv2.imdecode(buffer, _REDUCED_DECODE_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    if image is None:
+        return None
+    if factor == 1:
+        return image, image.shape[1], image.shape[0], 1
+
+    width, height = dims
+    # EXIF orientation is applied while decoding, so a rotated photo comes back with its sides swapped.
+    if (image.shape[1] > image.shape[0]) != (width > height):
+        width, height = height, width
+    return image, width, height, factor
+
+
+def _resize_scratch(height: int, width: int) -> np.ndarray:
+    """Per-thread uint8 resize target, reused across requests with the same letterbox geometry."""
+    buffers = getattr(_scratch, "resize", None)
+    if buffers is None:
+        buffers = _scratch.resize = {}
+    buffer = buffers.get((height, width))
+    if buffer is None:
+        if len(buffers) >= _MAX_SCRATCH_SHAPES:
+            buffers.clear()
+        buffer = buffers[(height, width)] = np.empty((height, width, 3), dtype=np.uint8)
+    return buffer
+
+
+def letterbox_into(
+    image: np.ndarray, out: np.ndarray, width: Optional[int] = None, height: Optional[int] = None
+) -> LetterboxParams:
+    """
+    Letterbox a BGR image into a preallocated (3, S, S) float32 RGB slot, normalized to [0, 1].
+    `width`/`height` are the original dimensions when `image` was decoded at reduced scale, so the
+    returned params always map model coordinates back to the original upload.
+    """
+    target_size = out.shape[-1]
+    params = compute_letterbox_params(width or image.shape[1], height or image.shape[0], target_size)
+    x0, y0 = params.offset_x, params.offset_y
+    x1, y1 = x0 + params.new_width, y0 + params.new_height
+
+    resized = _resize_scratch(params.new_height, params.new_width)
+    cv2.resize(image, (params.new_width, params.new_height), dst=resized, interpolation=cv2.INTER_LINEAR)
+
+    # Only the borders need padding; the image region is overwritten below.
+    pad = PAD_VALUE / 255.0
+    out[:, :y0, :] = pad
+    out[:, y1:, :] = pad
+    out[:, y0:y1, :x0] = pad
+    out[:, y0:y1, x1:] = pad
+
+    # One pass does BGR->RGB (channel flip), HWC->CHW (transposed view) and uint8->[0, 1] float32.
+    np.multiply(resized.transpose(2, 0, 1)[::-1], np.float32(1.0 / 255.0), out=out[:, y0:y1, x0:x1])
+    return params
+
+
+def letterbox(image: np.ndarray, target_size: int) -> Tuple[np.ndarray, LetterboxParams]:
+    """Resize a BGR image into a padded square and return it as a (3, S, S) float32 RGB tensor in [0, 1]."""
+    tensor = np.empty((3, target_size, target_size), dtype=np.float32)
+    return tensor, letterbox_into(image, tensor)
+
+
+def decode_image(file_bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def probe_image_size(file_bytes) -> Optional[Tuple[int, int]]:
+    dims = jpeg_dimensions(file_bytes)
+    if dims is not None:
+        return dims
+    image = decode_image(file_bytes)
+    return None if image is None else (image.shape[1], image.shape[0])
+
+
+def prepare_image(file_bytes, input_size: int, out: Optional[np.ndarray] = None) -> Optional[PreparedImage]:
+    """Decode and letterbox an upload; returns None when the bytes are not a decodable image.
+
+    Pass `out` (a pooled tensor or a (3, S, S) slice of a batch buffer) to write in place instead of allocating.
+    """
+    start = time.perf_counter()
+    decoded = decode_for_model(file_bytes, input_size)
+    if decoded is None:
+        return None
+    image, width, height, factor = decoded
+    decoded_at = time.perf_counter()
+
+    tensor = out if out is not None else np.empty((3, input_size, input_size), dtype=np.float32)
+    params = letterbox_into(image, tensor, width, height)
+    return PreparedImage(
+        tensor=tensor,
+        params=params,
+        width=width,
+        height=height,
+        decode_ms=(decoded_at - start) * 1000,
+        preprocess_ms=(time.perf_counter() - decoded_at) * 1000,
+        decode_factor=factor,
+    )
+
+
+class TensorPool:
+    """
+    Recycles (3, S, S) float32 model-input tensors between requests.
+    A tensor is only released once the model call that read it has finished, so pooled buffers
+    are never overwritten while still queued in the micro-batcher.
+    """
+
+    def __init__(self, input_size: int, capacity: int = 32):
+        self.shape = (3, input_size, input_size)
+        self.capacity = capacity
+        self._free = deque()
+        self.allocated = 0
+
+    def acquire(self) -> np.ndarray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            self.allocated += 1
+            return np.empty(self.shape, dtype=np.float32)
+
+    def release(self, tensor: np.ndarray):
+        if len(self._free) < self.capacity:
+            self._free.append(tensor)
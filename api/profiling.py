@@ -0,0 +1,139 @@
+"""
+Opt-in sampling profiler for slow requests (PROFILE_SLOW_REQUEST_MS).
+A daemon thread samples the Python stack of every busy thread (event loop, decode and inference
+executors) every few milliseconds into a short ring buffer. When a request takes longer than the
+threshold, the samples taken during it are written as collapsed stacks, one
+`thread;outer;...;inner count` line per distinct stack, by the sampler thread itself so the event
+loop never blocks on the file. That format feeds flamegraph.pl,
+speedscope or inferno directly:
+
+    flamegraph.pl profiles/slow-*.folded > slow.svg
+
+The samples cover the whole process, so concurrent requests show up in each other's profiles.
+Sampling cost grows with thread count and stack depth, which is why this is off by default.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of threads that are parked, not working: idle executors, the idle event loop.
+IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+})
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SlowRequestProfiler:
+    def __init__(self, output_dir: Path, threshold_ms: float, interval_ms: float = 5.0,
+                 window_seconds: float = 30.0, max_profiles: int = 100, cooldown_seconds: float = 5.0):
+        self.output_dir = Path(output_dir)
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.max_profiles = max_profiles
+        self.cooldown = cooldown_seconds
+        self._samples = deque(maxlen=max(1, int(window_seconds / self.interval)))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_dump = float("-inf")
+        self._pending = deque()  # (label, start, end, path) for the sampler thread to write
+        self.profiles_written = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> Optional["SlowRequestProfiler"]:
+        if settings.profile_slow_request_ms <= 0:
+            return None
+        return cls(
+            output_dir=settings.profile_dir,
+            threshold_ms=settings.profile_slow_request_ms,
+            interval_ms=settings.profile_sample_interval_ms,
+        )
+
+    def start(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+        logger.info("Profiling requests slower than %.0f ms into %s", self.threshold * 1000, self.output_dir)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own_id)
+            self._write_pending()
+        self._write_pending()
+
+    def _sample(self, own_id: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        now = time.perf_counter()
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            stacks.append(";".join(reversed(stack)))
+        if stacks:
+            self._samples.append((now, stacks))
+
+    def _write_pending(self):
+        while self._pending:
+            label, start, end, path = self._pending.popleft()
+            counts = self.collapsed(start, end)
+            if not counts:
+                continue
+            try:
+                with open(path, "w") as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+            except OSError as e:
+                logger.warning("Could not write slow-request profile: %s", e)
+                continue
+            logger.info("Slow request (%s, %.0f ms): profile written to %s", label, (end - start) * 1000, path)
+
+    def collapsed(self, start: float, end: float) -> Counter:
+        """Stack counts sampled between two perf_counter() times."""
+        counts = Counter()
+        for sampled_at, stacks in list(self._samples):
+            if start <= sampled_at <= end:
+                counts.update(stacks)
+        return counts
+
+    def request_finished(self, label: str, start: float, end: float) -> Optional[Path]:
+        """
+        Queue a profile for the sampler thread to write when the request was slow; returns the path it
+        will be written to (nothing is written if no busy thread was sampled during the request).
+        Rate limited by a cooldown and a file cap.
+        """
+        if end - start < self.threshold or self.profiles_written >= self.max_profiles:
+            return None
+        if end - self._last_dump < self.cooldown:
+            return None
+        self._last_dump = end
+        self.profiles_written += 1
+        path = self.output_dir / f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{label}-{int((end - start) * 1000)}ms.folded"
+        self._pending.append((label, start, end, path))
+        if self._thread is None or not self._thread.is_alive():
+            self._write_pending()  # stopped: nothing is serving requests any more
+        return path
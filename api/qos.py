@@ -0,0 +1,129 @@
+"""
+Server-driven quality of service for live camera sessions.
+Every detection response carries a hint telling the client when to send its next frame, how large
+to make it and how hard to compress it. A per-session state machine walks a ladder of quality
+levels: it steps down as soon as the server is loaded or this session's latency overshoots its
+target, and climbs back one step only after a run of comfortable frames, so the fleet backs off
+together under load and no session oscillates between levels.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, NamedTuple, Optional
+
+
+class QosLevel(NamedTuple):
+    name: str
+    frame_interval_ms: int  # minimum time between the starts of two uploads
+    max_dimension: int  # longest side of the uploaded frame, in pixels
+    jpeg_quality: int  # 0-100
+
+
+LEVELS = (
+    QosLevel("full", 100, 1280, 85),
+    QosLevel("reduced", 200, 960, 75),
+    QosLevel("low", 400, 640, 65),
+    QosLevel("minimal", 1000, 480, 55),
+)
+
+
+@dataclass
+class SessionQos:
+    level: int = 0
+    latency_ms: Optional[float] = None  # exponentially weighted moving average
+    calm_frames: int = 0  # consecutive frames that qualified for stepping up
+    hold_frames: int = 0  # frames to wait before stepping down again
+
+
+class QosController:
+    """
+    `load` returns server utilization in [0, 1] (admitted requests over capacity). A session
+    steps down a level when load reaches `high_load` or its smoothed latency exceeds
+    `target_latency_ms`, then holds for `hold_frames` frames so the effect of the step shows up
+    before the next one. It steps up after `recover_frames` consecutive frames under `low_load`
+    and well within the latency target.
+    """
+
+    def __init__(self, load: Callable[[], float], target_latency_ms: float = 300.0,
+                 high_load: float = 0.75, low_load: float = 0.4, recover_frames: int = 10,
+                 hold_frames: int = 3, smoothing: float = 0.3, max_sessions: int = 10000):
+        self.load = load
+        self.target_latency_ms = target_latency_ms
+        self.high_load = high_load
+        self.low_load = low_load
+        self.recover_frames = recover_frames
+        self.hold_frames = hold_frames
+        self.smoothing = smoothing
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionQos]" = OrderedDict()
+        self.step_downs = 0
+        self.step_ups = 0
+
+    @classmethod
+    def from_settings(cls, settings, load: Callable[[], float]) -> "QosController":
+        return cls(
+            load=load,
+            target_latency_ms=settings.qos_target_latency_ms,
+            high_load=settings.qos_high_load,
+            low_load=settings.qos_low_load,
+            recover_frames=settings.qos_recover_frames,
+        )
+
+    def advise(self, session_id: str, latency_ms: float) -> dict:
+        """Fold one frame's server latency into the session's state and return the hint for its next frame."""
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = SessionQos()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+
+        if state.latency_ms is None:
+            state.latency_ms = latency_ms
+        else:
+            state.latency_ms += self.smoothing * (latency_ms - state.latency_ms)
+        self._transition(state, self.load())
+        return self.hint(state)
+
+    def _transition(self, state: SessionQos, load: float):
+        if state.hold_frames > 0:
+            state.hold_frames -= 1
+        overloaded = load >= self.high_load or state.latency_ms > self.target_latency_ms
+        if overloaded:
+            state.calm_frames = 0
+            if state.level < len(LEVELS) - 1 and state.hold_frames == 0:
+                state.level += 1
+                state.hold_frames = self.hold_frames
+                self.step_downs += 1
+        elif load <= self.low_load and state.latency_ms <= 0.6 * self.target_latency_ms:
+            state.calm_frames += 1
+            if state.level > 0 and state.calm_frames >= self.recover_frames:
+                state.level -= 1
+                state.calm_frames = 0
+                self.step_ups += 1
+        else:
+            state.calm_frames = 0
+
+    def hint(self, state: SessionQos) -> dict:
+        level = LEVELS[state.level]
+        # Never ask for frames faster than this session is actually being served.
+        interval = max(level.frame_interval_ms, state.latency_ms or 0.0)
+        return {
+            "level": level.name,
+            "next_frame_ms": int(round(interval)),
+            "max_dimension": level.max_dimension,
+            "jpeg_quality": level.jpeg_quality,
+        }
+
+    def forget(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        levels = {level.name: 0 for level in LEVELS}
+        for state in self._sessions.values():
+            levels[LEVELS[state.level].name] += 1
+        return {
+            "sessions_by_level": levels,
+            "step_downs": self.step_downs,
+            "step_ups": self.step_ups,
+            "load": round(self.load(), 3),
+        }
@@ -0,0 +1,300 @@
+"""
+Report images by reference.
+A report keeps only the key of the frame that created it. The frame bytes go to a FrameStore
+(a local directory by default) through a bounded background queue, so neither the request path
+nor the report JSON ever carries the image. The annotated plot and the dashboard thumbnail are
+rendered only when a client first asks for them, then served from a byte-bounded LRU.
+
+Frames are reference-counted by the reports pointing at them and deleted once the last of those
+sessions is evicted, unless a report was saved: `save_view` writes that report's box and caption
+next to the frame and keeps the frame for good, so the saved report's images are served by
+image key (frame key / report id) after its session is gone, the process restarts, or on another
+worker sharing the store. When the write queue is full the frame is dropped (the report still
+exists, its image endpoints return 404) rather than holding memory without bound.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import cv2
+import numpy as np
+
+from .preprocess import decode_for_model
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("image", "plot", "thumbnail")
+BOX_COLOR = (0, 0, 255)  # red, as the browser draws detections
+FRAME_KEY = re.compile(r"[0-9a-f]{32}")
+REPORT_ID = re.compile(r"[0-9a-f-]{36}")
+
+
+class FrameStore:
+    """Frames as files under `root`, fanned out by key prefix. Blocking; called from an executor.
+    An object-store backend only needs the same put/get/delete."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:3] == b"\xff\xd8\xff"
+
+
+def encode_jpeg(image: np.ndarray, quality: int) -> bytes:
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def draw_box(image: np.ndarray, box: Sequence[float], caption: str, scale: float = 1.0):
+    x1, y1, x2, y2 = (int(round(v * scale)) for v in box)
+    thickness = max(1, round(min(image.shape[:2]) / 300))
+    cv2.rectangle(image, (x1, y1), (x2, y2), BOX_COLOR, thickness)
+    font_scale = max(0.4, min(image.shape[:2]) / 1000)
+    (text_w, text_h), baseline = cv2.getTextSize(caption, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    top = max(y1 - text_h - baseline - 2, 0)
+    cv2.rectangle(image, (x1, top), (x1 + text_w + 4, top + text_h + baseline + 2), BOX_COLOR, -1)
+    cv2.putText(image, caption, (x1 + 2, top + text_h + 1), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                (255, 255, 255), thickness, cv2.LINE_AA)
+
+
+def render(kind: str, frame: bytes, box: Sequence[float], caption: str,
+           thumbnail_size: int = 320, quality: int = 85) -> Optional[bytes]:
+    """
+    JPEG bytes for one report view: the frame itself ("image", re-encoded only if it wasn't a
+    JPEG), the frame with the report's box drawn ("plot"), or a plot at most `thumbnail_size`
+    pixels on its long side ("thumbnail", decoded at reduced resolution). None for undecodable frames.
+    """
+    if kind == "image" and is_jpeg(frame):
+        return frame
+    decoded = decode_for_model(frame, thumbnail_size if kind == "thumbnail" else None)
+    if decoded is None:
+        return None
+    image, width, height, _ = decoded
+    if kind == "image":
+        return encode_jpeg(image, quality)
+
+    scale = image.shape[1] / width
+    if kind == "thumbnail":
+        scale *= min(1.0, thumbnail_size / max(image.shape[:2]))
+        if scale * width < image.shape[1]:
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+    draw_box(image, box, caption, scale)
+    return encode_jpeg(image, quality)
+
+
+def view_name(key: str, report_id: str) -> str:
+    """Store key of a saved report's view record, kept beside its frame."""
+    return f"{key}.{report_id}.json"
+
+
+class ReportImages:
+    def __init__(self, store: FrameStore, max_pending: int = 64, cache_bytes: int = 32 * 1024 * 1024,
+                 thumbnail_size: int = 320, jpeg_quality: int = 85):
+        self.store = store
+        self.max_pending = max_pending
+        self.cache_bytes = cache_bytes
+        self.thumbnail_size = thumbnail_size
+        self.jpeg_quality = jpeg_quality
+        # Frames and saved views not yet in the store, served from memory meanwhile; the queue holds
+        # ("put"|"delete", frame key) and ("view", view name).
+        self._pending: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+        self._saved: Set[str] = set()  # held frames with a saved view; release() never deletes these
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-images")
+        self._rendered: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self._rendered_bytes = 0
+        self.written = 0
+        self.dropped = 0
+        self.renders = 0
+        self.hits = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "ReportImages":
+        return cls(
+            store=FrameStore(settings.report_image_dir),
+            max_pending=settings.report_image_queue,
+            cache_bytes=settings.report_image_cache_mb * 1024 * 1024,
+            thumbnail_size=settings.report_thumbnail_size,
+            jpeg_quality=settings.report_jpeg_quality,
+        )
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def flush(self):
+        """Wait until every queued write and delete has reached the store."""
+        await self._queue.join()
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush queued writes (bounded by `timeout`), then stop the writer."""
+        if self._writer is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d report frames not yet written", len(self._pending))
+        self._writer.cancel()
+        self._io.shutdown(wait=False)
+
+    def keep_frame(self, frame: bytes, references: int = 1) -> Optional[str]:
+        """Queue a frame for storage on behalf of `references` reports; returns its key, or None if dropped."""
+        if self._queue is None or len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return None
+        key = uuid.uuid4().hex
+        self._pending[key] = frame
+        self._refs[key] = references
+        self._queue.put_nowait(("put", key))
+        return key
+
+    def save_view(self, key: str, report_id: str, box: Sequence[float], caption: str) -> Optional[str]:
+        """
+        Keep a report's view of a frame beyond its session; returns the image key for `saved_view`
+        (and the /report-images endpoint), or None when the frame is no longer held.
+        """
+        if self._queue is None or key not in self._refs or not REPORT_ID.fullmatch(report_id):
+            return None
+        name = view_name(key, report_id)
+        self._pending[name] = json.dumps({"box": list(box), "caption": caption}).encode()
+        self._saved.add(key)
+        self._queue.put_nowait(("view", name))
+        return f"{key}/{report_id}"
+
+    def release(self, keys: List[str]):
+        """Drop one report's reference to each frame; unreferenced frames are deleted in the background."""
+        for key in keys:
+            refs = self._refs.get(key, 0) - 1
+            if refs > 0:
+                self._refs[key] = refs
+                continue
+            self._refs.pop(key, None)
+            if key in self._saved:
+                if key not in self._pending:  # else the writer still needs it; it drops it after the put
+                    self._saved.discard(key)
+                continue  # a saved report still points at it
+            for cache_key in [k for k in self._rendered if k[1] == key]:
+                self._forget_rendered(cache_key)
+            if self._queue is not None:
+                self._queue.put_nowait(("delete", key))
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            op, key = await self._queue.get()
+            try:
+                if op == "put" and (key in self._refs or key in self._saved):
+                    await loop.run_in_executor(self._io, self.store.put, key, self._pending[key])
+                    self.written += 1
+                elif op == "view":
+                    await loop.run_in_executor(self._io, self.store.put, key, self._pending[key])
+                elif op == "delete":
+                    await loop.run_in_executor(self._io, self.store.delete, key)
+            except OSError as e:
+                logger.warning("Report frame %s %s failed: %s", key, op, e)
+            finally:
+                if op in ("put", "view"):
+                    self._pending.pop(key, None)
+                if op == "put" and key not in self._refs:
+                    self._saved.discard(key)
+                self._queue.task_done()
+
+    async def frame(self, key: str) -> Optional[bytes]:
+        data = self._pending.get(key)
+        if data is not None:
+            return data
+        return await asyncio.get_running_loop().run_in_executor(self._io, self.store.get, key)
+
+    async def view(self, kind: str, key: str, box: Sequence[float], caption: str,
+                   run: Callable, report_id: str = "") -> Optional[bytes]:
+        """
+        A report's rendered JPEG, from the cache or rendered now by `run(render, ...)` (e.g. the
+        worker pool). The box and caption must be fixed for a given frame key and report.
+        """
+        cache_key = (kind, key, report_id)
+        cached = self._rendered.get(cache_key)
+        if cached is not None:
+            self._rendered.move_to_end(cache_key)
+            self.hits += 1
+            return cached
+        frame = await self.frame(key)
+        if frame is None:
+            return None
+        data = await run(render, kind, frame, list(box), caption, self.thumbnail_size, self.jpeg_quality)
+        if data is None:
+            return None
+        self.renders += 1
+        if key in self._refs and len(data) <= self.cache_bytes:
+            self._rendered[cache_key] = data
+            self._rendered_bytes += len(data)
+            while self._rendered_bytes > self.cache_bytes:
+                _, evicted = self._rendered.popitem(last=False)
+                self._rendered_bytes -= len(evicted)
+        return data
+
+    async def saved_view(self, kind: str, image_key: str, run: Callable) -> Optional[bytes]:
+        """A saved report's rendered JPEG by the image key `save_view` returned; None when unknown."""
+        key, _, report_id = image_key.partition("/")
+        if not FRAME_KEY.fullmatch(key) or not REPORT_ID.fullmatch(report_id):
+            return None
+        name = view_name(key, report_id)
+        record = self._pending.get(name)
+        if record is None:
+            record = await asyncio.get_running_loop().run_in_executor(self._io, self.store.get, name)
+        if record is None:
+            return None
+        saved = json.loads(record)
+        return await self.view(kind, key, saved["box"], saved["caption"], run, report_id)
+
+    def _forget_rendered(self, cache_key: Tuple[str, str, str]):
+        data = self._rendered.pop(cache_key, None)
+        if data is not None:
+            self._rendered_bytes -= len(data)
+
+    def stats(self) -> dict:
+        return {
+            "frames": len(self._refs),
+            "saved": len(self._saved),
+            "pending_writes": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rendered": self.renders,
+            "render_cache_hits": self.hits,
+            "render_cache_bytes": self._rendered_bytes,
+        }
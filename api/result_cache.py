@@ -0,0 +1,166 @@
+"""
+Content-addressed cache of detection results.
+Report uploads and offline-queue retries often re-send byte-identical images. Each upload is keyed
+by a BLAKE2b digest of its bytes plus everything that changes the output (model version,
+thresholds, input size), so a duplicate skips decode and inference entirely.
+
+Results live in a per-worker LRU bounded by entry count and TTL. With RESULT_CACHE_REDIS_URL set,
+they are also shared through Redis (its own TTL, eviction by the server's maxmemory policy), so a
+retry that lands on another worker still hits. Redis failures only cost a cache miss.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "hazard:result:"
+# Hashing runs at roughly 1 GB/s; past this size it moves off the event loop (hashlib releases the GIL).
+INLINE_HASH_BYTES = 256 * 1024
+
+
+@dataclass
+class CachedResult:
+    detections: List[dict]
+    width: int
+    height: int
+    stored_at: float = 0.0
+
+    def to_json(self) -> str:
+        return json.dumps({"detections": self.detections, "width": self.width, "height": self.height},
+                          separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data) -> "CachedResult":
+        value = json.loads(data)
+        return cls(value["detections"], value["width"], value["height"], time.monotonic())
+
+
+def content_digest(file_bytes: bytes) -> str:
+    """128-bit BLAKE2b of the upload: faster than SHA-256 and collision-safe for a cache key."""
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+
+def engine_fingerprint(engine) -> str:
+    """Everything about the engine that changes its detections for identical bytes."""
+    return (f"{engine.model_version}:{engine.input_size}:{engine.confidence_threshold}:"
+            f"{engine.iou_threshold}:{engine.max_detections}")
+
+
+class ResultCache:
+    """
+    Two-level result cache: an in-process LRU, optionally backed by Redis.
+    `max_entries` bounds the LRU; entries older than `ttl_seconds` are treated as misses and dropped.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0, redis_client=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.redis = redis_client
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.redis_errors = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "ResultCache":
+        redis_client = None
+        if settings.result_cache_redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                logger.warning("RESULT_CACHE_REDIS_URL is set but the redis package is not installed; "
+                               "caching results in memory only")
+            else:
+                redis_client = redis.from_url(settings.result_cache_redis_url, socket_timeout=0.25,
+                                              socket_connect_timeout=0.25)
+        return cls(
+            max_entries=settings.result_cache_max_entries,
+            ttl_seconds=settings.result_cache_ttl_seconds,
+            redis_client=redis_client,
+        )
+
+    @staticmethod
+    def key(file_bytes: bytes, fingerprint: str) -> str:
+        return f"{fingerprint}:{content_digest(file_bytes)}"
+
+    async def key_for(self, file_bytes: bytes, fingerprint: str) -> str:
+        if len(file_bytes) < INLINE_HASH_BYTES:
+            return self.key(file_bytes, fingerprint)
+        return await asyncio.get_running_loop().run_in_executor(None, self.key, file_bytes, fingerprint)
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry.stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            del self._entries[key]
+            self.expirations += 1
+
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(REDIS_KEY_PREFIX + key)
+            except Exception as e:
+                self._redis_failed(e)
+            else:
+                if data is not None:
+                    entry = CachedResult.from_json(data)
+                    self._store(key, entry)
+                    self.hits += 1
+                    self.redis_hits += 1
+                    return entry
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, detections: List[dict], width: int, height: int):
+        entry = CachedResult(detections, width, height, time.monotonic())
+        self._store(key, entry)
+        if self.redis is not None:
+            try:
+                await self.redis.set(REDIS_KEY_PREFIX + key, entry.to_json(), ex=max(1, int(self.ttl)))
+            except Exception as e:
+                self._redis_failed(e)
+
+    def _store(self, key: str, entry: CachedResult):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _redis_failed(self, error: Exception):
+        # One line per failure would flood the log while Redis is down; the counter is in /stats.
+        if self.redis_errors == 0:
+            logger.warning("Result cache Redis unavailable, continuing in memory: %s", error)
+        self.redis_errors += 1
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "backend": "memory+redis" if self.redis is not None else "memory",
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "redis_errors": self.redis_errors,
+        }
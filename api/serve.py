@@ -0,0 +1,213 @@
+"""
+Multi-process serving with one shared copy of the model weights.
+`uvicorn --workers N` gives every worker a private copy of the model: the ONNX file is read into
+the heap, optimized, and its initializers copied again into session buffers. Memory, not CPU,
+then caps how many workers fit on an instance. This supervisor instead:
+
+1. builds the optimized graph once, in a short-lived child process, into the model cache with its
+   weights in a separate file (api/model_cache.py);
+2. starts N uvicorn workers on one listening socket, each loading that cached graph. ONNX Runtime
+   memory-maps the weights file, so all workers read the same page-cache pages and the weights
+   are resident once; prepacking is off so no worker keeps a private repacked copy;
+3. pins each worker to its own slice of the CPUs and sizes its ONNX Runtime and decode thread pools
+   to that slice, so N workers don't each start one thread per core and oversubscribe the machine.
+
+Workers that exit are restarted. Everything else (admission control, batching, caches) is per worker
+as before. Model changes reach every worker through a shared MODEL_SELECTION_FILE (a private one
+is created when none is configured). Sessions, their tracker, motion gate, QoS state and report
+images live in one worker's memory while requests land on any worker, so with more than one worker
+the session endpoints answer 501: serve live sessions from a single-worker instance and use this
+for /detect-batch throughput.
+
+    python -m api.serve --workers 4 --port 8080
+    python scripts/bench_workers.py --workers 4   # RSS/PSS vs N independent workers
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from .settings import Settings, env_bool
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF_SECONDS = 1.0
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_partitions(cpus: Sequence[int], workers: int) -> List[List[int]]:
+    """
+    Split `cpus` into `workers` contiguous, near-equal slices (neighbouring CPU ids usually share
+    a core or cache). With more workers than CPUs, workers take turns on single CPUs.
+    """
+    cpus = list(cpus)
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    base, extra = divmod(len(cpus), workers)
+    partitions, start = [], 0
+    for i in range(workers):
+        size = base + (1 if i < extra else 0)
+        partitions.append(cpus[start:start + size])
+        start += size
+    return partitions
+
+
+def worker_environment(cpus: Optional[Sequence[int]], env: Dict[str, str] = os.environ) -> Dict[str, str]:
+    """
+    Environment overrides for one worker; explicitly configured thread counts are left alone. An
+    autotuned intra-op count (AUTOTUNE_INTRA_OP_THREADS, measured with every core) is capped at the
+    worker's slice so N workers never each start a thread per core.
+    """
+    overrides = {"SHARE_MODEL_WEIGHTS": "1"}
+    if cpus:
+        for name in ("ORT_INTRA_OP_THREADS", "WORKER_POOL_SIZE"):
+            if not env.get(name):
+                overrides[name] = str(len(cpus))
+        tuned = env.get("AUTOTUNE_INTRA_OP_THREADS", "")
+        if "ORT_INTRA_OP_THREADS" in overrides and tuned.isdigit() and int(tuned) > 0:
+            overrides["ORT_INTRA_OP_THREADS"] = str(min(int(tuned), len(cpus)))
+    return overrides
+
+
+def shared_environment(workers: int, state_dir: str, env: Dict[str, str] = os.environ) -> Dict[str, str]:
+    """Environment overrides common to every worker: the worker count, and a model selection file they all follow."""
+    overrides = {"SERVE_WORKERS": str(workers)}
+    if workers > 1 and not env.get("MODEL_SELECTION_FILE"):
+        overrides["MODEL_SELECTION_FILE"] = os.path.join(state_dir, "model-selection.json")
+    return overrides
+
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """RSS, PSS and private memory of a process in MB (Linux). PSS splits shared pages between their users."""
+    wanted = {"Rss:": "rss_mb", "Pss:": "pss_mb", "Private_Clean:": "private_mb", "Private_Dirty:": "private_mb"}
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0, "private_mb": 0.0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0] in wanted:
+                memory[wanted[parts[0]]] += int(parts[1]) / 1024
+    return {k: round(v, 1) for k, v in memory.items()}
+
+
+def configure_worker(cpus: Optional[Sequence[int]], overrides: Dict[str, str]):
+    """Apply a worker's environment and CPU slice; call before any thread exists so all of them inherit it."""
+    os.environ.update(overrides)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def _prepare_model(overrides: Dict[str, str]):
+    configure_worker(None, overrides)
+    from .inference import InferenceEngine
+
+    engine = InferenceEngine.from_settings(Settings.from_env())
+    return engine.cache_status, engine.load_ms
+
+
+def prepare_model(overrides: Dict[str, str]) -> Optional[str]:
+    """
+    Fill the model cache in a throwaway process configured by `overrides`, so the supervisor never
+    holds the model itself. Returns the cache status, or None when loading failed (workers then
+    report the error on /ready themselves).
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        try:
+            status, load_ms = pool.submit(_prepare_model, overrides).result()
+        except Exception as e:
+            logger.error("Could not prepare the shared model: %s", e)
+            return None
+    logger.info("Model cache ready (%s, %.0f ms)", status, load_ms)
+    return status
+
+
+def _run_worker(config_kwargs: dict, sockets: list, cpus: Optional[List[int]], overrides: Dict[str, str]):
+    configure_worker(cpus, overrides)
+    import uvicorn
+
+    uvicorn.Server(uvicorn.Config(**config_kwargs)).run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, config_kwargs: dict, workers: int, pin_cpus: bool = True):
+        self.config_kwargs = config_kwargs
+        self.workers = workers
+        cpus = available_cpus()
+        self.partitions = cpu_partitions(cpus, workers) if pin_cpus else [None] * workers
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.context = multiprocessing.get_context("spawn")
+        self.should_exit = False
+        self.state_dir = tempfile.mkdtemp(prefix="detect-serve-")
+        self.shared_env = shared_environment(workers, self.state_dir)
+
+    def start_worker(self, index: int, sockets: list):
+        cpus = self.partitions[index]
+        process = self.context.Process(
+            target=_run_worker,
+            args=(self.config_kwargs, sockets, cpus, {**worker_environment(cpus), **self.shared_env}),
+            name=f"detect-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info("Started worker %d (pid %d, cpus %s)", index, process.pid, cpus or "all")
+
+    def run(self):
+        import uvicorn
+
+        prepare_model(worker_environment(None))
+        sockets = [uvicorn.Config(**self.config_kwargs).bind_socket()]
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: setattr(self, "should_exit", True))
+        for index in range(self.workers):
+            self.start_worker(index, sockets)
+
+        while not self.should_exit:
+            time.sleep(RESTART_BACKOFF_SECONDS)
+            for index, process in enumerate(self.processes):
+                if not self.should_exit and not process.is_alive():
+                    logger.warning("Worker %d (pid %d) exited with %s; restarting", index, process.pid,
+                                   process.exitcode)
+                    self.start_worker(index, sockets)
+
+        logger.info("Stopping %d workers", self.workers)
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 0)) or len(available_cpus()))
+    parser.add_argument("--no-pin-cpus", dest="pin_cpus", action="store_false",
+                        help="Let every worker run on every CPU (thread pools keep their configured sizes)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(message)s")
+
+    if not env_bool("MODEL_CACHE_ENABLED", True):
+        logger.warning("MODEL_CACHE_ENABLED is off: each worker loads a private copy of the weights")
+    config_kwargs = {"app": "api.app:app", "host": args.host, "port": args.port, "log_level": args.log_level}
+    Supervisor(config_kwargs, args.workers, args.pin_cpus).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
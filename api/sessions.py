@@ -0,0 +1,309 @@
+"""
+In-memory detection sessions.
+Each session runs a lightweight IoU tracker so the same pothole seen over consecutive frames becomes
+one report rather than one per frame, and keeps its statistics as running counters so summaries are
+O(1) no matter how long the session has been streaming. Idle sessions are evicted after a TTL.
+"""
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .postprocess import iou_matrix
+
+REPORT_PENDING = "pending"
+REPORT_CONFIRMED = "confirmed"
+REPORT_DISMISSED = "dismissed"
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+@dataclass
+class Report:
+    report_id: str
+    hazard_type: str
+    confidence: float
+    box: List[float]
+    first_seen: float
+    last_seen: float
+    sightings: int = 1
+    status: str = REPORT_PENDING
+    # The frame that created the report, kept by reference (api/report_images.py), and the box as
+    # drawn on that frame; `box` follows the hazard through later frames.
+    frame_key: Optional[str] = None
+    frame_box: Optional[List[float]] = None
+    # Set once the report is confirmed and its view saved: its images outlive the session under
+    # /report-images/{image_key}/{kind}.
+    image_key: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "report_id": self.report_id,
+            "hazard_type": self.hazard_type,
+            "confidence": round(self.confidence, 4),
+            "box": self.box,
+            "sightings": self.sightings,
+            "first_seen": iso(self.first_seen),
+            "last_seen": iso(self.last_seen),
+            "status": self.status,
+            "has_image": self.frame_key is not None,
+            "image_key": self.image_key,
+        }
+
+
+@dataclass
+class Track:
+    label: str
+    box: np.ndarray
+    score: float
+    hits: int = 1
+    missed: int = 0
+    report: Optional[Report] = None
+
+
+class HazardTracker:
+    """
+    Greedy IoU association of each frame's detections to active tracks of the same label.
+    A track becomes a report after `min_hits` sightings (filtering one-frame flickers) and keeps
+    feeding that report until it goes unseen for `max_missed` frames.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, min_hits: int = 2, max_missed: int = 15):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_missed = max_missed
+        self.tracks: List[Track] = []
+
+    def update(self, detections: List[dict]) -> List[Track]:
+        """Advance one frame; returns tracks that just qualified for a new report."""
+        matched_tracks = set()
+        matched_dets = set()
+
+        if self.tracks and detections:
+            track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32)
+            det_boxes = np.array([d["box"] for d in detections], dtype=np.float32)
+            ious = iou_matrix(track_boxes, det_boxes)
+            same_label = (np.array([t.label for t in self.tracks])[:, None]
+                          == np.array([d["label"] for d in detections])[None, :])
+            ious[~same_label] = 0.0
+
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                ti, di = divmod(int(flat), ious.shape[1])
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+                track = self.tracks[ti]
+                track.box = det_boxes[di]
+                track.score = max(track.score, float(detections[di]["score"]))
+                track.hits += 1
+                track.missed = 0
+
+        qualified = []
+        survivors = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            elif track.report is None and track.hits >= self.min_hits:
+                qualified.append(track)
+            survivors.append(track)
+
+        for i, det in enumerate(detections):
+            if i in matched_dets:
+                continue
+            track = Track(label=det["label"], box=np.asarray(det["box"], dtype=np.float32), score=float(det["score"]))
+            survivors.append(track)
+            if self.min_hits <= 1:
+                qualified.append(track)
+
+        self.tracks = survivors
+        return qualified
+
+
+@dataclass
+class Session:
+    session_id: str
+    tracker: HazardTracker
+    created_at: float = field(default_factory=time.time)
+    last_activity: float = field(default_factory=time.monotonic)
+    ended_at: Optional[float] = None
+    frames: int = 0
+    reused_frames: int = 0
+    total_detections: int = 0
+    confidence_sum: float = 0.0
+    class_counts: Counter = field(default_factory=Counter)
+    reports: "OrderedDict[str, Report]" = field(default_factory=OrderedDict)
+    report_counts: Counter = field(default_factory=Counter)
+
+    def record_frame(self, detections: List[dict], reused: bool = False) -> List[Report]:
+        """Fold one frame into the running stats and tracker; returns reports created by this frame."""
+        self.last_activity = time.monotonic()
+        self.frames += 1
+        if reused:
+            # Motion-gated frames repeat the previous result; counting them again would inflate totals,
+            # but the tracker still sees them so a static hazard is reported as if every frame ran.
+            self.reused_frames += 1
+        else:
+            self.total_detections += len(detections)
+            for det in detections:
+                self.confidence_sum += float(det["score"])
+                self.class_counts[det["label"]] += 1
+
+        now = time.time()
+        qualified = self.tracker.update(detections)
+
+        # Tracks that already own a report keep it current as the hazard is seen again.
+        for track in self.tracker.tracks:
+            report = track.report
+            if report is not None and track.missed == 0:
+                report.sightings += 1
+                report.last_seen = now
+                report.confidence = max(report.confidence, track.score)
+                report.box = [round(float(v), 1) for v in track.box]
+
+        new_reports = []
+        for track in qualified:
+            report = Report(
+                report_id=str(uuid.uuid4()),
+                hazard_type=track.label,
+                confidence=track.score,
+                box=[round(float(v), 1) for v in track.box],
+                first_seen=now,
+                last_seen=now,
+                sightings=track.hits,
+            )
+            track.report = report
+            self.reports[report.report_id] = report
+            self.report_counts[REPORT_PENDING] += 1
+            new_reports.append(report)
+        return new_reports
+
+    def set_report_status(self, report_id: str, status: str) -> Optional[Report]:
+        report = self.reports.get(report_id)
+        if report is None:
+            return None
+        if report.status != status:
+            self.report_counts[report.status] -= 1
+            self.report_counts[status] += 1
+            report.status = status
+        self.last_activity = time.monotonic()
+        return report
+
+    def stats(self) -> dict:
+        return {
+            "total_frames": self.frames,
+            "reused_frames": self.reused_frames,
+            "total_detections": self.total_detections,
+            "unique_hazards": len(self.reports),
+            "pending_reports": self.report_counts[REPORT_PENDING],
+            "confirmed_reports": self.report_counts[REPORT_CONFIRMED],
+            "dismissed_reports": self.report_counts[REPORT_DISMISSED],
+            "average_confidence": round(self.confidence_sum / self.total_detections, 4) if self.total_detections else 0.0,
+            "detections_by_class": dict(self.class_counts),
+        }
+
+    def frame_keys(self) -> List[str]:
+        return [report.frame_key for report in self.reports.values() if report.frame_key]
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "started_at": iso(self.created_at),
+            "ended_at": iso(self.ended_at) if self.ended_at else None,
+            "active": self.ended_at is None,
+            "duration_seconds": round((self.ended_at or time.time()) - self.created_at, 3),
+            "stats": self.stats(),
+            "reports": [report.to_dict() for report in self.reports.values()],
+        }
+
+
+class SessionManager:
+    """
+    Session registry with TTL eviction of idle (or ended) sessions. `on_evict` is called with each
+    evicted session, e.g. to release the report frames it holds.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800.0, max_sessions: int = 10000,
+                 tracker_iou: float = 0.3, tracker_min_hits: int = 2, tracker_max_missed: int = 15,
+                 on_evict: Optional[Callable[["Session"], None]] = None):
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self.tracker_iou = tracker_iou
+        self.tracker_min_hits = tracker_min_hits
+        self.tracker_max_missed = tracker_max_missed
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evicted = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "SessionManager":
+        return cls(
+            ttl_seconds=settings.session_ttl_seconds,
+            max_sessions=settings.max_sessions,
+            tracker_iou=settings.tracker_iou_threshold,
+            tracker_min_hits=settings.tracker_min_hits,
+            tracker_max_missed=settings.tracker_max_missed,
+        )
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def start(self, session_id: Optional[str] = None) -> Session:
+        session = Session(
+            session_id=session_id or str(uuid.uuid4()),
+            tracker=HazardTracker(self.tracker_iou, self.tracker_min_hits, self.tracker_max_missed),
+        )
+        self._sessions[session.session_id] = session
+        self._enforce_capacity()
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_start(self, session_id: str) -> Session:
+        """Detection on an unknown id starts the session implicitly, as clients may skip /session/start."""
+        return self.get(session_id) or self.start(session_id)
+
+    def end(self, session_id: str) -> Optional[Session]:
+        """Mark a session ended; it stays readable (summary, reports) until its TTL runs out."""
+        session = self.get(session_id)
+        if session is not None and session.ended_at is None:
+            session.ended_at = time.time()
+            session.tracker.tracks.clear()
+        return session
+
+    def evict_expired(self) -> List[str]:
+        cutoff = time.monotonic() - self.ttl
+        expired = [sid for sid, s in self._sessions.items() if s.last_activity < cutoff]
+        for sid in expired:
+            self._evicted(self._sessions.pop(sid))
+        return expired
+
+    def _enforce_capacity(self):
+        while len(self._sessions) > self.max_sessions:
+            self._evicted(self._sessions.popitem(last=False)[1])
+
+    def _evicted(self, session: Session):
+        self.evicted += 1
+        if self.on_evict is not None:
+            self.on_evict(session)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "active": sum(1 for s in self._sessions.values() if s.ended_at is None),
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,247 @@
+"""
+Runtime configuration for the detection API.
+All values come from environment variables so the same image can be tuned per deployment.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MODEL_DIR = REPO_ROOT / "public" / "object_detection_model"
+DEFAULT_LABELS_PATH = REPO_ROOT / "web" / "labels.json"
+DEFAULT_MODEL_CACHE_DIR = REPO_ROOT / ".model-cache"
+DEFAULT_PROFILE_DIR = REPO_ROOT / "profiles"
+DEFAULT_REPORT_IMAGE_DIR = REPO_ROOT / "report-images"
+
+logger = logging.getLogger(__name__)
+
+# Preferred model files, newest first. Any other *.onnx in MODEL_DIR is used as a last resort.
+PREFERRED_MODELS = ("best0608.onnx", "best0408.onnx")
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def variant_path(model_path: Path, variant: str) -> Path:
+    """Where scripts/optimize_model.py writes a variant: best0608.onnx -> best0608.int8-static.onnx."""
+    return model_path.with_name(f"{model_path.stem}.{variant}{model_path.suffix}")
+
+
+def resolve_model_path(
+    model_path: Optional[str], model_dir: Optional[str], variant: Optional[str] = None
+) -> Optional[Path]:
+    """
+    Pick the ONNX file to serve: MODEL_PATH wins, otherwise the best file found in MODEL_DIR.
+    With a variant (MODEL_VARIANT), the optimized sibling of that file is served when it exists.
+    """
+    base = _resolve_base_model(model_path, model_dir)
+    if base is None or not variant or variant == "fp32":
+        return base
+    candidate = variant_path(base, variant)
+    if candidate.is_file():
+        return candidate
+    logger.warning("Model variant %r not found at %s; serving %s", variant, candidate, base.name)
+    return base
+
+
+def _resolve_base_model(model_path: Optional[str], model_dir: Optional[str]) -> Optional[Path]:
+    if model_path:
+        return Path(model_path)
+
+    directory = Path(model_dir) if model_dir else DEFAULT_MODEL_DIR
+    for name in PREFERRED_MODELS:
+        candidate = directory / name
+        if candidate.is_file():
+            return candidate
+
+    # Variants (best0608.int8-static.onnx) are only served through MODEL_VARIANT, never picked as a base.
+    candidates = sorted(p for p in directory.glob("*.onnx") if "." not in p.stem) if directory.is_dir() else []
+    return candidates[0] if candidates else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    model_path: Optional[Path]
+    model_dir: Path
+    labels_path: Path
+    input_size: int
+    confidence_threshold: float
+    iou_threshold: float
+    max_detections: int
+    intra_op_threads: int
+    inter_op_threads: int
+    execution_provider: str
+    model_cache_dir: Optional[Path]
+    share_model_weights: bool
+    serve_workers: int
+    warmup_runs: int
+    model_admin_token: Optional[str]
+    model_selection_file: Optional[Path]
+    shadow_model: Optional[str]
+    shadow_fraction: float
+    shadow_max_in_flight: int
+    mock_inference: bool
+    batching_enabled: bool
+    batch_max_size: int
+    batch_max_wait_ms: float
+    worker_pool_kind: str
+    worker_pool_size: int
+    inference_workers: int
+    max_pending_requests: int
+    retry_after_seconds: int
+    max_batch_files: int
+    motion_gating_enabled: bool
+    motion_threshold: float
+    motion_max_reuse: int
+    motion_max_age_ms: float
+    session_ttl_seconds: float
+    max_sessions: int
+    tracker_iou_threshold: float
+    tracker_min_hits: int
+    tracker_max_missed: int
+    report_images_enabled: bool
+    report_image_dir: Path
+    report_image_queue: int
+    report_image_cache_mb: int
+    report_thumbnail_size: int
+    report_jpeg_quality: int
+    stream_max_in_flight: int
+    qos_enabled: bool
+    qos_target_latency_ms: float
+    qos_high_load: float
+    qos_low_load: float
+    qos_recover_frames: int
+    result_cache_enabled: bool
+    result_cache_max_entries: int
+    result_cache_ttl_seconds: float
+    result_cache_redis_url: Optional[str]
+    tiling_mode: str
+    tile_scale: float
+    tile_overlap: float
+    tiling_min_downscale: float
+    tile_merge: str
+    tile_merge_threshold: float
+    metrics_enabled: bool
+    profile_slow_request_ms: float
+    profile_sample_interval_ms: float
+    profile_dir: Path
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        # fp32 (default), sim, opt, int8-dynamic or int8-static; see scripts/optimize_model.py.
+        model_path = resolve_model_path(os.getenv("MODEL_PATH"), os.getenv("MODEL_DIR"), os.getenv("MODEL_VARIANT"))
+        return cls(
+            model_path=model_path,
+            # Models that /models can switch to at runtime (api/model_registry.py).
+            model_dir=(Path(os.getenv("MODEL_DIR")) if os.getenv("MODEL_DIR")
+                       else model_path.parent if model_path is not None else DEFAULT_MODEL_DIR),
+            labels_path=Path(os.getenv("LABELS_PATH", str(DEFAULT_LABELS_PATH))),
+            input_size=env_int("MODEL_INPUT_SIZE", 640),
+            confidence_threshold=env_float("CONFIDENCE_THRESHOLD", 0.25),
+            iou_threshold=env_float("IOU_THRESHOLD", 0.45),
+            max_detections=env_int("MAX_DETECTIONS", 100),
+            # 0 lets ONNX Runtime use one thread per physical core. AUTOTUNE_INTRA_OP_THREADS is the
+            # measured value from .env.model (api/autotune.py); an explicit setting wins over it.
+            intra_op_threads=env_int("ORT_INTRA_OP_THREADS", 0) or env_int("AUTOTUNE_INTRA_OP_THREADS", 0),
+            inter_op_threads=env_int("ORT_INTER_OP_THREADS", 1),
+            execution_provider=os.getenv("ORT_EXECUTION_PROVIDER", "CPUExecutionProvider"),
+            # Optimized graphs are cached here between cold starts; point it at a persistent volume.
+            model_cache_dir=(Path(os.getenv("MODEL_CACHE_DIR", str(DEFAULT_MODEL_CACHE_DIR)))
+                             if env_bool("MODEL_CACHE_ENABLED", True) else None),
+            # Load the cached graph with its weights in a memory-mapped file shared by every worker
+            # process on the machine (api.serve sets this for its workers).
+            share_model_weights=env_bool("SHARE_MODEL_WEIGHTS", False),
+            # Worker processes behind the listening socket (set by api.serve). Above 1 a request can
+            # reach any of them, so the per-process session endpoints are refused.
+            serve_workers=env_int("SERVE_WORKERS", 1),
+            warmup_runs=env_int("WARMUP_RUNS", 2),
+            # Bearer token for the model management endpoints; unset disables them.
+            model_admin_token=os.getenv("MODEL_ADMIN_TOKEN") or None,
+            # Shared by all workers of an instance so a model switch reaches each of them; set it with
+            # api.serve --workers > 1. Unset: a switch only affects the worker that received it.
+            model_selection_file=(Path(os.environ["MODEL_SELECTION_FILE"]) if os.getenv("MODEL_SELECTION_FILE")
+                                  else None),
+            # A model file in model_dir to shadow SHADOW_FRACTION of live frames through from startup.
+            shadow_model=os.getenv("SHADOW_MODEL") or None,
+            shadow_fraction=env_float("SHADOW_FRACTION", 0.1),
+            shadow_max_in_flight=env_int("SHADOW_MAX_IN_FLIGHT", 2),
+            mock_inference=env_bool("MOCK_INFERENCE", False),
+            batching_enabled=env_bool("BATCHING_ENABLED", True),
+            batch_max_size=env_int("BATCH_MAX_SIZE", 8),
+            batch_max_wait_ms=env_float("BATCH_MAX_WAIT_MS", 10.0),
+            worker_pool_kind=os.getenv("WORKER_POOL_KIND", "thread"),
+            # 0 means one decode/preprocess worker per CPU.
+            worker_pool_size=env_int("WORKER_POOL_SIZE", 0),
+            inference_workers=env_int("INFERENCE_WORKERS", 1),
+            max_pending_requests=env_int("MAX_PENDING_REQUESTS", 32),
+            retry_after_seconds=env_int("RETRY_AFTER_SECONDS", 1),
+            max_batch_files=env_int("MAX_BATCH_FILES", 64),
+            motion_gating_enabled=env_bool("MOTION_GATING_ENABLED", True),
+            # Mean absolute gray-level difference (0-255) below which a frame reuses the last result.
+            motion_threshold=env_float("MOTION_THRESHOLD", 2.0),
+            motion_max_reuse=env_int("MOTION_MAX_REUSE", 5),
+            motion_max_age_ms=env_float("MOTION_MAX_AGE_MS", 1000.0),
+            session_ttl_seconds=env_float("SESSION_TTL_SECONDS", 1800.0),
+            max_sessions=env_int("MAX_SESSIONS", 10000),
+            tracker_iou_threshold=env_float("TRACKER_IOU_THRESHOLD", 0.3),
+            # Sightings needed before a track becomes a report; filters single-frame false positives.
+            tracker_min_hits=env_int("TRACKER_MIN_HITS", 2),
+            tracker_max_missed=env_int("TRACKER_MAX_MISSED", 15),
+            # Frames that create reports are written here in the background and rendered on request;
+            # point it at a persistent volume (or replace api.report_images.FrameStore with an object store).
+            report_images_enabled=env_bool("REPORT_IMAGES_ENABLED", True),
+            report_image_dir=Path(os.getenv("REPORT_IMAGE_DIR", str(DEFAULT_REPORT_IMAGE_DIR))),
+            # Frames waiting to be written; beyond this a report is created without its image.
+            report_image_queue=env_int("REPORT_IMAGE_QUEUE", 64),
+            report_image_cache_mb=env_int("REPORT_IMAGE_CACHE_MB", 32),
+            report_thumbnail_size=env_int("REPORT_THUMBNAIL_SIZE", 320),
+            report_jpeg_quality=env_int("REPORT_JPEG_QUALITY", 85),
+            # Frames of one WebSocket stream processed concurrently before newer frames replace waiting ones.
+            stream_max_in_flight=env_int("STREAM_MAX_IN_FLIGHT", 2),
+            # Frame interval/resolution/JPEG quality hints in session responses (api/qos.py). Sessions
+            # step down when admitted requests reach QOS_HIGH_LOAD of MAX_PENDING_REQUESTS or their
+            # latency exceeds the target, and step back up below QOS_LOW_LOAD.
+            qos_enabled=env_bool("QOS_ENABLED", True),
+            qos_target_latency_ms=env_float("QOS_TARGET_LATENCY_MS", 300.0),
+            qos_high_load=env_float("QOS_HIGH_LOAD", 0.75),
+            qos_low_load=env_float("QOS_LOW_LOAD", 0.4),
+            qos_recover_frames=env_int("QOS_RECOVER_FRAMES", 10),
+            result_cache_enabled=env_bool("RESULT_CACHE_ENABLED", True),
+            result_cache_max_entries=env_int("RESULT_CACHE_MAX_ENTRIES", 1024),
+            result_cache_ttl_seconds=env_float("RESULT_CACHE_TTL_SECONDS", 600.0),
+            # Share results between workers/replicas, e.g. redis://localhost:6379/1. Unset: per-worker memory only.
+            result_cache_redis_url=os.getenv("RESULT_CACHE_REDIS_URL") or None,
+            # Sliced inference for high-resolution frames: off, auto (only when the letterbox would
+            # shrink the frame more than TILING_MIN_DOWNSCALE) or always. Overridable per request.
+            tiling_mode=os.getenv("TILING_MODE", "off"),
+            tile_scale=env_float("TILE_SCALE", 2.0),
+            tile_overlap=env_float("TILE_OVERLAP", 0.2),
+            tiling_min_downscale=env_float("TILING_MIN_DOWNSCALE", 3.0),
+            tile_merge=os.getenv("TILE_MERGE", "wbf"),
+            tile_merge_threshold=env_float("TILE_MERGE_THRESHOLD", 0.5),
+            metrics_enabled=env_bool("METRICS_ENABLED", True),
+            # Requests slower than this get a sampled collapsed-stack profile in PROFILE_DIR; 0 disables.
+            profile_slow_request_ms=env_float("PROFILE_SLOW_REQUEST_MS", 0.0),
+            profile_sample_interval_ms=env_float("PROFILE_SAMPLE_INTERVAL_MS", 5.0),
+            profile_dir=Path(os.getenv("PROFILE_DIR", str(DEFAULT_PROFILE_DIR))),
+        )
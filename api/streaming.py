@@ -0,0 +1,125 @@
+"""
+Pipelined frame handling for the WebSocket detection channel.
+A live camera produces frames faster than a loaded server can answer them. Up to `max_in_flight`
+frames of a stream are processed concurrently; a frame arriving while every slot is busy waits in
+a single pending slot where a newer frame replaces the older one (latest frame wins), so results
+never trail the camera by more than the pipeline depth.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Set
+
+
+@dataclass
+class Frame:
+    frame_id: int  # 1-based sequence number within the stream
+    data: bytes
+    received_at: float  # time.perf_counter()
+
+
+class FrameStream:
+    """Admits frames into at most `max_in_flight` concurrent `process` calls. Event-loop only, so no locks."""
+
+    def __init__(self, process: Callable[[Frame], Awaitable[None]], max_in_flight: int = 2):
+        self.process = process
+        self.max_in_flight = max(1, max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        self._pending: Optional[Frame] = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def push(self, data: bytes) -> Optional[Frame]:
+        """Accept a frame from the client; returns the stale pending frame it displaced, if any."""
+        self.received += 1
+        frame = Frame(frame_id=self.received, data=data, received_at=time.perf_counter())
+        if len(self._tasks) < self.max_in_flight:
+            self._start(frame)
+            return None
+        stale, self._pending = self._pending, frame
+        if stale is not None:
+            self.dropped += 1
+        return stale
+
+    def _start(self, frame: Frame):
+        self._tasks.add(asyncio.create_task(self._run(frame)))
+
+    async def _run(self, frame: Frame):
+        try:
+            await self.process(frame)
+            self.processed += 1
+        finally:
+            self._tasks.discard(asyncio.current_task())
+            if self._pending is not None:
+                pending, self._pending = self._pending, None
+                self._start(pending)
+
+    async def close(self):
+        """Cancel outstanding work when the client disconnects."""
+        self._pending = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class StreamStats:
+    """Running totals across all WebSocket streams for /stats, including ones still open."""
+
+    def __init__(self):
+        self._open: Set[FrameStream] = set()
+        self.opened = 0
+        self.frames = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def open(self, stream: FrameStream):
+        self._open.add(stream)
+        self.opened += 1
+
+    def close(self, stream: FrameStream):
+        self._open.discard(stream)
+        self.frames += stream.received
+        self.processed += stream.processed
+        self.dropped += stream.dropped
+
+    def stats(self) -> dict:
+        frames = self.frames + sum(s.received for s in self._open)
+        dropped = self.dropped + sum(s.dropped for s in self._open)
+        return {
+            "active": len(self._open),
+            "opened": self.opened,
+            "frames": frames,
+            "processed": self.processed + sum(s.processed for s in self._open),
+            "dropped": dropped,
+            "drop_rate": round(dropped / frames, 4) if frames else 0.0,
+        }
+
+
+def compact_result(frame_id: int, response: dict) -> dict:
+    """
+    Shrink a /detect response for the stream: detections become [x1, y1, x2, y2, score, class_id]
+    tuples (already understood by public/js/adapters.js and result_normalizer.js) and per-session
+    stats are left to /session/{id}/summary.
+    """
+    size = response["original_image_size"]
+    message = {
+        "type": "result",
+        "frame_id": frame_id,
+        "detections": [[*d["box"], d["score"], d["class_id"]] for d in response["detections"]],
+        "size": [size["width"], size["height"]],
+        "processing_time": response["processing_time"],
+        "reused": response["reused"],
+    }
+    if response.get("has_new_reports"):
+        message["new_reports"] = response["new_reports"]
+    if "qos" in response:
+        message["qos"] = response["qos"]
+    if "model_version" in response:
+        message["model_version"] = response["model_version"]
+    return message
@@ -0,0 +1,193 @@
+"""
+Sliced (tiled) inference for high-resolution road imagery.
+Letterboxing a 4K dashcam or drone frame down to the 640-px model input shrinks hairline cracks to
+a pixel or two. In tiled mode the frame is cut into overlapping windows that the model sees at
+most `tile_scale` times downscaled, plus the whole frame for objects larger than a tile. All of
+them run as one batch, and the boxes are merged in original-image coordinates.
+
+The adaptive policy ("auto") only tiles frames that the plain letterbox would shrink by more than
+`min_downscale`, so ordinary camera frames keep the single-pass cost.
+"""
+import math
+import time
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .preprocess import LetterboxParams, decode_for_model, image_dimensions, letterbox_into
+
+TILING_MODES = ("off", "auto", "always")
+MERGE_METHODS = ("wbf", "nms")
+
+Window = Tuple[int, int, int, int]  # x0, y0, x1, y1 in original pixels
+
+
+@dataclass(frozen=True)
+class TilingPolicy:
+    mode: str = "off"
+    tile_scale: float = 2.0  # tile side = input_size * tile_scale original pixels
+    overlap: float = 0.2  # minimum overlap between neighbouring tiles, as a fraction of the tile side
+    min_downscale: float = 3.0  # "auto" tiles only when the whole-frame letterbox shrinks more than this
+    merge: str = "wbf"
+    merge_threshold: float = 0.5  # intersection over the smaller box at which tile detections merge
+
+    @classmethod
+    def from_settings(cls, settings) -> "TilingPolicy":
+        return cls(
+            mode=settings.tiling_mode,
+            tile_scale=settings.tile_scale,
+            overlap=settings.tile_overlap,
+            min_downscale=settings.tiling_min_downscale,
+            merge=settings.tile_merge,
+            merge_threshold=settings.tile_merge_threshold,
+        )
+
+    def with_mode(self, mode: Optional[str]) -> "TilingPolicy":
+        """This policy with a per-request mode override (the `tiling` query parameter)."""
+        if not mode or mode == self.mode:
+            return self
+        if mode not in TILING_MODES:
+            raise ValueError(f"tiling must be one of {', '.join(TILING_MODES)}")
+        return replace(self, mode=mode)
+
+    @property
+    def fingerprint(self) -> str:
+        """Distinguishes result-cache entries computed under different tiling settings."""
+        if self.mode == "off":
+            return "off"
+        return f"{self.mode}/{self.tile_scale}/{self.overlap}/{self.min_downscale}/{self.merge}/{self.merge_threshold}"
+
+    def windows(self, width: int, height: int, input_size: int) -> Optional[List[Window]]:
+        """Tile windows for a frame, or None when this policy runs it as a single letterbox."""
+        if self.mode == "off":
+            return None
+        tile = max(int(round(input_size * self.tile_scale)), input_size)
+        downscale = max(width, height) / input_size
+        if self.mode == "auto" and downscale <= self.min_downscale:
+            return None
+        if width <= tile and height <= tile:
+            return None  # one tile would be the whole frame
+
+        xs = _starts(width, tile, self.overlap)
+        ys = _starts(height, tile, self.overlap)
+        return [(x, y, min(x + tile, width), min(y + tile, height)) for y in ys for x in xs]
+
+    def should_tile(self, file_bytes, input_size: int) -> bool:
+        """Cheap pre-check from the image header; formats without a known header are decided after decoding."""
+        if self.mode == "off":
+            return False
+        dims = image_dimensions(file_bytes)
+        return dims is None or self.windows(dims[0], dims[1], input_size) is not None
+
+
+def _starts(length: int, tile: int, overlap: float) -> List[int]:
+    """Evenly spread tile origins covering [0, length) with at least `overlap` between neighbours."""
+    if length <= tile:
+        return [0]
+    step = tile * (1.0 - overlap)
+    count = math.ceil((length - tile) / step) + 1
+    return [int(round(i * (length - tile) / (count - 1))) for i in range(count)]
+
+
+@dataclass
+class PreparedTiles:
+    """Whole frame (index 0) and its tiles, letterboxed into one batch. Picklable for process pools."""
+    tensors: np.ndarray  # (1 + tiles, 3, S, S) float32
+    params: List[LetterboxParams]
+    windows: List[Window]
+    width: int
+    height: int
+    decode_ms: float
+    preprocess_ms: float
+
+
+def prepare_tiles(file_bytes, input_size: int, policy: TilingPolicy) -> Optional[PreparedTiles]:
+    """Decode at full resolution and letterbox the frame and each tile window; None for undecodable bytes."""
+    start = time.perf_counter()
+    decoded = decode_for_model(file_bytes)
+    if decoded is None:
+        return None
+    image, width, height, _ = decoded
+    decoded_at = time.perf_counter()
+
+    windows = [(0, 0, width, height)] + (policy.windows(width, height, input_size) or [])
+    tensors = np.empty((len(windows), 3, input_size, input_size), dtype=np.float32)
+    params = [letterbox_into(image[y0:y1, x0:x1], tensors[i]) for i, (x0, y0, x1, y1) in enumerate(windows)]
+    return PreparedTiles(
+        tensors=tensors,
+        params=params,
+        windows=windows,
+        width=width,
+        height=height,
+        decode_ms=(decoded_at - start) * 1000,
+        preprocess_ms=(time.perf_counter() - decoded_at) * 1000,
+    )
+
+
+def intersection_over_smaller(boxes: np.ndarray) -> np.ndarray:
+    """
+    Pairwise overlap of xyxy boxes relative to the smaller box of each pair, as an (N, N) matrix.
+    Unlike IoU it is high for a box cut off at a tile edge against the complete box of the same object.
+    """
+    x1, y1, x2, y2 = (boxes[:, k] for k in range(4))
+    w = np.maximum(np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1), 0)
+    h = np.maximum(np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1), 0)
+    areas = (x2 - x1) * (y2 - y1)
+    return w * h / (np.minimum(areas[:, None], areas) + 1e-9)
+
+
+def merge_boxes(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, threshold: float = 0.5,
+                method: str = "wbf") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge detections of one frame coming from overlapping tiles, per class. Greedy in score order:
+    each remaining top box claims every same-class box overlapping it by more than `threshold`.
+    "nms" keeps the top box; "wbf" (weighted boxes fusion) replaces it with the score-weighted mean
+    of the cluster and keeps the top score, so one tile seeing an object is enough.
+    The overlap matrix is computed once, so the greedy pass only reads rows of it.
+    """
+    if method not in MERGE_METHODS:
+        raise ValueError(f"Unknown merge method: {method}")
+    if scores.size == 0:
+        return boxes, scores, class_ids
+
+    order = scores.argsort()[::-1]
+    boxes, scores, class_ids = boxes[order], scores[order], class_ids[order]
+    matches = intersection_over_smaller(boxes.astype(np.float32)) > threshold
+    matches &= class_ids[:, None] == class_ids
+    np.fill_diagonal(matches, True)
+
+    # Greedy cluster assignment; the fused boxes are then computed for all clusters at once.
+    cluster_of = np.full(scores.size, -1, dtype=np.int64)
+    keep = []
+    for i in range(scores.size):
+        if cluster_of[i] >= 0:
+            continue
+        members = np.flatnonzero(matches[i])
+        members = members[cluster_of[members] < 0]
+        cluster_of[members] = len(keep)
+        keep.append(i)
+
+    keep = np.asarray(keep, dtype=np.int64)
+    if method == "nms":
+        return boxes[keep], scores[keep], class_ids[keep]
+    weights = scores.astype(np.float64)
+    fused = np.stack([np.bincount(cluster_of, boxes[:, k] * weights, minlength=keep.size) for k in range(4)], axis=1)
+    fused /= np.bincount(cluster_of, weights, minlength=keep.size)[:, None]
+    return fused.astype(boxes.dtype), scores[keep], class_ids[keep]
+
+
+def postprocess_tiles(engine, rows: np.ndarray, tiles: PreparedTiles, policy: TilingPolicy) -> List[dict]:
+    """Per-window filtering and NMS, then a cross-window merge in original-image coordinates."""
+    sizes = [(x1 - x0, y1 - y0) for x0, y0, x1, y1 in tiles.windows]
+    parts = engine.candidates_batch(rows, tiles.params, sizes)
+    for (boxes, _, _), (x0, y0, _, _) in zip(parts, tiles.windows):
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+
+    boxes = np.concatenate([p[0] for p in parts])
+    scores = np.concatenate([p[1] for p in parts])
+    class_ids = np.concatenate([p[2] for p in parts])
+    boxes, scores, class_ids = merge_boxes(boxes, scores, class_ids, policy.merge_threshold, policy.merge)
+    top = scores.argsort()[::-1][:engine.max_detections]
+    return engine.to_detections(boxes[top], scores[top], class_ids[top])
@@ -0,0 +1,130 @@
+"""
+Executors and admission control for CPU-bound request work.
+Decoding, preprocessing and inference never run on the event loop: a bounded number of requests
+is admitted at a time and anything beyond that is rejected immediately so /health and light
+endpoints stay responsive under overload.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from . import preprocess
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_ready() -> bool:
+    """No-op run once per worker at startup; importing this module in the worker already imports cv2."""
+    return preprocess.cv2 is not None
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full; the API maps it to 503 with Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """
+    `executor` runs picklable decode/preprocess functions and is a thread pool by default or a
+    process pool for GIL-heavy workloads. Model calls always go to `inference_executor`, a small
+    thread pool in this process: ONNX Runtime releases the GIL and parallelizes internally, so more
+    than one or two concurrent sessions only oversubscribes the cores. Shadow comparisons on a
+    candidate model get `shadow_executor`, one thread of their own, so they never queue ahead of
+    live batches.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 0,
+        inference_workers: int = 1,
+        max_pending: int = 32,
+        retry_after: int = 1,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+        max_workers = max_workers or os.cpu_count() or 1
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="detect-cpu")
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=max(1, inference_workers), thread_name_prefix="detect-model"
+        )
+        self.shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detect-shadow")
+        logger.info("Worker pool: %s x%d, inference x%d, max pending %d",
+                    kind, max_workers, inference_workers, max_pending)
+
+    @classmethod
+    def from_settings(cls, settings) -> "WorkerPool":
+        return cls(
+            kind=settings.worker_pool_kind,
+            max_workers=settings.worker_pool_size,
+            inference_workers=settings.inference_workers,
+            max_pending=settings.max_pending_requests,
+            retry_after=settings.retry_after_seconds,
+        )
+
+    @contextmanager
+    def admit(self, slots: int = 1):
+        """
+        Reserve `slots` (one per request, or one per model call for bulk requests) or fail fast.
+        A request needing more than max_pending still runs, alone, on an otherwise idle pool.
+        Only touched from the event loop, so no lock is needed.
+        """
+        slots = max(1, min(slots, self.max_pending))
+        if self.in_flight + slots > self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.in_flight += slots
+        try:
+            yield
+        finally:
+            self.in_flight -= slots
+
+    async def run(self, fn, *args):
+        """Run a picklable CPU-bound function on the decode/preprocess executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def run_local(self, fn, *args):
+        """Run a function that needs in-process state (bound engine methods) off the event loop."""
+        executor = self.executor if self.kind == "thread" else self.inference_executor
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def run_inference(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.inference_executor, fn, *args)
+
+    async def run_shadow(self, fn, *args):
+        """Run background work that must not delay live requests (shadow inference) on its own thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.shadow_executor, fn, *args)
+
+    async def warm_up(self):
+        """Start every decode worker now; process-pool workers otherwise spawn and import cv2 on first use."""
+        if self.kind == "process":
+            await asyncio.gather(*(self.run(_worker_ready) for _ in range(self.max_workers)))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.inference_executor.shutdown(wait=False, cancel_futures=True)
+        self.shadow_executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "in_flight": self.in_flight,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
@@ -16,7 +16,8 @@ import {
   debugDrawMapping,
   computeContainMapping,
   computeCoverMapping,
-  modelToCanvasBox
+  modelToCanvasBox,
+  fitWithin
 } from './utils/coordsMap.js';
 import { uploadDetectionReport, generateSummaryModalData } from './report-upload-service.js';
 import { pendingReportsQueue } from './pendingReportsQueue.js';
@@ -232,6 +233,7 @@ let inFlight = false;
 let lastSendAt = 0;
 let targetIntervalMs = 160;            // start at ~6 fps sending
 let emaProc = 160;                      // exponential moving average of processing_time_ms
+let qosHint = null;                     // server QoS hint: { level, next_frame_ms, max_dimension, jpeg_quality }
 
 // Model processing constants
 const MODEL_W = 480, MODEL_H = 480;
@@ -246,7 +248,8 @@ let lastSkipLogAt = 0;
  * @returns {boolean} Whether to send this frame
  */
 function shouldSend(now) {
-  return !inFlight && (now - lastSendAt) >= targetIntervalMs;
+  const intervalMs = Math.max(targetIntervalMs, qosHint?.next_frame_ms || 0);
+  return !inFlight && (now - lastSendAt) >= intervalMs;
 }
 
 /**
@@ -329,6 +332,24 @@ function drawToModelCanvas(video) {
   return { dx, dy, dw, dh, scale };
 }
 
+// Upload-sized copy of modelCanvas when the server's QoS hint caps the frame size
+let uploadCanvas = null;
+
+/**
+ * Downscale the letterboxed frame to the QoS max_dimension, like RealtimeClient.encodeCanvas
+ * @param {number} [maxDimension] - Longest side the server asked for
+ * @returns {OffscreenCanvas} modelCanvas itself when no downscale is needed
+ */
+function canvasForUpload(maxDimension) {
+  const { width, height } = fitWithin(MODEL_W, MODEL_H, maxDimension);
+  if (width === MODEL_W && height === MODEL_H) return modelCanvas;
+  if (!uploadCanvas || uploadCanvas.width !== width || uploadCanvas.height !== height) {
+    uploadCanvas = new OffscreenCanvas(width, height);
+  }
+  uploadCanvas.getContext('2d').drawImage(modelCanvas, 0, 0, width, height);
+  return uploadCanvas;
+}
+
 /**
  * Resize overlay canvas to exactly match video display with proper DPR
  * @param {HTMLVideoElement} video - Video element
@@ -1194,11 +1215,13 @@ async function detectionLoop() {
                     lastSendAt = startTime;
                     
                     try {
-                        // Adaptive quality based on network performance
-                        const quality = lastNetworkLatencyMs > 1000 ? 0.7 : 0.85;
+                        // Server QoS hint first, else adapt to network performance
+                        const quality = qosHint?.jpeg_quality
+                          ? qosHint.jpeg_quality / 100
+                          : (lastNetworkLatencyMs > 1000 ? 0.7 : 0.85);
                         
-                        // Convert offscreen canvas to blob for upload
-                        const blob = await modelCanvas.convertToBlob({ type: 'image/jpeg', quality });
+                        // Convert offscreen canvas to blob for upload, downscaled to the QoS size cap
+                        const blob = await canvasForUpload(qosHint?.max_dimension).convertToBlob({ type: 'image/jpeg', quality });
                         
                         // Send with optimized timeout and abort safety
                         const controller = new AbortController();
@@ -1488,6 +1511,7 @@ async function ensureRtConnected() {
     rtClient.onMessage((msg) => {
       // The apiClient now handles normalization, so the message `msg` is the normalized response.
       lastNetworkLatencyMs = msg.processing_time || 0;
+      if (msg.qos) qosHint = msg.qos;
       console.log(`📥 Received normalized API response, RTT: ${lastNetworkLatencyMs}ms`);
       
       // Enhanced logging for debugging
@@ -1517,7 +1541,7 @@ async function ensureRtConnected() {
 }
 
 function handleApiDetections(normalizedResponse) {
-  const { detections, processing_time, session_stats, new_reports } = normalizedResponse;
+  const { detections, processing_time, session_stats, new_reports, original_image_size } = normalizedResponse;
 
   // Update timing for adaptive scheduler
   updateTiming(processing_time);
@@ -1545,8 +1569,11 @@ function handleApiDetections(normalizedResponse) {
   
   // The detections are already normalized. We need to adapt them for persistent storage/drawing
   // which expects x1, y1, x2, y2 format. The adapter provides `box: [x1, y1, x2, y2]`.
+  // Boxes are in uploaded-frame pixels; a QoS-downscaled upload is scaled back to the model canvas.
+  const sx = original_image_size?.width ? MODEL_W / original_image_size.width : 1;
+  const sy = original_image_size?.height ? MODEL_H / original_image_size.height : 1;
   const adaptedDetections = detections.map(det => {
-      const [x1, y1, x2, y2] = det.box;
+      const [x1, y1, x2, y2] = det.box.map((v, i) => v * (i % 2 ? sy : sx));
       const classId = CLASS_NAMES.indexOf(det.label);
       return {
           x1, y1, x2, y2,
@@ -90,6 +90,36 @@ export async function fetchReports(filters = {}) {
   return { reports: allReports, pagination, metrics };
 };
 
+async function getJson(url) {
+  const response = await fetch(url, {
+    credentials: 'include',
+    headers: { Accept: 'application/json' },
+    signal: AbortSignal.timeout(10000),
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to load reports: ${response.status} ${response.statusText}`);
+  }
+  return response.json();
+}
+
+function bboxParam(bounds) {
+  return [bounds.west, bounds.south, bounds.east, bounds.north].join(',');
+}
+
+// Reports inside the map viewport ({north, south, east, west}), newest first. Pass the returned
+// `nextCursor` back as `cursor` for the next page.
+export async function fetchReportsInView(bounds, { cursor, limit = 200, ...filters } = {}) {
+  const params = new URLSearchParams({ bbox: bboxParam(bounds), limit, ...filters });
+  if (cursor) params.set('cursor', cursor);
+  return getJson(`${API_BASE_URL}/geo?${params.toString()}`);
+}
+
+// Report counts per area for zoomed-out views; below `pointsFromZoom` use these instead of markers.
+export async function fetchReportClusters(bounds, zoom) {
+  const params = new URLSearchParams({ bbox: bboxParam(bounds), zoom: Math.round(zoom) });
+  return getJson(`${API_BASE_URL}/clusters?${params.toString()}`);
+}
+
 // Update a report by ID
 export async function updateReport(reportId, updatedData) {
   try {
@@ -131,6 +161,8 @@ export async function deleteReportById(reportId) {
 // Browser compatibility - expose functions to the global scope
 if (typeof window !== 'undefined') {
   window.fetchReports = fetchReports;
+  window.fetchReportsInView = fetchReportsInView;
+  window.fetchReportClusters = fetchReportClusters;
   window.getReports = getReports;
   window.updateReport = updateReport;
   window.deleteReportById = deleteReportById;
@@ -3,6 +3,69 @@ export const CLASS_ID_NAME_MAP = {
   1: 'pothole'
 };
 
+/** Media type of the packed binary result; send it in Accept to opt in (see api/packed.py). */
+export const PACKED_RESULT_MEDIA_TYPE = 'application/x-hazard-detections';
+
+const PACKED_MAGIC = 'HZDT';
+const PACKED_HEADER_BYTES = 32;
+const PACKED_FLAG_REUSED = 1;
+
+function halfToFloat(h) {
+  const sign = h & 0x8000 ? -1 : 1;
+  const exp = (h >> 10) & 0x1f;
+  const frac = h & 0x3ff;
+  if (exp === 0) return sign * frac * 2 ** -24;
+  if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+  return sign * (1 + frac / 1024) * 2 ** (exp - 15);
+}
+
+/**
+ * Decode a packed binary result (struct-of-arrays: float32 boxes, uint16 class ids, float16 scores)
+ * into the JSON response shape, with detections as [x1, y1, x2, y2, score, class_id] tuples.
+ * @param {ArrayBuffer|ArrayBufferView} data
+ */
+export function decodePackedResult(data) {
+  const buffer = ArrayBuffer.isView(data) ? data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength) : data;
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+  if (magic !== PACKED_MAGIC || view.getUint8(4) !== 1) {
+    throw new Error('Not a packed detection payload');
+  }
+  const flags = view.getUint8(5);
+  const frameId = view.getUint32(8, true);
+  const width = view.getUint32(12, true);
+  const height = view.getUint32(16, true);
+  const count = view.getUint32(20, true);
+  const processingTime = view.getFloat32(24, true);
+  const extraLen = view.getUint32(28, true);
+
+  // Typed-array views assume a little-endian host, which covers every browser we ship to.
+  const boxes = new Float32Array(buffer, PACKED_HEADER_BYTES, count * 4);
+  const classes = new Uint16Array(buffer, PACKED_HEADER_BYTES + count * 16, count);
+  const scores = new Uint16Array(buffer, PACKED_HEADER_BYTES + count * 18, count);
+  const detections = new Array(count);
+  for (let i = 0; i < count; i++) {
+    detections[i] = [boxes[i * 4], boxes[i * 4 + 1], boxes[i * 4 + 2], boxes[i * 4 + 3], halfToFloat(scores[i]), classes[i]];
+  }
+
+  let extra = {};
+  if (extraLen) {
+    const bytes = new Uint8Array(buffer, PACKED_HEADER_BYTES + count * 20, extraLen);
+    extra = JSON.parse(new TextDecoder().decode(bytes));
+  }
+  return {
+    frame_id: frameId,
+    detections,
+    original_image_size: { width, height },
+    processing_time: processingTime,
+    reused: Boolean(flags & PACKED_FLAG_REUSED),
+    new_reports: extra.new_reports || [],
+    // Same optional fields as the JSON response: pacing hint (api/qos.py) and serving model.
+    ...(extra.qos ? { qos: extra.qos } : {}),
+    ...(extra.model_version ? { model_version: extra.model_version } : {})
+  };
+}
+
 /**
  * Basic type guard checking if value looks like an API detection result
  * @param {unknown} x
@@ -15,6 +78,7 @@ export function isApiDetectionResult(x) {
 }
 
 /**
+ * Accepts a parsed JSON result or a packed binary result (ArrayBuffer / typed array).
  * @param {unknown} x
  * @returns {import('./result_normalizer.js').NormalizedResult}
  */
@@ -29,6 +93,9 @@ export function normalizeApiResult(x) {
   };
 
   try {
+    if (x instanceof ArrayBuffer || ArrayBuffer.isView(x)) {
+      x = decodePackedResult(x);
+    }
     if (!x || typeof x !== 'object') {
       return { ...base, error: { code: 'invalid_json', message: 'Result is not an object' } };
     }
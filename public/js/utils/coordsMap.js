@@ -161,6 +161,22 @@ export function normalizeCoordinates(bbox, sourceWidth, sourceHeight) {
     };
 }
 
+/**
+ * Size that fits within a server QoS max_dimension (api/qos.py), keeping the aspect ratio.
+ * Never upscales; a missing maxDimension keeps the size. Same as fitWithin in src/clients/realtime-client.js.
+ * @param {number} width - Source width
+ * @param {number} height - Source height
+ * @param {number} [maxDimension] - Longest allowed side
+ * @returns {{width: number, height: number}}
+ */
+export function fitWithin(width, height, maxDimension) {
+    const scale = maxDimension ? Math.min(1, maxDimension / Math.max(width, height)) : 1;
+    return {
+        width: Math.max(1, Math.round(width * scale)),
+        height: Math.max(1, Math.round(height * scale))
+    };
+}
+
 /**
  * Calculate intersection over union (IoU) for two bounding boxes
  * Useful for detection deduplication and tracking
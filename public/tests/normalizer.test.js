@@ -1,5 +1,6 @@
 import { readFileSync } from 'fs';
 import { normalizeDetectResponse } from '../js/adapters.js';
+import { decodePackedResult, normalizeApiResult } from '../js/result_normalizer.js';
 
 // Helper to load fixtures
 function loadFixture(name) {
@@ -70,3 +71,55 @@ describe('normalizeDetectResponse', () => {
     expect(res.original_image_size).toEqual({ width: 640, height: 480 });
   });
 });
+
+describe('decodePackedResult', () => {
+  // One detection in the api/packed.py layout: 32-byte header, float32 box, uint16 class, float16 score.
+  function packedPayload() {
+    const buffer = new ArrayBuffer(32 + 20);
+    const view = new DataView(buffer);
+    'HZDT'.split('').forEach((c, i) => view.setUint8(i, c.charCodeAt(0)));
+    view.setUint8(4, 1);
+    view.setUint8(5, 1); // reused
+    view.setUint32(8, 7, true);
+    view.setUint32(12, 640, true);
+    view.setUint32(16, 480, true);
+    view.setUint32(20, 1, true);
+    view.setFloat32(24, 12.5, true);
+    [1, 2, 5, 6].forEach((v, i) => view.setFloat32(32 + i * 4, v, true));
+    view.setUint16(48, 1, true);
+    view.setUint16(50, 0x3b00, true); // 0.875 as float16
+    return buffer;
+  }
+
+  test('should decode header and struct-of-arrays detections', () => {
+    const res = decodePackedResult(packedPayload());
+    expect(res.frame_id).toBe(7);
+    expect(res.original_image_size).toEqual({ width: 640, height: 480 });
+    expect(res.reused).toBe(true);
+    expect(res.detections).toEqual([[1, 2, 5, 6, 0.875, 1]]);
+  });
+
+  test('should read qos and model_version from the extra JSON', () => {
+    const extra = new TextEncoder().encode(JSON.stringify({ qos: { level: 'minimal', max_dimension: 480 }, model_version: 'abc123' }));
+    const base = new Uint8Array(packedPayload());
+    const bytes = new Uint8Array(base.length + extra.length);
+    bytes.set(base);
+    bytes.set(extra, base.length);
+    new DataView(bytes.buffer).setUint32(28, extra.length, true);
+    const res = decodePackedResult(bytes.buffer);
+    expect(res.qos).toEqual({ level: 'minimal', max_dimension: 480 });
+    expect(res.model_version).toBe('abc123');
+    expect(decodePackedResult(packedPayload()).qos).toBeUndefined();
+  });
+
+  test('should let normalizeApiResult take packed payloads directly', () => {
+    const res = normalizeApiResult(new Uint8Array(packedPayload()));
+    expect(res.ok).toBe(true);
+    expect(res.detections[0].class_name).toBe('pothole');
+    expect(res.detections[0].box).toEqual({ x: 1, y: 2, w: 4, h: 4 });
+  });
+
+  test('should reject other payloads', () => {
+    expect(() => decodePackedResult(new ArrayBuffer(32))).toThrow();
+  });
+});
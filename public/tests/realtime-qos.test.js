@@ -0,0 +1,88 @@
+import { jest } from '@jest/globals';
+import { RealtimeClient, fitWithin } from '../../src/clients/realtime-client.js';
+import { fitWithin as fitCameraUpload } from '../js/utils/coordsMap.js';
+
+// A detect endpoint whose QoS hint is chosen by the test, answering instantly.
+function connectedClient(clock) {
+  const client = new RealtimeClient({ now: () => clock.now });
+  client.baseUrl = 'http://api.test';
+  client.sessionId = 'session';
+  client.status = 'connected';
+  return client;
+}
+
+function respondWith(hint, status = 200, headers = {}) {
+  global.fetch = jest.fn(async () => ({
+    ok: status < 400,
+    status,
+    statusText: status === 503 ? 'Service Unavailable' : 'OK',
+    headers: { get: (name) => headers[name] ?? null },
+    json: async () => (status < 400 ? { detections: [], processing_time: 5, qos: hint } : { detail: 'Server busy' }),
+  }));
+}
+
+// Offer a frame every 10 ms (faster than any hint) for `durationMs`; returns uploads made.
+async function runCaptureLoop(client, clock, durationMs) {
+  const before = global.fetch.mock.calls.length;
+  for (const end = clock.now + durationMs; clock.now < end; clock.now += 10) {
+    await client.send(new Blob(['frame'], { type: 'image/jpeg' }));
+  }
+  return global.fetch.mock.calls.length - before;
+}
+
+describe('RealtimeClient QoS hints', () => {
+  beforeEach(() => {
+    jest.spyOn(console, 'log').mockImplementation(() => {});
+    jest.spyOn(console, 'error').mockImplementation(() => {});
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+  });
+
+  test('paces uploads at the hinted interval as the server degrades and recovers', async () => {
+    const clock = { now: 0 };
+    const client = connectedClient(clock);
+
+    respondWith({ level: 'full', next_frame_ms: 100, max_dimension: 1280, jpeg_quality: 85 });
+    expect(await runCaptureLoop(client, clock, 2000)).toBe(20);
+
+    respondWith({ level: 'minimal', next_frame_ms: 1000, max_dimension: 480, jpeg_quality: 55 });
+    const underLoad = await runCaptureLoop(client, clock, 5000);
+    expect(underLoad).toBeGreaterThanOrEqual(5);
+    expect(underLoad).toBeLessThanOrEqual(6);
+    expect(client.qos.level).toBe('minimal');
+    expect(client.skippedFrames).toBeGreaterThan(250);
+
+    respondWith({ level: 'full', next_frame_ms: 100, max_dimension: 1280, jpeg_quality: 85 });
+    expect(await runCaptureLoop(client, clock, 2000)).toBeGreaterThanOrEqual(19);
+  });
+
+  test('a 503 pauses uploads for Retry-After', async () => {
+    const clock = { now: 0 };
+    const client = connectedClient(clock);
+    respondWith(null, 503, { 'Retry-After': '2' });
+    await client.send(new Blob(['frame']));
+    expect(client.nextFrameDelay()).toBe(2000);
+    expect(await runCaptureLoop(client, clock, 1900)).toBe(0);
+  });
+
+  test('ignores hints when disabled', async () => {
+    const clock = { now: 0 };
+    const client = new RealtimeClient({ now: () => clock.now, followQos: false });
+    Object.assign(client, { baseUrl: 'http://api.test', sessionId: 'session', status: 'connected' });
+    respondWith({ level: 'minimal', next_frame_ms: 1000, max_dimension: 480, jpeg_quality: 55 });
+    expect(await runCaptureLoop(client, clock, 100)).toBe(10);
+  });
+
+  test('uploads are scaled down to the hinted size, never up', () => {
+    expect(fitWithin(1920, 1080, 960)).toEqual({ width: 960, height: 540 });
+    expect(fitWithin(640, 480, 1280)).toEqual({ width: 640, height: 480 });
+  });
+
+  test('the camera page downscales its uploads the same way', () => {
+    for (const [w, h, max] of [[1920, 1080, 960], [480, 480, 320], [480, 480, undefined], [640, 480, 1280]]) {
+      expect(fitCameraUpload(w, h, max)).toEqual(fitWithin(w, h, max));
+    }
+  });
+});
@@ -0,0 +1,92 @@
+import { ingestReport, mergeReports } from '../../src/services/report-dedup.js';
+
+// Just the GEO calls dedup makes, with a flat-earth distance that is exact enough at 100 m.
+function fakeStore() {
+  const positions = new Map();
+  const reports = new Map();
+  const client = {
+    async geoSearchWith(key, { longitude, latitude }, { radius }, _with, { COUNT } = {}) {
+      const found = [...positions.entries()]
+        .map(([member, p]) => {
+          const dx = (p.lon - longitude) * 111320 * Math.cos((latitude * Math.PI) / 180);
+          const dy = (p.lat - latitude) * 110540;
+          return { member, distance: String(Math.hypot(dx, dy)) };
+        })
+        .filter(({ distance }) => Number(distance) <= radius)
+        .sort((a, b) => a.distance - b.distance);
+      return COUNT ? found.slice(0, COUNT) : found;
+    },
+  };
+  const deps = {
+    client,
+    loadReport: async (id) => reports.get(String(id)) || null,
+    saveReport: async (report) => {
+      reports.set(String(report.id), report);
+      positions.set(String(report.id), { lat: report.lat, lon: report.lon });
+    },
+  };
+  return { deps, reports };
+}
+
+const options = { enabled: true, radiusMeters: 15, windowDays: 30, maxCandidates: 20 };
+
+function report(id, overrides = {}) {
+  return {
+    id, type: 'pothole', lat: 32.08, lon: 34.78, time: new Date(id).toISOString(),
+    status: 'New', reportedBy: `driver${id}`, confidence: 0.6, ...overrides,
+  };
+}
+
+describe('report dedup', () => {
+  test('nearby sightings of the same hazard merge into one record', async () => {
+    const { deps, reports } = fakeStore();
+    const day = 24 * 60 * 60 * 1000;
+    expect((await ingestReport(deps, report(day), options)).merged).toBe(false);
+
+    // ~5 m away, a week later, by another driver.
+    const second = await ingestReport(deps, report(8 * day, { lat: 32.08004, confidence: 0.9 }), options);
+    expect(second.merged).toBe(true);
+    expect(second.report.id).toBe(day);
+    expect(second.report.sightings).toBe(2);
+    expect(second.report.confidence).toBe(0.9);
+    expect(second.report.confidenceMean).toBeCloseTo(0.75);
+    expect(second.report.reporters).toEqual([`driver${day}`, `driver${8 * day}`]);
+    expect(reports.size).toBe(1);
+  });
+
+  test('other hazard types, distant, stale or resolved reports stay separate', async () => {
+    const { deps, reports } = fakeStore();
+    const day = 24 * 60 * 60 * 1000;
+    await ingestReport(deps, report(day), options);
+    await ingestReport(deps, report(2 * day, { type: 'crack' }), options);
+    await ingestReport(deps, report(3 * day, { lat: 32.081 }), options); // ~110 m north
+    await ingestReport(deps, report(40 * day), options); // outside the 30-day window
+    expect(reports.size).toBe(4);
+
+    reports.get(String(40 * day)).status = 'Resolved';
+    reports.get(String(day)).status = 'Resolved';
+    expect((await ingestReport(deps, report(41 * day), options)).merged).toBe(false);
+    expect((await ingestReport(deps, report(42 * day), { ...options, enabled: false })).merged).toBe(false);
+  });
+
+  test('merging keeps the stored image and collects new ones', () => {
+    const merged = mergeReports(report(1, { image: 'a.jpg' }), report(2, { image: 'b.jpg', confidence: undefined }));
+    expect(merged.image).toBe('a.jpg');
+    expect(merged.images).toEqual(['b.jpg']);
+    expect(merged.confidenceCount).toBe(1);
+  });
+
+  test('merged images are capped links, never inline or session-scoped', () => {
+    let merged = report(1, { image: '/api/v1/report-images/a/plot', images: ['data:image/jpeg;base64,AAAA'] });
+    merged = mergeReports(merged, report(2, { image: 'data:image/jpeg;base64,/9j/4AAQ' }));
+    expect(merged.images).toEqual([]);
+    merged = mergeReports(merged, report(3, { image: '/api/v1/session/s1/report/r1/plot' }));
+    expect(merged.images).toEqual([]);
+    for (let i = 0; i < 12; i++) {
+      merged = mergeReports(merged, report(4 + i, { image: { url: `/api/v1/report-images/k${i}/plot` } }));
+    }
+    expect(merged.images).toHaveLength(10);
+    expect(merged.images[9]).toBe('/api/v1/report-images/k11/plot');
+    expect(merged.sightings).toBe(15);
+  });
+});
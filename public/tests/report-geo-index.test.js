@@ -0,0 +1,103 @@
+import {
+  clustersInBox,
+  collectPage,
+  coverCells,
+  encodeGeohash,
+  indexReport,
+  parseBbox,
+  reportCoordinates,
+  unindexReport,
+} from '../../src/services/report-geo-index.js';
+
+// The handful of node-redis calls the index makes, over plain Maps (no GEO quantization).
+function fakeRedis() {
+  const geo = new Map();
+  const hashes = new Map();
+  const hash = (key) => hashes.get(key) || hashes.set(key, new Map()).get(key);
+  const increment = (key, field, by) => {
+    const h = hash(key);
+    h.set(field, String((parseFloat(h.get(field)) || 0) + by));
+  };
+  const client = {
+    hashes,
+    async geoAdd(key, { longitude, latitude, member }) {
+      geo.set(member, { longitude, latitude });
+    },
+    async geoPos(key, member) {
+      return [geo.get(member) || null];
+    },
+    async zRem(key, member) {
+      geo.delete(member);
+    },
+    multi() {
+      const ops = [];
+      const chain = {
+        hIncrBy: (key, field, by) => ops.push(() => increment(key, field, by)) && chain,
+        hIncrByFloat: (key, field, by) => ops.push(() => increment(key, field, by)) && chain,
+        exec: async () => ops.forEach((op) => op()),
+      };
+      return chain;
+    },
+    async hmGet(key, fields) {
+      return fields.map((field) => hash(key).get(field) ?? null);
+    },
+    async hGetAll(key) {
+      return Object.fromEntries(hash(key));
+    },
+  };
+  return client;
+}
+
+describe('report geo index', () => {
+  test('geohash matches the reference encoding', () => {
+    expect(encodeGeohash(57.64911, 10.40744, 11)).toBe('u4pruydqqvj');
+  });
+
+  test('reads coordinates from fields or the legacy location text', () => {
+    expect(reportCoordinates({ lat: '32.1', lon: '34.8' })).toEqual({ lat: 32.1, lon: 34.8 });
+    expect(reportCoordinates({ location: 'Herzl 1, Coordinates: 32.08, 34.78' })).toEqual({ lat: 32.08, lon: 34.78 });
+    expect(reportCoordinates({ location: 'Tel Aviv' })).toBeNull();
+  });
+
+  test('viewport cover stays bounded and rejects bad boxes', () => {
+    const bbox = parseBbox('34.7,31.9,34.9,32.2');
+    expect(coverCells(bbox, 3)).toEqual(['sv8']);
+    expect(coverCells(bbox, 5).length).toBeLessThan(100);
+    expect(coverCells(parseBbox('-180,-85,180,85'), 6)).toBeNull();
+    expect(parseBbox('34.9,31.9,34.7,32.2')).toBeNull();
+    expect(parseBbox('1,2,3')).toBeNull();
+  });
+
+  test('cursor pages are newest first and skip filtered reports', async () => {
+    const ids = Array.from({ length: 10 }, (_, i) => String(1000 + i));
+    const load = async (id) => ({ id, odd: Number(id) % 2 === 1 });
+    const seen = [];
+    let cursor;
+    do {
+      const page = await collectPage(ids, { cursor, limit: 2 }, load, (report) => report.odd);
+      seen.push(...page.reports.map((report) => report.id));
+      cursor = page.nextCursor;
+    } while (cursor);
+    expect(seen).toEqual(['1009', '1007', '1005', '1003', '1001']);
+  });
+
+  test('clusters count indexed reports per cell and follow moves and deletes', async () => {
+    const client = fakeRedis();
+    await indexReport(client, { id: 1, lat: 32.08, lon: 34.78 });
+    await indexReport(client, { id: 2, lat: 32.09, lon: 34.79 });
+    await indexReport(client, { id: 3, location: 'Coordinates: 31.25, 34.79' });
+    expect(await indexReport(client, { id: 4, location: 'no coordinates' })).toBe(false);
+
+    const israel = parseBbox('34.2,29.4,35.9,33.4');
+    let clusters = await clustersInBox(client, israel, 6);
+    expect(clusters.map((c) => c.count).sort()).toEqual([1, 2]);
+    const telAviv = clusters.find((c) => c.count === 2);
+    expect(telAviv.lat).toBeCloseTo(32.085);
+    expect(telAviv.lon).toBeCloseTo(34.785);
+
+    await indexReport(client, { id: 2, lat: 31.25, lon: 34.79 }); // moved to the other cluster
+    await unindexReport(client, 1);
+    clusters = await clustersInBox(client, israel, 6);
+    expect(clusters.map((c) => c.count)).toEqual([2]);
+  });
+});
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the detection API: the FastAPI app runs in-process (lifespan included) and is
+driven over ASGI, so no server, network or Railway deployment is involved. An image corpus is
+replayed against:
+
+    detect   POST /detect/{session_id}, one image per request
+    batch    POST /detect-batch, --batch-size images per request
+    stream   /ws/{session_id}, --streams WebSocket streams sending frames at --fps
+
+at each --concurrency level, closed-loop (as fast as responses come back) or open-loop at --rate
+requests/s. Latency is measured from each request's scheduled start, so a backed-up server is not
+hidden by the client slowing down (coordinated omission).
+
+Reported per run: throughput, p50/p95/p99 latency, mean per-stage timings from the responses,
+process CPU and RSS. Results go to JSON so runs can be compared across commits; with --baseline,
+throughput or p95 regressions beyond --max-regression percent fail the run with exit code 1.
+
+The model comes from the usual settings (MODEL_PATH, MODEL_VARIANT, ...). The result cache and
+motion gate are disabled unless --keep-caches is given, so every request pays the full pipeline.
+
+Usage:
+    MODEL_PATH=public/object_detection_model/best0608.onnx python scripts/bench_api.py \\
+        --scenarios detect batch stream --concurrency 1 4 8 --duration 10 --output bench-api.json
+    python scripts/bench_api.py --images frames/ --rate 20 --baseline bench-api.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_preprocess import SYNTHETIC_SIZES, synthetic_frame  # noqa: E402
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def load_corpus(paths, synthetic_count):
+    """Image bytes from files/directories, or distinct synthetic 1080p/4K road frames."""
+    if not paths:
+        sizes = list(SYNTHETIC_SIZES.values())
+        return [synthetic_frame(*sizes[i % len(sizes)], seed=i) for i in range(synthetic_count)]
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES) if path.is_dir() else [path])
+    if not files:
+        raise SystemExit("No images found in --images")
+    return [f.read_bytes() for f in files]
+
+
+class ResourceMonitor:
+    """Process CPU time and RSS over a run; RSS is sampled from /proc every 50 ms."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._rss = []
+
+    @staticmethod
+    def rss_mb():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak only, in KB on Linux
+
+    def __enter__(self):
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._rss = [self.rss_mb()]
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._rss.append(self.rss_mb())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self.result = {
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(100 * cpu / wall, 1) if wall else 0.0,  # 100% = one core busy
+            "rss_mb": {"start": round(self._rss[0], 1), "peak": round(max(self._rss), 1),
+                       "end": round(self._rss[-1], 1)},
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.stages = defaultdict(float)
+        self.images = 0
+        self.extra = Counter()
+
+    def record(self, started, status, images=1, timings=None):
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        self.statuses[str(status)] += 1
+        if status == 200:
+            self.images += images
+            for stage, ms in (timings or {}).items():
+                self.stages[stage] += ms
+
+    def summary(self, wall):
+        ok = self.statuses.get("200", 0)
+        lat = np.asarray(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "requests": len(self.latencies),
+            "errors": len(self.latencies) - ok,
+            "status_counts": dict(self.statuses),
+            "throughput_rps": round(ok / wall, 2),
+            "images_per_second": round(self.images / wall, 2),
+            "latency_ms": {
+                "mean": round(float(lat.mean()), 2),
+                "p50": round(float(np.percentile(lat, 50)), 2),
+                "p95": round(float(np.percentile(lat, 95)), 2),
+                "p99": round(float(np.percentile(lat, 99)), 2),
+                "max": round(float(lat.max()), 2),
+            },
+            "stage_mean_ms": {stage: round(total / self.images, 3) for stage, total in sorted(self.stages.items())}
+            if self.images else {},
+            **self.extra,
+        }
+
+
+async def paced(worker, concurrency, rate, deadline):
+    """Run `concurrency` loops of worker(scheduled_start) until the deadline, open-loop when rate > 0."""
+    interval = concurrency / rate if rate > 0 else 0.0
+
+    async def loop(index):
+        scheduled = time.perf_counter() + (index * interval / concurrency if interval else 0.0)
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await worker(index, scheduled if interval else time.perf_counter())
+            scheduled = scheduled + interval if interval else time.perf_counter()
+
+    await asyncio.gather(*(loop(i) for i in range(concurrency)))
+
+
+async def run_detect(client, corpus, recorder, concurrency, rate, deadline):
+    counter = iter(range(1 << 62))
+
+    async def worker(index, started):
+        n = next(counter)
+        response = await client.post(f"/detect/bench-{index}", files={"file": ("frame.jpg", corpus[n % len(corpus)], "image/jpeg")})
+        recorder.record(started, response.status_code, timings=response.json().get("timings") if response.status_code == 200 else None)
+
+    await paced(worker, concurrency, rate, deadline)
+
+
+async def run_batch(client, corpus, recorder, concurrency, rate, deadline, batch_size):
+    counter = iter(range(1 << 62))
+
+    async def worker(index, started):
+        n = next(counter) * batch_size
+        files = [("files", (f"{i}.jpg", corpus[(n + i) % len(corpus)], "image/jpeg")) for i in range(batch_size)]
+        response = await client.post("/detect-batch", files=files)
+        recorder.record(started, response.status_code, images=batch_size)
+
+    await paced(worker, concurrency, rate, deadline)
+
+
+class AsgiWebSocket:
+    """Minimal in-process WebSocket client speaking the ASGI websocket protocol to the app."""
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": self.path, "raw_path": self.path.encode(), "root_path": "", "query_string": b"",
+            "headers": [], "client": ("127.0.0.1", 0), "server": ("bench", 80), "subprotocols": [],
+        }
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WebSocket rejected: {message}")
+
+    async def send_bytes(self, data):
+        await self._to_app.put({"type": "websocket.receive", "bytes": data})
+
+    async def receive_json(self):
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("WebSocket closed by the server")
+        return json.loads(message["text"])
+
+    async def close(self):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await self._task
+
+
+async def run_stream(app, corpus, recorder, streams, fps, deadline):
+    """Each stream sends frames at `fps`; latency is frame send -> its result (dropped frames have none)."""
+
+    async def one_stream(index):
+        ws = AsgiWebSocket(app, f"/ws/bench-stream-{index}")
+        await ws.connect()
+        sent = {}
+        done = asyncio.Event()
+
+        async def reader():
+            while not (done.is_set() and not sent):
+                message = await ws.receive_json()
+                started = sent.pop(message.get("frame_id"), None)
+                if started is None:
+                    continue
+                if message["type"] == "result":
+                    recorder.record(started, 200)
+                elif message["type"] == "dropped":
+                    recorder.extra["dropped_frames"] += 1
+                else:
+                    recorder.record(started, message.get("status", "error"))
+
+        reading = asyncio.create_task(reader())
+        frame_id = 0
+        scheduled = time.perf_counter() + index / (fps * streams)
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            frame_id += 1
+            sent[frame_id] = scheduled
+            await ws.send_bytes(corpus[(index + frame_id) % len(corpus)])
+            recorder.extra["frames_sent"] += 1
+            scheduled += 1.0 / fps
+        done.set()
+        try:
+            await asyncio.wait_for(reading, timeout=30)
+        finally:
+            await ws.close()
+
+    await asyncio.gather(*(one_stream(i) for i in range(streams)))
+
+
+async def benchmark(args, corpus):
+    import httpx
+
+    from api.app import app
+
+    async with app.router.lifespan_context(app):
+        while app.state.engine is None and app.state.model_error is None and not app.state.settings.mock_inference:
+            await asyncio.sleep(0.01)
+        if app.state.model_error:
+            raise SystemExit(f"Model failed to load: {app.state.model_error}")
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            runs = []
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    if args.warmup > 0:  # untimed: fills pools, scratch buffers and batcher shapes
+                        await execute(scenario, app, client, corpus, Recorder(), concurrency, args,
+                                      time.perf_counter() + args.warmup)
+                    recorder = Recorder()
+                    with ResourceMonitor() as monitor:
+                        started = time.perf_counter()
+                        await execute(scenario, app, client, corpus, recorder, concurrency, args,
+                                      started + args.duration)
+                        wall = time.perf_counter() - started
+                    run = {"scenario": scenario, "concurrency": concurrency, **run_parameters(scenario, args),
+                           "duration_s": round(wall, 2), **recorder.summary(wall), **monitor.result}
+                    runs.append(run)
+                    print(format_run(run))
+            server_stats = (await client.get("/stats")).json()
+    return runs, server_stats
+
+
+async def execute(scenario, app, client, corpus, recorder, concurrency, args, deadline):
+    if scenario == "detect":
+        await run_detect(client, corpus, recorder, concurrency, args.rate, deadline)
+    elif scenario == "batch":
+        await run_batch(client, corpus, recorder, concurrency, args.rate, deadline, args.batch_size)
+    else:
+        await run_stream(app, corpus, recorder, args.streams * concurrency, args.fps, deadline)
+
+
+def run_parameters(scenario, args):
+    if scenario == "stream":
+        return {"streams_per_concurrency": args.streams, "fps": args.fps}
+    params = {"rate": args.rate}
+    if scenario == "batch":
+        params["batch_size"] = args.batch_size
+    return params
+
+
+def run_key(run):
+    return (run["scenario"], run["concurrency"], run.get("rate"), run.get("batch_size"), run.get("fps"))
+
+
+def format_run(run):
+    lat = run["latency_ms"]
+    return (f"{run['scenario']:>6} c={run['concurrency']:<3} {run['throughput_rps']:>8} req/s "
+            f"{run['images_per_second']:>8} img/s  p50 {lat['p50']} p95 {lat['p95']} p99 {lat['p99']} ms  "
+            f"errors {run['errors']}  cpu {run['cpu_percent']}%  peak rss {run['rss_mb']['peak']} MB")
+
+
+def compare(runs, baseline_path, max_regression):
+    """Print changes against a previous result file; returns the regressions beyond max_regression percent."""
+    with open(baseline_path) as f:
+        baseline = {run_key(r): r for r in json.load(f)["runs"]}
+    regressions = []
+    for run in runs:
+        old = baseline.get(run_key(run))
+        if old is None:
+            continue
+        throughput = 100 * (run["images_per_second"] - old["images_per_second"]) / max(old["images_per_second"], 1e-9)
+        p95 = 100 * (run["latency_ms"]["p95"] - old["latency_ms"]["p95"]) / max(old["latency_ms"]["p95"], 1e-9)
+        print(f"{run['scenario']:>6} c={run['concurrency']:<3} throughput {throughput:+.1f}%  p95 {p95:+.1f}%")
+        if throughput < -max_regression or p95 > max_regression:
+            regressions.append({"run": run_key(run), "throughput_change_pct": round(throughput, 1),
+                                "p95_change_pct": round(p95, 1)})
+    return regressions
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=("detect", "batch", "stream"), default=["detect", "batch", "stream"])
+    parser.add_argument("--images", nargs="*", help="Image files or directories (default: synthetic frames)")
+    parser.add_argument("--synthetic-count", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rate", type=float, default=0.0, help="Requests/s across all workers; 0 = closed loop")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--streams", type=int, default=1, help="WebSocket streams per concurrency step")
+    parser.add_argument("--fps", type=float, default=10.0, help="Frames per second per stream")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Untimed seconds before each run")
+    parser.add_argument("--keep-caches", action="store_true", help="Leave the result cache and motion gate on")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Percent; used with --baseline")
+    args = parser.parse_args()
+
+    if not args.keep_caches:
+        os.environ["RESULT_CACHE_ENABLED"] = "0"
+        os.environ["MOTION_GATING_ENABLED"] = "0"
+    os.environ.setdefault("MAX_PENDING_REQUESTS", str(max(32, 4 * max(args.concurrency) * args.batch_size)))
+
+    corpus = load_corpus(args.images, args.synthetic_count)
+    runs, server_stats = asyncio.run(benchmark(args, corpus))
+
+    from api.settings import Settings
+
+    settings = Settings.from_env()
+    result = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "host": {"cpus": os.cpu_count(), "python_version": sys.version.split()[0]},
+        "model_path": str(settings.model_path) if settings.model_path else None,
+        "settings": {key: value for key, value in os.environ.items()
+                     if key.startswith(("MODEL_", "ORT_", "BATCH", "WORKER_", "INFERENCE_", "TILING", "TILE_",
+                                        "RESULT_CACHE", "MOTION_", "MOCK_", "MAX_PENDING"))},
+        "corpus": {"images": len(corpus), "mean_kb": round(sum(map(len, corpus)) / len(corpus) / 1024, 1)},
+        "args": vars(args),
+        "runs": runs,
+        "server_stats": server_stats,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        result["regressions"] = compare(runs, args.baseline, args.max_regression)
+        if result["regressions"]:
+            print(f"{len(result['regressions'])} run(s) regressed by more than {args.max_regression}%")
+            exit_code = 1
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark YOLO postprocessing: the original per-image loop (decode, filter, class-offset NMS and
+rescale, one image at a time) versus api.postprocess.postprocess_batch (filter and rescale
+vectorized over the whole batch, per-image NMS that stops at max_detections). Raw outputs are synthetic YOLOv8 tensors with a chosen number of candidates
+above the confidence threshold per image, clustered the way real detections are, so NMS has
+overlapping boxes to suppress.
+
+Usage:
+    python scripts/bench_postprocess.py
+    python scripts/bench_postprocess.py --candidates 500 2000 8000 --batch-sizes 1 16 --output bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api.postprocess import decode_rows, nms, postprocess_batch  # noqa: E402
+from api.preprocess import compute_letterbox_params  # noqa: E402
+
+NUM_CLASSES = 2
+ANCHORS = 8400  # YOLOv8 at 640 px
+CONFIDENCE = 0.25
+IOU = 0.45
+
+
+def synthetic_output(batch, candidates, input_size=640, seed=0):
+    """(B, 4 + nc, ANCHORS) output with `candidates` boxes per image scoring above CONFIDENCE."""
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((batch, ANCHORS, 4 + NUM_CLASSES), dtype=np.float32)
+    rows[..., :4] = rng.uniform(0, input_size, (batch, ANCHORS, 4))
+    rows[..., 4:] = rng.uniform(0, CONFIDENCE * 0.9, (batch, ANCHORS, NUM_CLASSES))
+    for b in range(batch):
+        # Candidates jitter around a few dozen objects, as anchors around a real hazard do.
+        centers = rng.uniform(40, input_size - 40, (max(candidates // 20, 1), 2))
+        picks = rng.choice(ANCHORS, candidates, replace=False)
+        owner = rng.integers(0, len(centers), candidates)
+        rows[b, picks, :2] = centers[owner] + rng.normal(0, 4, (candidates, 2))
+        rows[b, picks, 2:4] = rng.uniform(30, 60, (candidates, 2))
+        rows[b, picks, 4 + rng.integers(0, NUM_CLASSES, candidates)] = rng.uniform(CONFIDENCE, 1, candidates)
+    return np.ascontiguousarray(rows.transpose(0, 2, 1))  # as ONNX Runtime returns it
+
+
+def baseline_postprocess(output, params, sizes, input_size, max_detections=100):
+    """The original path: one decode/filter/NMS/rescale per image."""
+    results = []
+    for rows, p, (width, height) in zip(output.transpose(0, 2, 1), params, sizes):
+        boxes, scores, class_ids = decode_rows(rows, NUM_CLASSES)
+        mask = scores >= CONFIDENCE
+        boxes, scores, class_ids = boxes[mask], scores[mask], class_ids[mask]
+        offsets = class_ids[:, None].astype(np.float32) * (input_size + 1)
+        keep = nms(boxes + offsets, scores, IOU)[:max_detections]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - p.offset_x) / p.scale).clip(0, width)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - p.offset_y) / p.scale).clip(0, height)
+        results.append((boxes, scores, class_ids))
+    return results
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3)}
+
+
+def bench(batch, candidates, runs, input_size=640):
+    output = synthetic_output(batch, candidates, input_size)
+    sizes = [(1920, 1080)] * batch
+    params = [compute_letterbox_params(w, h, input_size) for w, h in sizes]
+
+    baseline = baseline_postprocess(output, params, sizes, input_size)
+    batched = postprocess_batch(output, params, sizes, NUM_CLASSES, CONFIDENCE, IOU)
+    kept = sum(len(found.scores) for found in batched)
+    same = all(np.array_equal(np.sort(a[1]), np.sort(b.scores)) for a, b in zip(baseline, batched))
+
+    base = timed(lambda: baseline_postprocess(output, params, sizes, input_size), runs)
+    fast = timed(lambda: postprocess_batch(output, params, sizes, NUM_CLASSES, CONFIDENCE, IOU), runs)
+    return {
+        "batch": batch,
+        "candidates_per_image": candidates,
+        "kept": kept,
+        "same_detections": same,
+        "baseline": base,
+        "batched": fast,
+        "speedup": round(base["p50_ms"] / fast["p50_ms"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", nargs="*", type=int, default=[100, 1000, 4000, 8000],
+                        help="Boxes above the confidence threshold per image")
+    parser.add_argument("--batch-sizes", nargs="*", type=int, default=[1, 8])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [bench(b, c, args.runs) for b in args.batch_sizes for c in args.candidates]
+    for r in results:
+        print(f"batch {r['batch']:>2} x {r['candidates_per_image']:>5} candidates -> {r['kept']:>4} kept: "
+              f"baseline p50 {r['baseline']['p50_ms']} ms | batched p50 {r['batched']['p50_ms']} ms "
+              f"-> {r['speedup']}x{'' if r['same_detections'] else '  (DETECTIONS DIFFER)'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": args.runs, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark upload preprocessing: full-resolution decode + allocating letterbox (the original
+/detect path) versus api.preprocess (DCT-reduced JPEG decode + reusable fused letterbox).
+
+Usage:
+    python scripts/bench_preprocess.py                     # synthetic 1080p and 4K frames
+    python scripts/bench_preprocess.py --images a.jpg b.jpg --runs 50 --output bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api.preprocess import PAD_VALUE, TensorPool, decode_for_model, prepare_image  # noqa: E402
+
+SYNTHETIC_SIZES = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+
+
+def synthetic_frame(width, height, seed=0):
+    """A road-like frame: smooth gradients plus texture, so JPEG sizes resemble real dashcam stills."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.dstack((x / width * 120 + 60, y / height * 100 + 80, (x + y) / (width + height) * 90 + 70))
+    noise = rng.normal(0, 12, (height, width, 3))
+    frame = np.clip(base + noise, 0, 255).astype(np.uint8)
+    for _ in range(20):
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(height // 2, height))
+        cv2.ellipse(frame, (cx, cy), (width // 40, height // 60), 0, 0, 360, (40, 40, 40), -1)
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def baseline_prepare(file_bytes, input_size):
+    """The original /detect path: full-resolution decode, then a fresh allocation at every step."""
+    image = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+    scale = min(input_size / width, input_size / height)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    canvas = np.full((input_size, input_size, 3), PAD_VALUE, dtype=np.uint8)
+    top, left = (input_size - new_h) // 2, (input_size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h))
+    tensor = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor, image.nbytes
+
+
+def optimized_prepare(file_bytes, input_size, pool):
+    tensor = pool.acquire()
+    prepared = prepare_image(file_bytes, input_size, tensor)
+    pool.release(tensor)
+    return prepared
+
+
+def measure(fn, runs):
+    fn()  # warm caches and scratch buffers
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "numpy_peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def bench(name, file_bytes, input_size, runs):
+    pool = TensorPool(input_size, capacity=1)
+    _, full_bytes = baseline_prepare(file_bytes, input_size)
+    prepared = optimized_prepare(file_bytes, input_size, pool)
+    reduced_bytes = decode_for_model(file_bytes, input_size)[0].nbytes
+
+    baseline = measure(lambda: baseline_prepare(file_bytes, input_size), runs)
+    optimized = measure(lambda: optimized_prepare(file_bytes, input_size, pool), runs)
+    baseline["decoded_bitmap_mb"] = round(full_bytes / 2**20, 2)
+    optimized["decoded_bitmap_mb"] = round(reduced_bytes / 2**20, 2)
+    optimized["decode_factor"] = prepared.decode_factor
+
+    return {
+        "image": name,
+        "size": [prepared.width, prepared.height],
+        "jpeg_kb": round(len(file_bytes) / 1024, 1),
+        "baseline": baseline,
+        "optimized": optimized,
+        "speedup": round(baseline["p50_ms"] / optimized["p50_ms"], 2) if optimized["p50_ms"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="*", help="JPEG files to benchmark (default: synthetic 1080p and 4K)")
+    parser.add_argument("--input-size", type=int, default=640)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = [(os.path.basename(path), open(path, "rb").read()) for path in args.images]
+    else:
+        inputs = [(name, synthetic_frame(*size)) for name, size in SYNTHETIC_SIZES.items()]
+
+    results = [bench(name, data, args.input_size, args.runs) for name, data in inputs]
+    for r in results:
+        print(f"{r['image']:>10} {r['size'][0]}x{r['size'][1]} ({r['jpeg_kb']} KB): "
+              f"baseline p50 {r['baseline']['p50_ms']} ms, {r['baseline']['decoded_bitmap_mb']} MB bitmap | "
+              f"optimized p50 {r['optimized']['p50_ms']} ms, {r['optimized']['decoded_bitmap_mb']} MB bitmap "
+              f"(1/{r['optimized']['decode_factor']} decode) -> {r['speedup']}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"input_size": args.input_size, "runs": args.runs, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark API cold start: fresh interpreter -> imports -> model load -> warm-up -> ready.
+Each run is a new process, like a worker started by autoscaling. Three scenarios:
+
+    no-cache    MODEL_CACHE_ENABLED=0, graph optimization on every start
+    cold-cache  empty MODEL_CACHE_DIR, the first worker on a machine (optimizes and saves)
+    warm-cache  MODEL_CACHE_DIR already populated (loads the saved optimized graph)
+
+Usage:
+    MODEL_PATH=public/object_detection_model/best0608.onnx python scripts/bench_startup.py --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+from api.app import app
+imported = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        while app.state.engine is None and app.state.model_error is None:
+            await asyncio.sleep(0.002)
+        return dict(app.state.startup, error=app.state.model_error, ready=time.perf_counter())
+
+result = asyncio.run(boot())
+result["import_ms"] = round((imported - start) * 1000, 1)
+result["to_ready_ms"] = round((result.pop("ready") - start) * 1000, 1)
+print(json.dumps(result))
+"""
+
+
+def boot_once(env):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = round((time.perf_counter() - started) * 1000, 1)  # includes interpreter start
+    if result.get("error"):
+        raise SystemExit(f"Model failed to load: {result['error']}")
+    return result
+
+
+def summarize(runs):
+    keys = ("import_ms", "model_load_ms", "warmup_ms", "ready_ms", "to_ready_ms", "process_ms")
+    return {key: round(statistics.median(r[key] for r in runs), 1) for key in keys if all(key in r for r in runs)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    base_env = dict(os.environ, PYTHONPATH=REPO_ROOT, MOCK_INFERENCE="0")
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        scenarios = {
+            "no-cache": [dict(base_env, MODEL_CACHE_ENABLED="0")] * args.runs,
+            # A fresh directory per run, so every run is the first on its "machine".
+            "cold-cache": [dict(base_env, MODEL_CACHE_DIR=os.path.join(cache_dir, f"cold{i}"))
+                           for i in range(args.runs)],
+            "warm-cache": [dict(base_env, MODEL_CACHE_DIR=os.path.join(cache_dir, "cold0"))] * args.runs,
+        }
+        for name, envs in scenarios.items():
+            runs = [boot_once(env) for env in envs]
+            results[name] = {"median": summarize(runs), "runs": runs}
+            m = results[name]["median"]
+            print(f"{name:>10}: imports {m['import_ms']} ms, model load {m['model_load_ms']} ms, "
+                  f"warm-up {m['warmup_ms']} ms -> ready {m['to_ready_ms']} ms after import start "
+                  f"({m['process_ms']} ms incl. interpreter)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": args.runs, "scenarios": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Compare the memory of N serving workers: N independent workers, each loading its own copy of the
+model (what `uvicorn --workers N` does), versus api.serve's shared mode (weights memory-mapped
+from one file in the model cache, workers pinned to their own CPUs).
+
+Each worker process loads the engine the way api/app.py does, warms it up and times a few
+inferences, then holds still while its memory is read from /proc/<pid>/smaps_rollup. RSS counts
+shared pages in every process that maps them, so it overstates the total; PSS splits them between
+the processes sharing them, so summed PSS is what the workers really cost the machine.
+
+Usage:
+    MODEL_PATH=public/object_detection_model/best0608.onnx python scripts/bench_workers.py --workers 4
+    python scripts/bench_workers.py --workers 2 4 8 --runs 20 --output workers.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api.serve import (  # noqa: E402
+    available_cpus, configure_worker, cpu_partitions, prepare_model, process_memory, worker_environment,
+)
+
+
+def worker(cpus, overrides, runs, ready, done):
+    configure_worker(cpus, overrides)
+    import numpy as np
+
+    from api.inference import InferenceEngine
+    from api.settings import Settings
+
+    settings = Settings.from_env()
+    engine = InferenceEngine.from_settings(settings)
+    engine.warm_up((1,), settings.warmup_runs)
+    batch = np.random.default_rng(0).random((1, 3, engine.input_size, engine.input_size), dtype=np.float32)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.run(batch)
+        times.append((time.perf_counter() - start) * 1000)
+    ready.put((os.getpid(), engine.cache_status, statistics.median(times)))
+    done.wait()
+
+
+def measure(mode, workers, runs, pin):
+    context = multiprocessing.get_context("spawn")
+    if mode == "shared":
+        partitions = cpu_partitions(available_cpus(), workers) if pin else [None] * workers
+        environments = [worker_environment(cpus) for cpus in partitions]
+    else:
+        partitions = [None] * workers
+        environments = [{"SHARE_MODEL_WEIGHTS": "0"}] * workers
+    # Both modes load from a warm model cache, as workers do after the first deploy.
+    prepare_model(environments[0])
+
+    ready, done = context.Queue(), context.Event()
+    processes = [context.Process(target=worker, args=(cpus, env, runs, ready, done))
+                 for cpus, env in zip(partitions, environments)]
+    for p in processes:
+        p.start()
+    try:
+        reports = [ready.get(timeout=300) for _ in processes]
+        memory = [process_memory(pid) for pid, _, _ in reports]
+    finally:
+        done.set()
+        for p in processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.kill()
+
+    total = {key: round(sum(m[key] for m in memory), 1) for key in memory[0]}
+    return {
+        "mode": mode,
+        "workers": workers,
+        "cache": sorted({status for _, status, _ in reports}),
+        "inference_p50_ms": round(statistics.median(t for _, _, t in reports), 2),
+        "total": total,
+        "per_worker": memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", nargs="*", type=int, default=[2, 4])
+    parser.add_argument("--runs", type=int, default=10, help="Timed inferences per worker")
+    parser.add_argument("--no-pin-cpus", dest="pin_cpus", action="store_false")
+    parser.add_argument("--cache-dir", help="Model cache to use (default: a fresh temporary directory)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    # A fresh cache by default, so entries left by other models or runtimes don't mix in.
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="bench-workers-")
+    os.environ["MODEL_CACHE_DIR"] = cache_dir
+    os.environ["MODEL_CACHE_ENABLED"] = "1"
+
+    results = []
+    for workers in args.workers:
+        for mode in ("independent", "shared"):
+            r = measure(mode, workers, args.runs, args.pin_cpus)
+            results.append(r)
+            print(f"{mode:>11} x{workers}: RSS {r['total']['rss_mb']:>7.1f} MB | PSS {r['total']['pss_mb']:>7.1f} MB | "
+                  f"private {r['total']['private_mb']:>7.1f} MB | inference p50 {r['inference_p50_ms']} ms "
+                  f"(cache {'/'.join(r['cache'])})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpus": len(available_cpus()), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
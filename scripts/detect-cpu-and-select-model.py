@@ -1,285 +1,108 @@
 #!/usr/bin/env python3
 """
-Intelligent CPU detection and model selection for Hazard Detection
-Detects CPU capabilities and selects the best available model format
+Startup model selection for Hazard Detection.
+Runs short timed inference trials on this machine (api/autotune.py) and writes the fastest
+measured configuration to model-config.json and .env.model in the app root. When model-config.json
+already holds a result for this CPU, onnxruntime build and model (AUTOTUNE_FORCE=1 to re-measure),
+it is reused and no trials run.
+
+With --cached-only nothing is measured: a cached result is re-exported, otherwise .env.model is
+removed and the script exits 1 so the caller can start the API on defaults and tune in the
+background (start-unified.sh); the new result applies from the next start.
 """
 
 import os
 import sys
-import json
-import subprocess
 import logging
 from pathlib import Path
 
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Where model-config.json / .env.model go; the checkout itself unless APP_ROOT says otherwise.
+APP_ROOT = Path(os.getenv('APP_ROOT') or REPO_ROOT)
+sys.path.insert(0, str(REPO_ROOT))
+
+from api.autotune import Trial, autotune, cached_config, tuning_key, write_config, write_env_file  # noqa: E402
+from api.settings import Settings, resolve_model_path  # noqa: E402
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
 class CPUModelSelector:
-    def __init__(self):
-        self.app_root = Path('/Users/shachafemanoel/Documents/Hazard-Detection')
+    def __init__(self, app_root=APP_ROOT):
+        self.app_root = Path(app_root)
         self.models_root = self.app_root / 'public/object_detection_model'
         self.config_file = self.app_root / 'model-config.json'
-        
-    def detect_cpu_capabilities(self):
-        """Detect CPU capabilities for OpenVINO support"""
-        try:
-            # Try to import cpuinfo for detailed CPU detection
-            try:
-                from cpuinfo import get_cpu_info
-                cpu_info = get_cpu_info()
-                cpu_flags = cpu_info.get('flags', [])
-                cpu_brand = cpu_info.get('brand_raw', 'Unknown')
-                logger.info(f"CPU: {cpu_brand}")
-                logger.info(f"CPU Flags: {', '.join(cpu_flags[:10])}...")  # First 10 flags
-                
-                # Check for OpenVINO-friendly instruction sets
-                openvino_friendly = any(flag in cpu_flags for flag in [
-                    'sse4_2', 'sse4.2', 'avx', 'avx2', 'avx512f'
-                ])
-                
-                return {
-                    'cpu_brand': cpu_brand,
-                    'has_sse42': 'sse4_2' in cpu_flags or 'sse4.2' in cpu_flags,
-                    'has_avx': 'avx' in cpu_flags,
-                    'has_avx2': 'avx2' in cpu_flags,
-                    'has_avx512': 'avx512f' in cpu_flags,
-                    'openvino_compatible': openvino_friendly,
-                    'total_flags': len(cpu_flags)
-                }
-                
-            except ImportError:
-                logger.warning("py-cpuinfo not available, using fallback detection")
-                # Fallback: try to use system commands
-                try:
-                    result = subprocess.run(['lscpu'], capture_output=True, text=True, timeout=5)
-                    lscpu_output = result.stdout.lower()
-                    
-                    # Basic detection from lscpu
-                    has_sse42 = 'sse4_2' in lscpu_output or 'sse4.2' in lscpu_output
-                    has_avx = 'avx' in lscpu_output
-                    has_avx2 = 'avx2' in lscpu_output
-                    
-                    return {
-                        'cpu_brand': 'Unknown (detected via lscpu)',
-                        'has_sse42': has_sse42,
-                        'has_avx': has_avx,
-                        'has_avx2': has_avx2,
-                        'has_avx512': False,
-                        'openvino_compatible': has_sse42 or has_avx,
-                        'total_flags': 'unknown'
-                    }
-                except Exception as e:
-                    logger.warning(f"lscpu fallback failed: {e}")
-                    
-        except Exception as e:
-            logger.error(f"CPU detection failed: {e}")
-            
-        # Ultimate fallback - assume basic compatibility
-        return {
-            'cpu_brand': 'Unknown',
-            'has_sse42': True,  # Most modern CPUs have this
-            'has_avx': False,
-            'has_avx2': False,
-            'has_avx512': False,
-            'openvino_compatible': True,  # Optimistic assumption
-            'total_flags': 'unknown'
-        }
-    
-    def check_model_files(self):
-        """Check availability of different model formats"""
-        models = {
-            'openvino': {
-                'available': False,
-                'path': None,
-                'files': []
-            },
-            'pytorch': {
-                'available': False,
-                'path': None,
-                'files': []
-            },
-            'onnx': {
-                'available': False,
-                'path': None,
-                'files': []
-            }
-        }
-        
-        # Check OpenVINO models
-        openvino_path = self.models_root / 'openvino'
-        if openvino_path.exists():
-            xml_files = list(openvino_path.glob('*.xml'))
-            bin_files = list(openvino_path.glob('*.bin'))
-            if xml_files and bin_files:
-                models['openvino']['available'] = True
-                models['openvino']['path'] = str(openvino_path)
-                models['openvino']['files'] = [f.name for f in xml_files + bin_files]
-        
-        # Check PyTorch models
-        pytorch_path = self.models_root / 'pytorch'
-        if pytorch_path.exists():
-            pt_files = list(pytorch_path.glob('*.pt'))
-            if pt_files:
-                models['pytorch']['available'] = True
-                models['pytorch']['path'] = str(pytorch_path)
-                models['pytorch']['files'] = [f.name for f in pt_files]
-        
-        # Check ONNX models (backup frontend models)
-        onnx_files = list(self.models_root.glob('*.onnx'))
-        if onnx_files:
-            models['onnx']['available'] = True
-            models['onnx']['path'] = str(self.models_root)
-            models['onnx']['files'] = [f.name for f in onnx_files]
-        
-        return models
-    
+        self.objective = os.getenv('AUTOTUNE_OBJECTIVE', 'throughput')
+        self.budget_seconds = float(os.getenv('AUTOTUNE_BUDGET_SECONDS', '120'))
+        self.batch_sizes = (1, 2, 4, 8)
+        self.force = os.getenv('AUTOTUNE_FORCE', '').lower() in ('1', 'true', 'yes', 'on')
+
+    def base_model(self):
+        return resolve_model_path(os.getenv('MODEL_PATH'), os.getenv('MODEL_DIR') or str(self.models_root))
+
     def select_optimal_configuration(self):
-        """Select the best model and configuration based on CPU and available models"""
-        cpu_caps = self.detect_cpu_capabilities()
-        available_models = self.check_model_files()
-        
-        logger.info("=== CPU Detection Results ===")
-        logger.info(f"CPU: {cpu_caps['cpu_brand']}")
-        logger.info(f"OpenVINO Compatible: {cpu_caps['openvino_compatible']}")
-        logger.info(f"SSE4.2: {cpu_caps['has_sse42']}, AVX: {cpu_caps['has_avx']}, AVX2: {cpu_caps['has_avx2']}")
-        
-        logger.info("=== Available Models ===")
-        for model_type, info in available_models.items():
-            status = "✅ Available" if info['available'] else "❌ Not Available"
-            logger.info(f"{model_type.upper()}: {status}")
-            if info['available']:
-                logger.info(f"  Path: {info['path']}")
-                logger.info(f"  Files: {', '.join(info['files'])}")
-        
-        # Decision logic for optimal configuration
-        config = {
-            'cpu_capabilities': cpu_caps,
-            'available_models': available_models,
-            'selected_backend': 'pytorch',  # Default fallback
-            'model_path': None,
-            'reasons': []
-        }
-        
-        # Priority 1: OpenVINO if CPU supports it and models are available
-        if (cpu_caps['openvino_compatible'] and 
-            available_models['openvino']['available']):
-            config['selected_backend'] = 'openvino'
-            config['model_path'] = available_models['openvino']['path']
-            config['reasons'].append('CPU supports OpenVINO instruction sets')
-            config['reasons'].append('OpenVINO models are available')
-            
-        # Priority 2: PyTorch if available (universal compatibility)
-        elif available_models['pytorch']['available']:
-            config['selected_backend'] = 'pytorch'
-            config['model_path'] = available_models['pytorch']['path']
-            config['reasons'].append('PyTorch models available (universal compatibility)')
-            if not cpu_caps['openvino_compatible']:
-                config['reasons'].append('CPU lacks OpenVINO-optimal instruction sets')
-                
-        # Priority 3: ONNX as last resort for frontend
-        elif available_models['onnx']['available']:
-            config['selected_backend'] = 'onnx'
-            config['model_path'] = available_models['onnx']['path']
-            config['reasons'].append('Using ONNX models as fallback')
-            config['reasons'].append('Neither OpenVINO nor PyTorch models available')
-        
-        else:
-            config['reasons'].append('No suitable models found!')
-            logger.error("❌ No suitable models found for any backend!")
-        
-        return config
-    
-    def generate_environment_config(self, config):
-        """Generate environment variables for the selected configuration"""
-        env_vars = {
-            'MODEL_BACKEND': config['selected_backend'],
-            'MODEL_DIR': config['model_path'] or '/Users/shachafemanoel/Documents/Hazard-Detection/public/object_detection_model',
-            'CPU_OPTIMIZATION': 'enabled' if config['cpu_capabilities']['openvino_compatible'] else 'basic',
-            'INFERENCE_MODE': config['selected_backend'],
-        }
-        
-        # Backend-specific configurations
-        if config['selected_backend'] == 'openvino':
-            env_vars.update({
-                'OPENVINO_MODEL_XML': f"{config['model_path']}/best.xml",
-                'OPENVINO_MODEL_BIN': f"{config['model_path']}/best.bin",
-                'OV_CPU_THREADS': '0',  # Auto-detect
-                'OV_CACHE_ENABLED': 'true'
-            })
-        elif config['selected_backend'] == 'pytorch':
-            pytorch_model = None
-            if config['model_path']:
-                pt_files = list(Path(config['model_path']).glob('*.pt'))
-                pytorch_model = str(pt_files[0]) if pt_files else None
-            
-            env_vars.update({
-                'PYTORCH_MODEL_PATH': pytorch_model or '/Users/shachafemanoel/Documents/Hazard-Detection/public/object_detection_model/best0408.onnx',
-                'TORCH_NUM_THREADS': '0',  # Auto-detect
-                'TORCH_DEVICE': 'cpu'
-            })
-        
-        return env_vars
-    
+        """Measure candidate configurations; returns (best trial, all trials)."""
+        model = self.base_model()
+        if model is None or not model.is_file():
+            raise FileNotFoundError(f"No ONNX model found in {self.models_root}")
+        logger.info(f"🔍 Autotuning {model.name} for {self.objective} (budget {self.budget_seconds:.0f}s)")
+        settings = Settings.from_env()
+        return autotune(model, settings.input_size, self.objective, self.batch_sizes,
+                        budget_seconds=self.budget_seconds)
+
+    def reuse_config(self, key):
+        """Re-export a cached result with the same tuning key; returns its trial, or None on a miss."""
+        config = None if self.force else cached_config(self.app_root, key)
+        if config is None:
+            return None
+        write_env_file(config, self.app_root)
+        logger.info(f"♻️ Reusing configuration tuned at {config['generated_at']} for this CPU and model")
+        return Trial(**config['selected'])
+
+    def reuse_cached_only(self):
+        """Re-export a cached result without measuring; drops a stale .env.model on a miss."""
+        model = self.base_model()
+        key = tuning_key(model, self.objective, self.batch_sizes) if model is not None and model.is_file() else None
+        best = self.reuse_config(key) if key else None
+        if best is None:
+            (self.app_root / '.env.model').unlink(missing_ok=True)
+            logger.info("⏭️ No tuned configuration for this CPU and model yet; API defaults apply")
+        return best
+
     def save_config(self):
-        """Main method to detect, select, and save configuration"""
+        """Main method to measure, select, and save configuration"""
         try:
-            logger.info("🔍 Starting intelligent model selection...")
-            
-            config = self.select_optimal_configuration()
-            env_vars = self.generate_environment_config(config)
-            
-            # Save detailed config
-            full_config = {
-                'timestamp': str(subprocess.check_output(['date'], text=True).strip()),
-                'selection_config': config,
-                'environment_variables': env_vars,
-                'container_info': {
-                    'python_version': sys.version,
-                    'working_directory': str(self.app_root)
-                }
-            }
-            
-            with open(self.config_file, 'w') as f:
-                json.dump(full_config, f, indent=2)
-            
-            # Save environment file for Docker
-            env_file = self.app_root / '.env.model'
-            with open(env_file, 'w') as f:
-                f.write("# Auto-generated model configuration\\n")
-                f.write(f"# Generated at: {full_config['timestamp']}\\n")
-                f.write(f"# Selected backend: {config['selected_backend']}\\n")
-                for key, value in env_vars.items():
-                    f.write(f"{key}={value}\\n")
-            
+            model = self.base_model()
+            key = tuning_key(model, self.objective, self.batch_sizes) if model is not None and model.is_file() else None
+            best = self.reuse_config(key) if key else None
+            if best is not None:
+                return best
+
+            best, trials = self.select_optimal_configuration()
+            write_config(best, trials, self.app_root, self.objective, model, key)
+
             logger.info("✅ Model selection completed successfully!")
-            logger.info(f"📊 Selected Backend: {config['selected_backend'].upper()}")
-            logger.info(f"📁 Model Path: {config['model_path']}")
-            logger.info("📝 Reasons:")
-            for reason in config['reasons']:
-                logger.info(f"   • {reason}")
-            
-            return config
-            
+            logger.info(f"📊 Provider: {best.provider}, variant: {best.variant}")
+            logger.info(f"🧵 Threads: intra-op {best.intra_op_threads}, inter-op {best.inter_op_threads}; "
+                        f"batch {best.batch_size}")
+            logger.info(f"⏱️ Measured p50 {best.latency_p50_ms} ms, {best.throughput_ips} img/s "
+                        f"over {len(trials)} trials")
+            return best
+
         except Exception as e:
             logger.error(f"❌ Model selection failed: {e}")
-            # Create fallback configuration
-            fallback_env = {
-                'MODEL_BACKEND': 'pytorch',
-                'MODEL_DIR': '/Users/shachafemanoel/Documents/Hazard-Detection/public/object_detection_model',
-                'PYTORCH_MODEL_PATH': '/app/models/pytorch/best.pt',
-                'INFERENCE_MODE': 'pytorch'
-            }
-            
+            # Leave the API on its built-in defaults rather than guessing.
             with open(self.app_root / '.env.model', 'w') as f:
-                f.write("# Fallback configuration\\n")
-                for key, value in fallback_env.items():
-                    f.write(f"{key}={value}\\n")
-            
-            return {'selected_backend': 'pytorch', 'model_path': '/app/models/pytorch'}
+                f.write("# Autotuning failed; API defaults apply\n")
+                f.write(f"# Reason: {e}\n")
+            return None
+
 
 if __name__ == '__main__':
     selector = CPUModelSelector()
-    result = selector.save_config()
-    print(f"Selected backend: {result['selected_backend']}")
-    sys.exit(0)
+    cached_only = '--cached-only' in sys.argv[1:]
+    result = selector.reuse_cached_only() if cached_only else selector.save_config()
+    print(f"Selected configuration: {result.env() if result else 'defaults'}")
+    sys.exit(1 if cached_only and result is None else 0)
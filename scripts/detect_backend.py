@@ -1,10 +1,6 @@
-import json
-from cpuinfo import get_cpu_info
+"""Entry point kept for scripts/start-united.sh; runs the same measured selection as detect-cpu-and-select-model.py."""
+import os
+import runpy
 
-flags = get_cpu_info().get('flags', [])
-use_openvino = any(f in flags for f in ['avx', 'avx2', 'sse4_2'])
-backend = 'openvino' if use_openvino else 'pytorch'
-model_dir = '/app/api/best_openvino_model' if backend == 'openvino' else '/app'
-with open('/app/backend.env', 'w') as f:
-    f.write(f"MODEL_BACKEND={backend}\n")
-print(f"Selected backend: {backend}")
+runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "detect-cpu-and-select-model.py"),
+               run_name="__main__")
@@ -0,0 +1,64 @@
+/**
+ * Generates public/tests/fixtures/postprocess_golden.json from the browser pipeline in
+ * src/utils/yolo-runtime.js: letterbox parameters from computeLetterboxParams() and the
+ * original-image boxes drawDetections() draws for model-space boxes. tests/test_postprocess.py
+ * checks the Python postprocessing against it, so both sides map boxes back identically.
+ *
+ * Usage: node scripts/make_postprocess_golden.mjs
+ */
+
+import { writeFileSync } from 'fs';
+import { computeLetterboxParams, drawDetections } from '../src/utils/yolo-runtime.js';
+
+const OUTPUT = new URL('../public/tests/fixtures/postprocess_golden.json', import.meta.url);
+
+const SIZES = [
+  [1920, 1080], [1080, 1920], [640, 480], [4032, 3024], [3840, 2160],
+  [640, 640], [333, 777], [1280, 961], [1281, 1280], [1, 500],
+];
+const TARGETS = [640, 480, 320];
+
+// Model-space boxes as fractions of the letterboxed image, so they stay inside it.
+const FRACTIONS = [
+  [0.1, 0.2, 0.35, 0.5],
+  [0.5, 0.05, 0.95, 0.9],
+  [0.0, 0.0, 1.0, 1.0],
+];
+
+// Records what drawDetections() strokes instead of drawing it.
+function recordingContext(width, height) {
+  const rects = [];
+  return {
+    rects,
+    canvas: { width, height },
+    clearRect() {},
+    drawImage() {},
+    fillText() {},
+    strokeRect(left, top, w, h) {
+      rects.push([left, top, left + w, top + h]);
+    },
+  };
+}
+
+const cases = [];
+for (const target of TARGETS) {
+  for (const [width, height] of SIZES) {
+    const params = computeLetterboxParams(width, height, target);
+    const modelBoxes = FRACTIONS.map(([a, b, c, d]) => [
+      params.offsetX + a * params.newW,
+      params.offsetY + b * params.newH,
+      params.offsetX + c * params.newW,
+      params.offsetY + d * params.newH,
+    ]);
+    const ctx = recordingContext(width, height);
+    const boxes = modelBoxes.map(([x1, y1, x2, y2]) => ({ x1, y1, x2, y2, score: 0.9, classId: 0 }));
+    drawDetections(ctx, { width, height }, boxes, ['pothole'], params);
+
+    cases.push({ width, height, target, params, model_boxes: modelBoxes, image_boxes: ctx.rects });
+  }
+}
+
+// One case per line keeps the fixture diffable.
+const body = cases.map((c) => `    ${JSON.stringify(c)}`).join(',\n');
+writeFileSync(OUTPUT, `{\n  "source": "src/utils/yolo-runtime.js",\n  "cases": [\n${body}\n  ]\n}\n`);
+console.log(`Wrote ${cases.length} cases to ${OUTPUT.pathname}`);
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Offline optimization of the detection model into servable variants, plus a comparison report.
+
+Each variant is written next to the source model as <stem>.<variant>.onnx, which is where the API
+looks for it when MODEL_VARIANT is set (see api/settings.py):
+
+    sim           onnxsim constant folding / graph cleanup (skipped if onnxsim is not installed)
+    opt           ONNX Runtime offline graph optimization, serialized so startup skips it
+    int8-dynamic  INT8 weights, activations quantized at run time (no calibration data needed)
+    int8-static   INT8 weights and activations (QDQ), ranges calibrated on --calibration images
+
+The report runs every variant over --eval images and compares latency, throughput and mAP with
+the FP32 model. Without --eval-labels (YOLO txt files) the FP32 model's own detections are the
+reference, so mAP then measures agreement with FP32 rather than absolute accuracy.
+
+Usage:
+    python scripts/optimize_model.py public/object_detection_model/best0608.onnx \\
+        --calibration data/calib --eval data/val/images --eval-labels data/val/labels \\
+        --output model-optimization.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api.inference import InferenceEngine, load_labels  # noqa: E402
+from api.postprocess import iou_matrix  # noqa: E402
+from api.preprocess import prepare_image  # noqa: E402
+from api.settings import DEFAULT_LABELS_PATH, variant_path  # noqa: E402
+
+logger = logging.getLogger("optimize_model")
+
+VARIANTS = ("sim", "opt", "int8-dynamic", "int8-static")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+MAP_IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def list_images(directory, limit=None):
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    return paths[:limit] if limit else paths
+
+
+def load_tensors(paths, input_size):
+    """Prepared (tensor, params, width, height) for each readable image."""
+    prepared = []
+    for path in paths:
+        item = prepare_image(path.read_bytes(), input_size)
+        if item is None:
+            logger.warning("Skipping unreadable image %s", path)
+            continue
+        prepared.append((path, item))
+    return prepared
+
+
+# --- variant builders -------------------------------------------------------------------------
+
+def simplify(source: Path, target: Path) -> bool:
+    try:
+        import onnx
+        from onnxsim import simplify as onnxsim_simplify
+    except ImportError:
+        logger.warning("onnxsim not installed; skipping the 'sim' variant")
+        return False
+    model, ok = onnxsim_simplify(onnx.load(str(source)))
+    if not ok:
+        logger.warning("onnxsim could not validate the simplified model; skipping 'sim'")
+        return False
+    onnx.save(model, str(target))
+    return True
+
+
+def ort_optimize(source: Path, target: Path) -> bool:
+    """
+    Serialize ONNX Runtime's graph optimizations. EXTENDED rather than ALL: the ALL level adds
+    layout transforms tied to the CPU that ran them, which a saved model must not bake in.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = str(target)
+    ort.InferenceSession(str(source), sess_options=options, providers=["CPUExecutionProvider"])
+    return target.is_file()
+
+
+def quant_preprocess(source: Path, target: Path) -> Path:
+    """
+    Shape inference + graph cleanup recommended before quantization, written to `target`.
+    Unnamed nodes get names so the detection head can be excluded from quantization by name.
+    """
+    import onnx
+
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(str(source), str(target), skip_symbolic_shape=True)
+        model = onnx.load(str(target))
+    except Exception as e:
+        logger.warning("Quantization pre-processing failed (%s); quantizing %s as is", e, source.name)
+        model = onnx.load(str(source))
+
+    for i, node in enumerate(model.graph.node):
+        if not node.name:
+            node.name = f"{node.op_type}_{i}"
+    onnx.save(model, str(target))
+    return target
+
+
+def head_nodes(model_path: Path):
+    """
+    Nodes between the last Conv/MatMul layers and the graph outputs: the box/score decoding head.
+    Its output tensor mixes pixel coordinates (0-640) with class scores (0-1), so a single INT8
+    scale for it wipes out the scores; YOLO exports are quantized with the head left in FP32.
+    """
+    import onnx
+
+    graph = onnx.load(str(model_path)).graph
+    producers = {output: node for node in graph.node for output in node.output}
+    excluded, frontier = set(), [output.name for output in graph.output]
+    while frontier:
+        node = producers.get(frontier.pop())
+        if node is None or node.name in excluded or node.op_type in ("Conv", "MatMul", "Gemm"):
+            continue
+        excluded.add(node.name)
+        frontier.extend(node.input)
+    return sorted(excluded)
+
+
+def quantize_dynamic(source: Path, target: Path) -> bool:
+    from onnxruntime.quantization import QuantType, quantize_dynamic as ort_quantize_dynamic
+
+    ort_quantize_dynamic(str(source), str(target), weight_type=QuantType.QUInt8)
+    return True
+
+
+class CalibrationReader:
+    """Feeds letterboxed calibration images to onnxruntime's static quantizer one at a time."""
+
+    def __init__(self, input_name, prepared):
+        self.input_name = input_name
+        self._items = iter(prepared)
+
+    def get_next(self):
+        item = next(self._items, None)
+        return None if item is None else {self.input_name: item[1].tensor[None]}
+
+
+def quantize_static(source: Path, target: Path, calibration, input_name) -> bool:
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType
+    from onnxruntime.quantization import quantize_static as ort_quantize_static
+
+    if not calibration:
+        logger.warning("No calibration images; skipping the 'int8-static' variant")
+        return False
+    ort_quantize_static(
+        str(source), str(target), CalibrationReader(input_name, calibration),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=head_nodes(source),
+    )
+    return True
+
+
+# --- evaluation ---------------------------------------------------------------------------------
+
+def read_yolo_labels(path: Path, width, height):
+    """YOLO txt (class cx cy w h, normalized) -> (boxes xyxy in pixels, class ids)."""
+    if not path.is_file():
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.int64)
+    rows = np.loadtxt(path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.int64)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+    return boxes, rows[:, 0].astype(np.int64)
+
+
+def average_precision(predictions, ground_truth, class_id, iou_threshold):
+    """All-point interpolated AP for one class. predictions/ground_truth: per-image (boxes, scores|None, classes)."""
+    scored = []
+    total_gt = 0
+    for (p_boxes, p_scores, p_classes), (g_boxes, _, g_classes) in zip(predictions, ground_truth):
+        p_mask, g_mask = p_classes == class_id, g_classes == class_id
+        pb, ps, gb = p_boxes[p_mask], p_scores[p_mask], g_boxes[g_mask]
+        total_gt += len(gb)
+        order = np.argsort(-ps)
+        matched = np.zeros(len(gb), dtype=bool)
+        ious = iou_matrix(pb[order], gb) if len(pb) and len(gb) else np.zeros((len(pb), 0))
+        for rank, i in enumerate(order):
+            hit = False
+            if ious.shape[1]:
+                candidates = np.where(~matched, ious[rank], -1.0)
+                best = int(candidates.argmax())
+                if candidates[best] >= iou_threshold:
+                    matched[best] = hit = True
+            scored.append((float(ps[i]), hit))
+
+    if total_gt == 0:
+        return None
+    if not scored:
+        return 0.0
+    scored.sort(key=lambda s: -s[0])
+    hits = np.array([hit for _, hit in scored], dtype=np.float64)
+    tp = np.cumsum(hits)
+    recall = tp / total_gt
+    precision = tp / np.arange(1, len(hits) + 1)
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum((recall[1:] - recall[:-1]) * precision[1:]))
+
+
+def mean_average_precision(predictions, ground_truth, num_classes):
+    def at(threshold):
+        aps = [average_precision(predictions, ground_truth, c, threshold) for c in range(num_classes)]
+        aps = [ap for ap in aps if ap is not None]
+        return float(np.mean(aps)) if aps else 0.0
+
+    return {
+        "map50": round(at(0.5), 4),
+        "map50_95": round(float(np.mean([at(t) for t in MAP_IOU_THRESHOLDS])), 4),
+    }
+
+
+def detections_to_arrays(detections):
+    if not detections:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+    return (
+        np.array([d["box"] for d in detections], dtype=np.float32),
+        np.array([d["score"] for d in detections], dtype=np.float32),
+        np.array([d["class_id"] for d in detections], dtype=np.int64),
+    )
+
+
+def evaluate(model_path: Path, labels, images, runs, batch_size, threads):
+    engine = InferenceEngine(model_path, labels, intra_op_threads=threads)
+    tensors = np.stack([item.tensor for _, item in images])
+
+    predictions = [
+        detections_to_arrays(engine.postprocess(engine.run(item.tensor[None])[0], item.params, item.width, item.height))
+        for _, item in images
+    ]
+
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        engine.run(tensors[i % len(tensors)][None])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = tensors[np.arange(batch_size) % len(tensors)]
+    start = time.perf_counter()
+    repeats = max(1, runs // batch_size)
+    for _ in range(repeats):
+        engine.run(batch)
+    throughput = repeats * batch_size / (time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "latency_p50_ms": round(statistics.median(latencies), 3),
+        "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        "throughput_ips": round(throughput, 2),
+        "size_mb": round(model_path.stat().st_size / 2**20, 2),
+    }, predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", type=Path, help="FP32 source model")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS_PATH, help="labels.json")
+    parser.add_argument("--calibration", help="Directory of calibration images for int8-static")
+    parser.add_argument("--calibration-count", type=int, default=200)
+    parser.add_argument("--eval", help="Directory of evaluation images for the report")
+    parser.add_argument("--eval-labels", help="Directory of YOLO txt labels matching --eval image names")
+    parser.add_argument("--eval-count", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50, help="Timed single-image runs per variant")
+    parser.add_argument("--batch-size", type=int, default=8, help="Batch size for the throughput measurement")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = one per core)")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    source = args.model
+    labels = load_labels(args.labels)
+    probe = InferenceEngine(source, labels)
+    input_size, input_name = probe.input_size, probe.input_name
+    if probe.fixed_batch_size:
+        args.batch_size = probe.fixed_batch_size
+    del probe
+
+    built = {"fp32": source}
+    work_dir = source.parent
+    quant_source = source
+
+    if "sim" in args.variants and simplify(source, variant_path(source, "sim")):
+        built["sim"] = quant_source = variant_path(source, "sim")
+    if "opt" in args.variants and ort_optimize(quant_source, variant_path(source, "opt")):
+        built["opt"] = variant_path(source, "opt")
+
+    if {"int8-dynamic", "int8-static"} & set(args.variants):
+        prepped = quant_preprocess(quant_source, work_dir / f"{source.stem}.quant-prep.onnx")
+        try:
+            if "int8-dynamic" in args.variants and quantize_dynamic(prepped, variant_path(source, "int8-dynamic")):
+                built["int8-dynamic"] = variant_path(source, "int8-dynamic")
+            if "int8-static" in args.variants:
+                calibration = (load_tensors(list_images(args.calibration, args.calibration_count), input_size)
+                               if args.calibration else [])
+                if quantize_static(prepped, variant_path(source, "int8-static"), calibration, input_name):
+                    built["int8-static"] = variant_path(source, "int8-static")
+        finally:
+            prepped.unlink(missing_ok=True)
+
+    for name, path in built.items():
+        print(f"{name:>13}: {path}")
+
+    if not args.eval:
+        return
+
+    images = load_tensors(list_images(args.eval, args.eval_count), input_size)
+    if not images:
+        sys.exit(f"No readable images in {args.eval}")
+
+    results = {}
+    predictions = {}
+    for name, path in built.items():
+        logger.info("Evaluating %s", name)
+        results[name], predictions[name] = evaluate(path, labels, images, args.runs, args.batch_size, args.threads)
+
+    if args.eval_labels:
+        reference = "labels"
+        ground_truth = [
+            read_yolo_labels(Path(args.eval_labels) / f"{path.stem}.txt", item.width, item.height)
+            for path, item in images
+        ]
+        ground_truth = [(boxes, None, classes) for boxes, classes in ground_truth]
+    else:
+        reference = "fp32"
+        ground_truth = predictions["fp32"]
+
+    base = results["fp32"]
+    for name, result in results.items():
+        result.update(mean_average_precision(predictions[name], ground_truth, len(labels)))
+        result["speedup"] = round(base["latency_p50_ms"] / result["latency_p50_ms"], 2)
+        result["throughput_gain"] = round(result["throughput_ips"] / base["throughput_ips"], 2)
+        print(f"{name:>13}: p50 {result['latency_p50_ms']} ms ({result['speedup']}x), "
+              f"{result['throughput_ips']} img/s at batch {args.batch_size} ({result['throughput_gain']}x), "
+              f"mAP50 {result['map50']} / mAP50-95 {result['map50_95']} vs {reference}, {result['size_mb']} MB")
+
+    if args.output:
+        report = {
+            "model": str(source),
+            "input_size": input_size,
+            "images": len(images),
+            "map_reference": reference,
+            "batch_size": args.batch_size,
+            "variants": {name: {"path": str(built[name]), **result} for name, result in results.items()},
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
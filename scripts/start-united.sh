@@ -1,20 +1,18 @@
 #!/bin/sh
 set -e
 
-# Detect CPU and choose backend
-python3 /app/scripts/detect_backend.py
-
-[ -f /app/backend.env ] && . /app/backend.env
-# Set model directory based on selected backend if not already defined
-if [ -z "$MODEL_DIR" ]; then
-  if [ "$MODEL_BACKEND" = "openvino" ]; then
-    export MODEL_DIR="/app/api/best_openvino_model"
-  else
-    export MODEL_DIR="/app"
-  fi
+# Reuse a tuned inference configuration; on a miss the API starts on defaults and tuning runs
+# in the background once it is up (applies on the next start)
+NEED_TUNING=0
+APP_ROOT=/app python3 /app/scripts/detect_backend.py --cached-only || NEED_TUNING=1
+
+if [ -f /app/.env.model ]; then
+  set -a
+  . /app/.env.model
+  set +a
 fi
 
-echo "Using backend: $MODEL_BACKEND"
+echo "Using provider: ${ORT_EXECUTION_PROVIDER:-CPUExecutionProvider}, variant: ${MODEL_VARIANT:-fp32}"
 
 # Verify required files
 if [ ! -f /app/api/app.py ]; then
@@ -33,6 +31,10 @@ API_PID=$!
 # Wait a moment
 sleep 5
 
+if [ "$NEED_TUNING" = "1" ]; then
+  APP_ROOT=/app nice -n 10 python3 /app/scripts/detect_backend.py >/tmp/autotune.log 2>&1 &
+fi
+
 # Start web server
 cd /app/server/routes
 PORT=${PORT:-3000} API_URL=http://localhost:8080 node server.js &
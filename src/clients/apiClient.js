@@ -335,9 +335,10 @@ async function endApiSession(sessionId) {
 }
 
 /**
- * Confirm report
+ * Confirm report. With a location ({ lat, lon, location? }), the web server also stores it,
+ * merged into an existing report of the same hazard nearby.
  */
-async function confirmReport(sessionId, reportId) {
+async function confirmReport(sessionId, reportId, location = null) {
   await ensureInitialized();
 
   try {
@@ -352,7 +353,9 @@ async function confirmReport(sessionId, reportId) {
         headers: {
           Accept: 'application/json',
           'User-Agent': 'Hazard-Detection-API/1.0',
+          ...(location ? { 'Content-Type': 'application/json' } : {}),
         },
+        ...(location ? { body: JSON.stringify(location) } : {}),
       }
     );
 
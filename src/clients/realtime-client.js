@@ -18,6 +18,17 @@ if (typeof window === 'undefined') {
   }
 }
 
+/**
+ * Width and height scaled down (never up) so the longest side is at most `maxDimension`.
+ */
+function fitWithin(width, height, maxDimension) {
+  const scale = maxDimension ? Math.min(1, maxDimension / Math.max(width, height)) : 1;
+  return {
+    width: Math.max(1, Math.round(width * scale)),
+    height: Math.max(1, Math.round(height * scale)),
+  };
+}
+
 class RealtimeClient {
   constructor(config = {}) {
     this.config = {
@@ -25,9 +36,17 @@ class RealtimeClient {
       maxRetries: config.maxRetries || 5,
       backoffMs: config.backoffMs || 500,
       authToken: config.authToken,
+      // Follow the server's QoS hints: frame pacing, upload size and JPEG quality.
+      followQos: config.followQos !== false,
+      now: config.now || (() => Date.now()),
       ...config,
     };
 
+    // Latest hint from the server ({ level, next_frame_ms, max_dimension, jpeg_quality }).
+    this.qos = null;
+    this.nextFrameAt = 0;
+    this.skippedFrames = 0;
+
     this.baseUrl = null;
     this.sessionId = null;
     this.status = 'disconnected';
@@ -217,15 +236,71 @@ class RealtimeClient {
     this.setStatus('disconnected');
   }
 
-  async send(payload) {
+  /**
+   * Whether the server's pacing hint allows a new frame now. Callers may poll this from their
+   * capture loop; send() drops frames offered earlier.
+   */
+  readyForFrame() {
+    return !this.config.followQos || this.config.now() >= this.nextFrameAt;
+  }
+
+  /** Milliseconds until the next frame may be sent (0 when ready). */
+  nextFrameDelay() {
+    return this.config.followQos ? Math.max(0, this.nextFrameAt - this.config.now()) : 0;
+  }
+
+  /** Record a QoS hint from a detect response; pacing counts from when the frame was sent. */
+  applyQos(hint, sentAt) {
+    if (!hint || !this.config.followQos) return;
+    this.qos = hint;
+    this.nextFrameAt = Math.max(this.nextFrameAt, sentAt + (hint.next_frame_ms || 0));
+  }
+
+  /** Pause uploads after the server rejected one as overloaded (503 with Retry-After). */
+  applyRetryAfter(seconds) {
+    const delayMs = (Number(seconds) || 1) * 1000;
+    this.nextFrameAt = Math.max(this.nextFrameAt, this.config.now() + delayMs);
+  }
+
+  /** Encode a canvas at the hinted size and quality. */
+  async encodeCanvas(canvas) {
+    let source = canvas;
+    const maxDimension = this.qos?.max_dimension;
+    const { width, height } = fitWithin(canvas.width, canvas.height, maxDimension);
+    if (width !== canvas.width || height !== canvas.height) {
+      source = document.createElement('canvas');
+      source.width = width;
+      source.height = height;
+      source.getContext('2d').drawImage(canvas, 0, 0, width, height);
+    }
+    const quality = this.qos?.jpeg_quality ? this.qos.jpeg_quality / 100 : 0.9;
+    return new Promise((resolve, reject) => {
+      source.toBlob(
+        (blob) => {
+          if (blob) resolve(blob);
+          else reject(new Error('Failed to convert canvas to blob'));
+        },
+        'image/jpeg',
+        quality
+      );
+    });
+  }
+
+  async send(payload, { retry = false } = {}) {
     if (this.status !== 'connected') {
       const error = new Error('Not connected');
       this.emit('error', error);
       return;
     }
+    if (!retry && !this.readyForFrame()) {
+      // Sending ahead of the server's hint would only queue behind other sessions.
+      this.skippedFrames++;
+      return false;
+    }
 
     this.setStatus('uploading');
     const startTime = Date.now();
+    const sentAt = this.config.now();
 
     try {
       let response;
@@ -276,17 +351,7 @@ class RealtimeClient {
           });
           formData.append('file', blob, payload.filename);
         } else if (payload instanceof HTMLCanvasElement) {
-          const blob = await new Promise((resolve, reject) => {
-            payload.toBlob(
-              (blob) => {
-                if (blob) resolve(blob);
-                else reject(new Error('Failed to convert canvas to blob'));
-              },
-              'image/jpeg',
-              0.9
-            );
-          });
-          formData.append('file', blob, 'frame.jpg');
+          formData.append('file', await this.encodeCanvas(payload), 'frame.jpg');
         } else {
           formData.append('file', payload, 'frame.jpg');
         }
@@ -312,6 +377,9 @@ class RealtimeClient {
           signal: withTimeout(this.config.timeout),
         });
 
+        if (response.status === 503) {
+          this.applyRetryAfter(response.headers.get('Retry-After'));
+        }
         if (!response.ok) {
           const errorData = await response
             .json()
@@ -326,6 +394,7 @@ class RealtimeClient {
 
       const result = typeof window === 'undefined' ? response.data : response;
       const processingTime = Date.now() - startTime;
+      this.applyQos(result.qos, sentAt);
 
       console.log(`⚡ Detection completed in ${processingTime}ms`);
 
@@ -342,6 +411,9 @@ class RealtimeClient {
       this.retryCount = 0;
     } catch (error) {
       const processingTime = Date.now() - startTime;
+      if (error.response?.status === 503) {
+        this.applyRetryAfter(error.response.headers?.['retry-after']);
+      }
       console.error(
         `❌ Detection failed after ${processingTime}ms:`,
         error.message
@@ -361,7 +433,7 @@ class RealtimeClient {
 
         setTimeout(async () => {
           try {
-            await this.send(payload);
+            await this.send(payload, { retry: true });
           } catch (retryError) {
             this.emit('error', retryError);
           }
@@ -425,7 +497,7 @@ function createRealtimeClient(config) {
 
 // CommonJS exports for Node.js compatibility
 if (typeof module !== 'undefined' && module.exports) {
-  module.exports = { createRealtimeClient, RealtimeClient };
+  module.exports = { createRealtimeClient, RealtimeClient, fitWithin };
 }
 
 // Browser compatibility - expose as global
@@ -435,4 +507,4 @@ if (typeof window !== 'undefined') {
 }
 
 // ES6 module exports
-export { createRealtimeClient, RealtimeClient };
+export { createRealtimeClient, RealtimeClient, fitWithin };
@@ -22,6 +22,11 @@ import sgMail from '@sendgrid/mail';
 import streamifier from 'streamifier';
 
 // Internal imports
+import {
+    clustersInBox, CLUSTER_MAX_ZOOM, collectPage, ensureGeoIndex, idsInBox, idsNearby, indexReport, parseBbox,
+    reportCoordinates, unindexReport,
+} from '../services/report-geo-index.js';
+import { dedupOptionsFromEnv, ingestReport } from '../services/report-dedup.js';
 import { uploadReport } from '../services/report-upload-service.js';
 import { asyncHandler } from '../utils/async-handler.js';
 
@@ -334,6 +339,80 @@ app.post('/api/v1/detect', upload.single('file'), async (req, res) => {
     }
 });
 
+// Report images are JPEG, not JSON: stream them through instead of the generic proxy below.
+// The API keeps the frame by reference and renders `plot`/`thumbnail` on first request.
+async function proxyReportImage(res, apiPath) {
+    try {
+        const response = await axios({
+            url: `${API_URL}${apiPath}`,
+            responseType: 'arraybuffer',
+            timeout: 30000,
+            validateStatus: () => true,
+        });
+        if (response.status !== 200) {
+            return res.status(response.status).json({ error: 'Report image not available' });
+        }
+        res.set('Content-Type', response.headers['content-type'] || 'image/jpeg');
+        if (response.headers['cache-control']) {
+            res.set('Cache-Control', response.headers['cache-control']);
+        }
+        res.send(Buffer.from(response.data));
+    } catch (error) {
+        res.status(502).json({ error: error.message });
+    }
+}
+
+// A live session's report, while the session lasts.
+app.get('/api/v1/session/:sessionId/report/:reportId/:kind(image|plot|thumbnail)', (req, res) => {
+    const { sessionId, reportId, kind } = req.params;
+    proxyReportImage(res, `/session/${encodeURIComponent(sessionId)}/report/${encodeURIComponent(reportId)}/${kind}`);
+});
+
+// A confirmed report by its image key (frame key / report id); stored reports link here, since it
+// keeps working after the session is evicted or the API restarts.
+app.get('/api/v1/report-images/:frameKey([0-9a-f]{32})/:reportId([0-9a-f-]{36})/:kind(image|plot|thumbnail)', (req, res) => {
+    const { frameKey, reportId, kind } = req.params;
+    proxyReportImage(res, `/report-images/${frameKey}/${reportId}/${kind}`);
+});
+
+// Confirming a session report also stores it, through the same dedup stage as POST /api/reports,
+// when the client sends where it was seen (lat/lon, optional location text).
+app.post('/api/v1/session/:sessionId/report/:reportId/confirm', async (req, res) => {
+    const { sessionId, reportId } = req.params;
+    let result;
+    try {
+        result = await makeApiRequest(
+            `/session/${encodeURIComponent(sessionId)}/report/${encodeURIComponent(reportId)}/confirm`,
+            { method: 'POST' },
+        );
+    } catch (error) {
+        return res.status(502).json({ error: error.message });
+    }
+
+    const body = req.body || {};
+    const confirmed = result && result.report;
+    if (!confirmed || !req.isAuthenticated() || !reportCoordinates(body) || !client || !redisConnected) {
+        return res.json(result);
+    }
+    try {
+        const { report, merged } = await storeReport(reportFromBody({
+            type: confirmed.hazard_type,
+            lat: body.lat,
+            lon: body.lon,
+            location: body.location,
+            time: confirmed.last_seen || new Date().toISOString(),
+            status: 'New',
+            reportedBy: req.user.username || req.user.email,
+            confidence: confirmed.confidence,
+            ...(confirmed.image_key ? { imageKey: confirmed.image_key } : {}),
+        }));
+        res.json({ ...result, stored: { reportId: report.id, merged, sightings: report.sightings || 1 } });
+    } catch (err) {
+        console.error('🔥 Failed to store confirmed report:', err);
+        res.json({ ...result, stored: null });
+    }
+});
+
 // Generic API proxy for other endpoints
 app.all('/api/v1/*', async (req, res) => {
     try {
@@ -374,6 +453,9 @@ if (process.env.REDIS_HOST && process.env.REDIS_PASSWORD && RedisStore) {
         .then(() => {
             redisConnected = true;
             console.log('✅ Connected to Redis');
+            ensureGeoIndex(client, loadReport)
+                .then((indexed) => indexed && console.log(`🗺️ Indexed ${indexed} existing reports for map queries`))
+                .catch((err) => console.error('🔥 Failed to build the report geo index:', err));
         })
         .catch(err => {
             redisConnected = false;
@@ -452,6 +534,30 @@ async function safeRedisSet(key, value, options = {}) {
   }
 }
 
+// A report document, stored as RedisJSON or (older reports) as a JSON string.
+async function loadReport(key) {
+    try {
+        const report = await client.json.get(key);
+        if (report) return report;
+    } catch (err) {
+        // Not a JSON document; fall through to the string encoding.
+    }
+    const str = await client.get(key);
+    return str ? JSON.parse(str) : null;
+}
+
+// Reports are always written as RedisJSON. JSON.SET over an older string-encoded report fails with
+// WRONGTYPE, so that key is replaced by the document.
+async function writeReport(key, report) {
+    try {
+        await client.json.set(key, '$', report);
+    } catch (err) {
+        if (!String(err.message).includes('WRONGTYPE')) throw err;
+        await client.del(key);
+        await client.json.set(key, '$', report);
+    }
+}
+
 async function safeRedisKeys(pattern) {
   if (!client || !redisConnected) return [];
   try {
@@ -766,37 +872,81 @@ app.get('/dashboard.html', (req, res) => {
 });
 
 
-// יצירת דיווח חדש
-app.post('/api/reports', async (req, res) => {
-    if (!req.isAuthenticated()) { // מספיק לבדוק req.isAuthenticated()
-        return res.status(401).json({ error: 'Unauthorized' });
+// A report record from a request body. Confirmed session reports reference the frame the API
+// saved by its image key instead of carrying it as base64; the key and its URLs are stored in Redis.
+function reportFromBody(body) {
+    const { type, location, time, status, reportedBy } = body;
+    let { image } = body;
+    let thumbnail = body.thumbnail;
+    const imageKey = /^[0-9a-f]{32}\/[0-9a-f-]{36}$/.test(body.imageKey || '') ? body.imageKey : undefined;
+
+    if (!image && imageKey) {
+        image = `/api/v1/report-images/${imageKey}/plot`;
+        thumbnail = thumbnail || `/api/v1/report-images/${imageKey}/thumbnail`;
     }
-    
-    const { type, location, time, image, status, reportedBy } = req.body;
-    
+
     const report = {
         id: new Date().getTime(), // מזהה ייחודי לדיווח (מזמן היצירה)
         type,
         location,
         time,
         image,
+        thumbnail,
+        ...(imageKey ? { imageKey } : {}),
         status,
         reportedBy,
-        locationNote: req.body.locationNote || 'GPS'
+        locationNote: body.locationNote || 'GPS'
     };
-    
-    const reportKey = `report:${report.id}`;  // יצירת המפתח הייחודי לכל דיווח
-    
+    const coordinates = reportCoordinates(body);
+    if (coordinates) Object.assign(report, coordinates);
+    if (Number.isFinite(Number(body.confidence))) report.confidence = Number(body.confidence);
+    return report;
+}
+
+const dedupOptions = dedupOptionsFromEnv();
+
+// Store a report, or fold it into an existing report of the same hazard nearby (report-dedup.js).
+async function storeReport(report) {
+    const result = await ingestReport({
+        client,
+        loadReport: (id) => loadReport(`report:${id}`),
+        saveReport: async (record) => {
+            await writeReport(`report:${record.id}`, record);
+            await indexReport(client, record);
+        },
+    }, report, dedupOptions);
+    broadcastSSEEvent({ type: result.merged ? 'report_updated' : 'new_report', report: result.report });
+    return result;
+}
+
+// יצירת דיווח חדש
+app.post('/api/reports', async (req, res) => {
+    if (!req.isAuthenticated()) { // מספיק לבדוק req.isAuthenticated()
+        return res.status(401).json({ error: 'Unauthorized' });
+    }
+
     try {
-        // שמירה ב-Redis תחת המפתח הייחודי
-        await client.json.set(reportKey, '$', report);  // משתמשים ב-JSON.SET כדי לשמור את הדיווח
-        broadcastSSEEvent({ type: 'new_report', report });
-        res.status(200).json({ message: 'Report saved successfully' });
+        const { report, merged } = await storeReport(reportFromBody(req.body));
+        res.status(200).json({
+            message: merged ? 'Report merged into an existing report' : 'Report saved successfully',
+            merged,
+            reportId: report.id,
+            sightings: report.sightings || 1,
+        });
     } catch (err) {
         res.status(500).json({ error: 'Error saving report' });
     }
 });
 
+// Reports keep lat/lon for mapping even when only their `location` text carries them.
+function withCoordinates(report) {
+    if (report.lat && report.lon) {
+        return report;
+    }
+    const coordinates = reportCoordinates(report);
+    return coordinates ? { ...report, ...coordinates } : report;
+}
+
 // Enhanced reports fetcher with improved error handling
 async function getReports() {
     try {
@@ -839,26 +989,7 @@ async function getReports() {
         }
 
         // Ensure all reports have required lat/lon for mapping
-        return reports.map(report => {
-            // If report has coordinates as lat/lon properties, keep them
-            if (report.lat && report.lon) {
-                return report;
-            }
-            
-            // Try to parse location for coordinates
-            if (typeof report.location === 'string') {
-                const coordMatch = report.location.match(/Coordinates:\s*([+-]?\d*\.?\d+),\s*([+-]?\d*\.?\d+)/);
-                if (coordMatch) {
-                    return {
-                        ...report,
-                        lat: parseFloat(coordMatch[1]),
-                        lon: parseFloat(coordMatch[2])
-                    };
-                }
-            }
-            
-            return report;
-        });
+        return reports.map(withCoordinates);
     } catch (error) {
         console.error('🔥 Error in getReports:', error);
         throw new Error(`Database operation failed: ${error.message}`);
@@ -1027,6 +1158,109 @@ app.get('/api/reports', async (req, res) => {
     }
 });
 
+// Map queries served from the report geo index (src/services/report-geo-index.js): only reports
+// inside the viewport or radius are read, so they stay fast however many reports exist.
+const MAX_MAP_PAGE = 500;
+
+function mapPageLimit(value) {
+    return Math.min(Math.max(parseInt(value) || 100, 1), MAX_MAP_PAGE);
+}
+
+function mapFilters(query) {
+    const types = query.hazardType ? String(query.hazardType).split(',').map(t => t.trim().toLowerCase()) : [];
+    const status = query.status ? String(query.status).toLowerCase() : null;
+    return (report) => {
+        if (types.length > 0) {
+            const reportTypes = (report.type || '').split(',').map(t => t.trim().toLowerCase());
+            if (!types.some(type => reportTypes.includes(type))) return false;
+        }
+        return !status || (report.status || '').toLowerCase() === status;
+    };
+}
+
+async function loadReportById(id) {
+    const report = await loadReport(`report:${id}`);
+    return report ? withCoordinates(report) : null;
+}
+
+function requireGeoIndex(res) {
+    if (!client || !redisConnected) {
+        res.status(503).json({ error: 'Database unavailable' });
+        return false;
+    }
+    return true;
+}
+
+// Reports inside a viewport: ?bbox=minLon,minLat,maxLon,maxLat[&cursor&limit&hazardType&status]
+app.get('/api/reports/geo', async (req, res) => {
+    const bbox = parseBbox(req.query.bbox);
+    if (!bbox) {
+        return res.status(400).json({ error: 'bbox must be minLon,minLat,maxLon,maxLat' });
+    }
+    if (!requireGeoIndex(res)) return;
+    try {
+        const startTime = Date.now();
+        const ids = await idsInBox(client, bbox);
+        const page = await collectPage(
+            ids, { cursor: req.query.cursor, limit: mapPageLimit(req.query.limit) }, loadReportById, mapFilters(req.query),
+        );
+        res.json({ ...page, inView: ids.length, processedInMs: Date.now() - startTime });
+    } catch (err) {
+        console.error('🔥 Error querying reports in view:', err);
+        res.status(500).json({ error: 'Error fetching reports', details: err.message });
+    }
+});
+
+// Reports within `radius` meters of a point: ?lat&lon[&radius=500&cursor&limit&hazardType&status]
+app.get('/api/reports/nearby', async (req, res) => {
+    const lat = parseFloat(req.query.lat);
+    const lon = parseFloat(req.query.lon);
+    const radius = parseFloat(req.query.radius) || 500;
+    if (!Number.isFinite(lat) || !Number.isFinite(lon) || radius <= 0) {
+        return res.status(400).json({ error: 'lat, lon and a positive radius (meters) are required' });
+    }
+    if (!requireGeoIndex(res)) return;
+    try {
+        const found = await idsNearby(client, { lat, lon, radius });
+        const distances = new Map(found.map(({ id, distance }) => [id, distance]));
+        const page = await collectPage(
+            [...distances.keys()], { cursor: req.query.cursor, limit: mapPageLimit(req.query.limit) },
+            async (id) => {
+                const report = await loadReportById(id);
+                return report && { ...report, distance: Math.round(distances.get(id)) };
+            },
+            mapFilters(req.query),
+        );
+        res.json({ ...page, inRadius: found.length });
+    } catch (err) {
+        console.error('🔥 Error querying nearby reports:', err);
+        res.status(500).json({ error: 'Error fetching reports', details: err.message });
+    }
+});
+
+// Zoomed-out map views: report counts per area, ?bbox=...&zoom=N. From CLUSTER_MAX_ZOOM up
+// the map should switch to /api/reports/geo.
+app.get('/api/reports/clusters', async (req, res) => {
+    const bbox = parseBbox(req.query.bbox);
+    const zoom = parseInt(req.query.zoom);
+    if (!bbox || !Number.isFinite(zoom)) {
+        return res.status(400).json({ error: 'bbox (minLon,minLat,maxLon,maxLat) and zoom are required' });
+    }
+    if (!requireGeoIndex(res)) return;
+    try {
+        const clusters = await clustersInBox(client, bbox, zoom);
+        res.json({
+            zoom,
+            clusters,
+            total: clusters.reduce((sum, cluster) => sum + cluster.count, 0),
+            pointsFromZoom: CLUSTER_MAX_ZOOM,
+        });
+    } catch (err) {
+        console.error('🔥 Error clustering reports:', err);
+        res.status(500).json({ error: 'Error clustering reports', details: err.message });
+    }
+});
+
 // Simple Redis test endpoint
 app.get('/api/test/redis', (req, res) => {
     try {
@@ -1088,6 +1322,7 @@ app.delete('/api/reports/:id', async (req, res) => {
     const reportKey = `report:${reportId}`;
     try {
         await client.del(reportKey);
+        await unindexReport(client, reportId);
         res.status(200).json({ message: 'Report deleted successfully' });
     } catch (err) {
         res.status(500).json({ error: 'Error deleting report' });
@@ -1103,20 +1338,10 @@ app.patch('/api/reports/:id/status', async (req, res) => {
     const newStatus = req.body.status;
     const reportKey = `report:${reportId}`;
     try {
-        let report = await client.json.get(reportKey);
-        if (!report) {
-            // Fallback: try to get as string and parse
-            const str = await client.get(reportKey);
-            if (str) {
-                report = JSON.parse(str);
-                // Migrate to JSON
-                await client.json.set(reportKey, '$', report);
-                await client.del(reportKey); // Remove old string key if needed
-            }
-        }
+        const report = await loadReport(reportKey);
         if (!report) return res.status(404).json({ error: 'Report not found' });
         report.status = newStatus;
-        await client.json.set(reportKey, '$', report);
+        await writeReport(reportKey, report);
         broadcastSSEEvent({ type: 'status_update', report });
         res.status(200).json({ message: 'Status updated', report });
     } catch (err) {
@@ -1202,12 +1427,10 @@ app.patch('/api/reports/:id', async (req, res) => {
     const reportKey = `report:${reportId}`;
 
     try {
-        const existingReportStr = await client.get(reportKey);
-        if (!existingReportStr) {
+        const report = await loadReport(reportKey);
+        if (!report) {
             return res.status(404).json({ error: 'Report not found' });
         }
-
-        const report = JSON.parse(existingReportStr);
         
         // Update only the fields that are provided
         const updates = req.body;
@@ -1222,7 +1445,8 @@ app.patch('/api/reports/:id', async (req, res) => {
         report.modifiedBy = req.user.email;
 
         // Save back to Redis
-        await client.set(reportKey, JSON.stringify(report));
+        await writeReport(reportKey, report);
+        await indexReport(client, { ...report, id: reportId });
 
         broadcastSSEEvent({ type: 'report_updated', report });
         res.json({ message: 'Report updated successfully', report });
@@ -1240,7 +1464,7 @@ app.get('/api/reports/:id', async (req, res) => {
     const reportId = req.params.id;
     const reportKey = `report:${reportId}`;
     try {
-        const report = await client.json.get(reportKey);
+        const report = await loadReport(reportKey);
         if (!report) {
             return res.status(404).json({ error: 'Report not found' });
         }
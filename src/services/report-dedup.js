@@ -0,0 +1,147 @@
+// Geo-temporal deduplication of incoming hazard reports.
+//
+// Every driver passing a pothole confirms their own report of it. Before a report is stored,
+// the geo index (report-geo-index.js) is asked for reports of the same hazard type within
+// `radiusMeters` whose last sighting is within `windowDays`; the nearest one absorbs the new
+// report as another sighting instead of a new record. Lookup cost depends only on how many
+// reports are near the point, not on the total.
+
+import { idsNearby, reportCoordinates } from './report-geo-index.js';
+
+export const DEFAULT_DEDUP_OPTIONS = {
+  enabled: true,
+  radiusMeters: 15,
+  windowDays: 30,
+  // Nearby reports examined per lookup, nearest first.
+  maxCandidates: 20,
+};
+
+const RESOLVED_STATUSES = new Set(['resolved', 'closed', 'dismissed']);
+const MAX_MERGED_IMAGES = 10;
+const MAX_IMAGE_URL_LENGTH = 2048;
+
+export function dedupOptionsFromEnv(env = process.env) {
+  const number = (name, fallback) => {
+    const value = parseFloat(env[name]);
+    return Number.isFinite(value) ? value : fallback;
+  };
+  return {
+    enabled: !['0', 'false', 'no', 'off'].includes(String(env.REPORT_DEDUP_ENABLED ?? '').toLowerCase()),
+    radiusMeters: number('REPORT_DEDUP_RADIUS_M', DEFAULT_DEDUP_OPTIONS.radiusMeters),
+    windowDays: number('REPORT_DEDUP_WINDOW_DAYS', DEFAULT_DEDUP_OPTIONS.windowDays),
+    maxCandidates: DEFAULT_DEDUP_OPTIONS.maxCandidates,
+  };
+}
+
+function hazardTypes(report) {
+  return String(report.type || '')
+    .split(',')
+    .map((t) => t.trim().toLowerCase())
+    .filter(Boolean);
+}
+
+function sameHazard(a, b) {
+  const typesA = hazardTypes(a);
+  const typesB = new Set(hazardTypes(b));
+  return typesA.length > 0 && typesA.some((t) => typesB.has(t));
+}
+
+function timestamp(report) {
+  const value = new Date(report.lastSeen || report.time || report.createdAt || report.id).getTime();
+  return Number.isFinite(value) ? value : 0;
+}
+
+/**
+ * The stored report an incoming one duplicates, or null.
+ *
+ * @param {object} client - node-redis client
+ * @param {object} report - incoming report (needs coordinates and a type)
+ * @param {(id: string) => Promise<object|null>} loadReport
+ * @returns {Promise<object|null>}
+ */
+export async function findDuplicate(client, report, loadReport, options = DEFAULT_DEDUP_OPTIONS) {
+  const coordinates = reportCoordinates(report);
+  if (!options.enabled || !coordinates || hazardTypes(report).length === 0) return null;
+  const nearby = await idsNearby(client, {
+    lat: coordinates.lat, lon: coordinates.lon, radius: options.radiusMeters, count: options.maxCandidates,
+  });
+  const cutoff = timestamp(report) - options.windowDays * 24 * 60 * 60 * 1000;
+  for (const { id } of nearby) {
+    if (String(id) === String(report.id)) continue;
+    const candidate = await loadReport(id);
+    if (
+      candidate &&
+      sameHazard(candidate, report) &&
+      timestamp(candidate) >= cutoff &&
+      !RESOLVED_STATUSES.has(String(candidate.status || '').toLowerCase())
+    ) {
+      return { ...candidate, id: candidate.id ?? id };
+    }
+  }
+  return null;
+}
+
+// A sighting's image as a link worth keeping on the merged record: inline (data:) images would grow
+// it by a frame per sighting, and session report links stop resolving once the session ends.
+function imageLink(image) {
+  const url = typeof image === 'string' ? image : image?.url;
+  if (typeof url !== 'string' || !url || url.length > MAX_IMAGE_URL_LENGTH) return null;
+  if (url.startsWith('data:') || url.startsWith('/api/v1/session/')) return null;
+  return url;
+}
+
+/**
+ * Fold `incoming` into `existing` as further sightings. The stored location, image and status
+ * are kept; counts, confidence and reporters accumulate. Later sightings' images are collected
+ * as links only, at most MAX_MERGED_IMAGES of them.
+ */
+export function mergeReports(existing, incoming) {
+  const sightings = (existing.sightings || 1) + (incoming.sightings || 1);
+  const merged = {
+    ...existing,
+    sightings,
+    lastSeen: new Date(Math.max(timestamp(existing), timestamp(incoming))).toISOString(),
+    reporters: [...new Set([...(existing.reporters || [existing.reportedBy]), incoming.reportedBy])].filter(Boolean),
+  };
+  // Confidence aggregates over the sightings that carried one (manual reports don't).
+  let sum = existing.confidenceSum ?? (Number.isFinite(Number(existing.confidence)) ? Number(existing.confidence) : 0);
+  let count = existing.confidenceCount ?? (Number.isFinite(Number(existing.confidence)) ? 1 : 0);
+  const confidence = Number(incoming.confidence);
+  if (Number.isFinite(confidence)) {
+    sum += confidence;
+    count += 1;
+    merged.confidence = Math.max(Number(existing.confidence) || 0, confidence);
+  }
+  if (count > 0) {
+    Object.assign(merged, { confidenceSum: sum, confidenceCount: count, confidenceMean: sum / count });
+  }
+  const images = (existing.images || []).map(imageLink).filter(Boolean);
+  const image = imageLink(incoming.image);
+  if (image && image !== imageLink(existing.image) && !images.includes(image)) {
+    images.push(image);
+  }
+  if (images.length > 0 || existing.images) {
+    merged.images = images.slice(-MAX_MERGED_IMAGES);
+  }
+  return merged;
+}
+
+/**
+ * Store a new report, or merge it into the duplicate it matches.
+ *
+ * @param {object} deps
+ * @param {object} deps.client - node-redis client
+ * @param {(id: string) => Promise<object|null>} deps.loadReport
+ * @param {(report: object) => Promise<void>} deps.saveReport - persists and indexes a report
+ * @returns {Promise<{report: object, merged: boolean}>}
+ */
+export async function ingestReport({ client, loadReport, saveReport }, report, options = DEFAULT_DEDUP_OPTIONS) {
+  const duplicate = await findDuplicate(client, report, loadReport, options);
+  if (duplicate) {
+    const merged = mergeReports(duplicate, report);
+    await saveReport(merged);
+    return { report: merged, merged: true };
+  }
+  await saveReport(report);
+  return { report, merged: false };
+}
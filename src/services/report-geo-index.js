@@ -0,0 +1,310 @@
+// Spatial index for hazard reports, kept in Redis next to the `report:<id>` documents.
+//
+// - `reports:geo` is a Redis GEO set (member = report id), answering viewport and radius
+//   queries in O(log N + M) for M reports in the area instead of loading every report.
+// - `reports:cells:<p>` hashes keep per-geohash-cell counts and coordinate sums at a few
+//   precisions, so zoomed-out map views get server-side clusters by reading only the cells
+//   covering the viewport, however many reports those cells hold.
+//
+// Pages are ordered newest first (report ids are creation timestamps) and continue from an
+// opaque cursor, the last id returned, so paging stays stable while reports are added.
+
+export const GEO_KEY = 'reports:geo';
+const CELLS_KEY_PREFIX = 'reports:cells:';
+
+// Geohash precisions kept for clustering: ~156 km, ~39 km, ~4.9 km and ~1.2 km wide cells.
+export const CLUSTER_PRECISIONS = [3, 4, 5, 6];
+// From this zoom level up, maps get individual reports instead of clusters.
+export const CLUSTER_MAX_ZOOM = 14;
+// Viewports needing more cells than this read the whole precision level instead.
+const MAX_COVER_CELLS = 2048;
+
+const BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz';
+
+const COORDINATES_PATTERN = /Coordinates:\s*([+-]?\d*\.?\d+),\s*([+-]?\d*\.?\d+)/;
+
+/**
+ * Latitude/longitude of a report: explicit `lat`/`lon` fields, or the
+ * "Coordinates: lat, lon" text older reports carry in `location`.
+ *
+ * @param {object} report
+ * @returns {{lat: number, lon: number} | null}
+ */
+export function reportCoordinates(report) {
+  if (!report) return null;
+  let lat = parseFloat(report.lat);
+  let lon = parseFloat(report.lon ?? report.lng);
+  if (!Number.isFinite(lat) || !Number.isFinite(lon)) {
+    const match = typeof report.location === 'string' && report.location.match(COORDINATES_PATTERN);
+    if (!match) return null;
+    lat = parseFloat(match[1]);
+    lon = parseFloat(match[2]);
+  }
+  if (Math.abs(lat) > 85.05112878 || Math.abs(lon) > 180) return null; // outside what Redis GEO accepts
+  return { lat, lon };
+}
+
+export function encodeGeohash(lat, lon, precision) {
+  let latRange = [-90, 90];
+  let lonRange = [-180, 180];
+  let hash = '';
+  let bits = 0;
+  let value = 0;
+  let evenBit = true;
+  while (hash.length < precision) {
+    const range = evenBit ? lonRange : latRange;
+    const coordinate = evenBit ? lon : lat;
+    const mid = (range[0] + range[1]) / 2;
+    value <<= 1;
+    if (coordinate >= mid) {
+      value |= 1;
+      range[0] = mid;
+    } else {
+      range[1] = mid;
+    }
+    evenBit = !evenBit;
+    if (++bits === 5) {
+      hash += BASE32[value];
+      bits = 0;
+      value = 0;
+    }
+  }
+  return hash;
+}
+
+/** Width and height of a geohash cell at `precision`, in degrees. */
+export function geohashCellSize(precision) {
+  const lonBits = Math.ceil((precision * 5) / 2);
+  const latBits = Math.floor((precision * 5) / 2);
+  return { lonSize: 360 / 2 ** lonBits, latSize: 180 / 2 ** latBits };
+}
+
+/** Geohash cells at `precision` covering a bounding box, or null if there are more than `limit`. */
+export function coverCells(bbox, precision, limit = MAX_COVER_CELLS) {
+  const { lonSize, latSize } = geohashCellSize(precision);
+  const startLon = Math.floor(bbox.minLon / lonSize) * lonSize;
+  const startLat = Math.floor(bbox.minLat / latSize) * latSize;
+  const columns = Math.ceil((bbox.maxLon - startLon) / lonSize);
+  const rows = Math.ceil((bbox.maxLat - startLat) / latSize);
+  if (columns * rows > limit) return null;
+  const cells = [];
+  for (let row = 0; row < rows; row++) {
+    for (let column = 0; column < columns; column++) {
+      const lat = Math.min(startLat + (row + 0.5) * latSize, 90);
+      const lon = Math.min(startLon + (column + 0.5) * lonSize, 180);
+      cells.push(encodeGeohash(lat, lon, precision));
+    }
+  }
+  return cells;
+}
+
+/** Geohash precision used to cluster a map at `zoom` (Google/OSM zoom levels). */
+export function precisionForZoom(zoom) {
+  if (zoom <= 4) return 3;
+  if (zoom <= 7) return 4;
+  if (zoom <= 10) return 5;
+  return 6;
+}
+
+/**
+ * Parse a `minLon,minLat,maxLon,maxLat` viewport.
+ *
+ * @param {string} value
+ * @returns {{minLon: number, minLat: number, maxLon: number, maxLat: number} | null}
+ */
+export function parseBbox(value) {
+  if (typeof value !== 'string') return null;
+  const parts = value.split(',').map(Number);
+  if (parts.length !== 4 || parts.some((n) => !Number.isFinite(n))) return null;
+  const [minLon, minLat, maxLon, maxLat] = parts;
+  if (minLon > maxLon || minLat > maxLat) return null;
+  return {
+    minLon: Math.max(minLon, -180),
+    minLat: Math.max(minLat, -85.05112878),
+    maxLon: Math.min(maxLon, 180),
+    maxLat: Math.min(maxLat, 85.05112878),
+  };
+}
+
+function haversineMeters(lat1, lon1, lat2, lon2) {
+  const rad = Math.PI / 180;
+  const dLat = (lat2 - lat1) * rad;
+  const dLon = (lon2 - lon1) * rad;
+  const a = Math.sin(dLat / 2) ** 2 + Math.cos(lat1 * rad) * Math.cos(lat2 * rad) * Math.sin(dLon / 2) ** 2;
+  return 2 * 6372797.560856 * Math.asin(Math.sqrt(a)); // Redis GEO's earth radius
+}
+
+/** The GEOSEARCH BYBOX shape for a bounding box: its center and width/height in meters. */
+export function boxShape(bbox) {
+  const lat = (bbox.minLat + bbox.maxLat) / 2;
+  const lon = (bbox.minLon + bbox.maxLon) / 2;
+  // Width is measured along the edge nearest the equator, so the box covers the whole viewport.
+  const widestLat = bbox.minLat <= 0 && bbox.maxLat >= 0 ? 0 : Math.min(Math.abs(bbox.minLat), Math.abs(bbox.maxLat));
+  return {
+    center: { longitude: lon, latitude: lat },
+    width: haversineMeters(widestLat, bbox.minLon, widestLat, bbox.maxLon) + 1,
+    height: haversineMeters(bbox.minLat, lon, bbox.maxLat, lon) + 1,
+  };
+}
+
+function compareIdsNewestFirst(a, b) {
+  const na = Number(a);
+  const nb = Number(b);
+  if (Number.isFinite(na) && Number.isFinite(nb)) return nb - na;
+  return a < b ? 1 : a > b ? -1 : 0;
+}
+
+/**
+ * One page of reports, newest first, after `cursor` (the last id of the previous page).
+ * Ids are loaded a page at a time and filtered with `accept` until the page is full.
+ *
+ * @param {string[]} ids
+ * @param {{cursor?: string, limit: number}} options
+ * @param {(id: string) => Promise<object|null>} load
+ * @param {(report: object) => boolean} [accept]
+ * @returns {Promise<{reports: object[], nextCursor: string | null}>}
+ */
+export async function collectPage(ids, { cursor, limit }, load, accept = () => true) {
+  const sorted = [...ids].sort(compareIdsNewestFirst);
+  let next = cursor ? sorted.findIndex((id) => compareIdsNewestFirst(cursor, id) < 0) : 0;
+  if (next < 0) next = sorted.length;
+  const reports = [];
+  let last = null;
+  while (reports.length < limit && next < sorted.length) {
+    const chunk = sorted.slice(next, next + limit - reports.length);
+    next += chunk.length;
+    const loaded = await Promise.all(chunk.map(load));
+    loaded.forEach((report) => {
+      if (report && accept(report)) reports.push(report);
+    });
+    last = chunk[chunk.length - 1];
+  }
+  return { reports, nextCursor: next < sorted.length ? last : null };
+}
+
+async function cellDelta(client, lat, lon, sign) {
+  const multi = client.multi();
+  for (const precision of CLUSTER_PRECISIONS) {
+    const key = `${CELLS_KEY_PREFIX}${precision}`;
+    const cell = encodeGeohash(lat, lon, precision);
+    multi.hIncrBy(key, cell, sign);
+    multi.hIncrByFloat(key, `${cell}:lat`, sign * lat);
+    multi.hIncrByFloat(key, `${cell}:lon`, sign * lon);
+  }
+  await multi.exec();
+}
+
+/**
+ * Add (or move) a report in the index. Reports without coordinates are left out.
+ *
+ * @returns {Promise<boolean>} whether the report is indexed
+ */
+export async function indexReport(client, report) {
+  const coordinates = reportCoordinates(report);
+  const member = String(report.id);
+  const [previous] = await client.geoPos(GEO_KEY, member);
+  if (previous) {
+    if (!coordinates) return unindexReport(client, member).then(() => false);
+    await cellDelta(client, Number(previous.latitude), Number(previous.longitude), -1);
+  }
+  if (!coordinates) return false;
+  await client.geoAdd(GEO_KEY, { longitude: coordinates.lon, latitude: coordinates.lat, member });
+  // Cells are counted from the position Redis stored (GEO quantizes coordinates), so removal
+  // later subtracts exactly what was added.
+  const [stored] = await client.geoPos(GEO_KEY, member);
+  await cellDelta(client, Number(stored.latitude), Number(stored.longitude), 1);
+  return true;
+}
+
+export async function unindexReport(client, reportId) {
+  const member = String(reportId);
+  const [previous] = await client.geoPos(GEO_KEY, member);
+  if (!previous) return;
+  await client.zRem(GEO_KEY, member);
+  await cellDelta(client, Number(previous.latitude), Number(previous.longitude), -1);
+}
+
+/**
+ * Build the index from existing `report:*` documents if it doesn't exist yet (first start
+ * after upgrading). Uses SCAN, so Redis keeps serving other clients meanwhile.
+ *
+ * @param {(key: string) => Promise<object|null>} loadReport
+ * @returns {Promise<number>} reports indexed
+ */
+export async function ensureGeoIndex(client, loadReport) {
+  if (await client.exists(GEO_KEY)) return 0;
+  let indexed = 0;
+  for await (const key of client.scanIterator({ MATCH: 'report:*', COUNT: 500 })) {
+    const report = await loadReport(key);
+    if (report && (await indexReport(client, { ...report, id: report.id ?? key.slice('report:'.length) }))) {
+      indexed++;
+    }
+  }
+  return indexed;
+}
+
+/**
+ * Ids of reports inside a viewport.
+ *
+ * @returns {Promise<string[]>}
+ */
+export async function idsInBox(client, bbox) {
+  const { center, width, height } = boxShape(bbox);
+  const found = await client.geoSearchWith(GEO_KEY, center, { width, height, unit: 'm' }, ['WITHCOORD']);
+  // BYBOX is measured in meters around the center; trim to the exact degree bounds.
+  return found
+    .filter(({ coordinates: c }) => {
+      const lat = Number(c.latitude);
+      const lon = Number(c.longitude);
+      return lat >= bbox.minLat && lat <= bbox.maxLat && lon >= bbox.minLon && lon <= bbox.maxLon;
+    })
+    .map(({ member }) => member);
+}
+
+/**
+ * Reports within `radius` meters of a point, nearest first, with their distance in meters.
+ *
+ * @returns {Promise<{id: string, distance: number}[]>}
+ */
+export async function idsNearby(client, { lat, lon, radius, count }) {
+  const options = count ? { SORT: 'ASC', COUNT: count } : { SORT: 'ASC' };
+  const found = await client.geoSearchWith(
+    GEO_KEY, { longitude: lon, latitude: lat }, { radius, unit: 'm' }, ['WITHDIST'], options,
+  );
+  return found.map(({ member, distance }) => ({ id: member, distance: Number(distance) }));
+}
+
+/**
+ * Clusters for a zoomed-out viewport: one entry per non-empty geohash cell, positioned at the
+ * mean of its reports' coordinates.
+ *
+ * @returns {Promise<{cell: string, count: number, lat: number, lon: number}[]>}
+ */
+export async function clustersInBox(client, bbox, zoom) {
+  const precision = precisionForZoom(zoom);
+  const key = `${CELLS_KEY_PREFIX}${precision}`;
+  const cells = coverCells(bbox, precision);
+  const values = {};
+  if (cells) {
+    const fields = cells.flatMap((cell) => [cell, `${cell}:lat`, `${cell}:lon`]);
+    const found = fields.length ? await client.hmGet(key, fields) : [];
+    fields.forEach((field, i) => {
+      if (found[i] !== null && found[i] !== undefined) values[field] = found[i];
+    });
+  } else {
+    Object.assign(values, await client.hGetAll(key));
+  }
+
+  const clusters = [];
+  for (const [field, value] of Object.entries(values)) {
+    if (field.includes(':')) continue;
+    const count = parseInt(value, 10);
+    if (!(count > 0)) continue;
+    const lat = parseFloat(values[`${field}:lat`]) / count;
+    const lon = parseFloat(values[`${field}:lon`]) / count;
+    if (lat >= bbox.minLat && lat <= bbox.maxLat && lon >= bbox.minLon && lon <= bbox.maxLon) {
+      clusters.push({ cell: field, count, lat, lon });
+    }
+  }
+  return clusters;
+}
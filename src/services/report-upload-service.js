@@ -2,6 +2,8 @@ import { v2 as cloudinary } from 'cloudinary';
 import streamifier from 'streamifier';
 import { createClient } from 'redis';
 
+import { indexReport } from './report-geo-index.js';
+
 // Configure Cloudinary
 cloudinary.config({
   cloud_name: process.env.CLOUDINARY_CLOUD_NAME,
@@ -93,6 +95,7 @@ export async function uploadReport({ file, filename, metadata }) {
       const reportKey = `report:${reportId}`;
       await redisClient.json.set(reportKey, '$', report);
       console.log(`💾 Report saved to Redis: ${reportKey}`);
+      await indexReport(redisClient, report);
     } catch (err) {
       console.error('🔥 Failed to save report to Redis:', err);
       // Decide if this should be a fatal error or just a warning
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import pytest
+
+# Make the `api` package importable when pytest is run from anywhere in the repo.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tests.helpers import FakeSession  # noqa: E402
+
+
+@pytest.fixture
+def serve(monkeypatch, tmp_path):
+    """
+    Start the API on a FakeSession model: `with serve(MAX_PENDING_REQUESTS="1") as (client, session)`.
+    Keyword arguments are environment overrides; pass `session=` to use a configured FakeSession.
+    """
+    from fastapi.testclient import TestClient
+
+    @contextmanager
+    def start(session=None, **env):
+        session = session or FakeSession()
+        model = tmp_path / "fake.onnx"
+        model.write_bytes(b"not a real model")
+        defaults = {
+            "MODEL_PATH": str(model),
+            "MODEL_CACHE_ENABLED": "0",
+            "REPORT_IMAGE_DIR": str(tmp_path / "report-images"),
+            "WARMUP_RUNS": "1",
+            "MOCK_INFERENCE": "0",
+        }
+        for name, value in {**defaults, **env}.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setattr("api.inference.create_session", lambda *args, **kwargs: session)
+        from api.app import app
+
+        with TestClient(app) as client:
+            for _ in range(200):
+                if client.get("/ready").status_code == 200:
+                    break
+                time.sleep(0.01)
+            else:
+                raise AssertionError(f"API never became ready: {client.get('/ready').json()}")
+            session.batch_sizes.clear()  # drop warm-up calls
+            yield client, session
+
+    return start
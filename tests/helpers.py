@@ -0,0 +1,61 @@
+"""Stand-ins and builders shared by the API tests; fixtures wrapping them live in conftest.py."""
+import threading
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+
+class FakeSession:
+    """
+    Stands in for the onnxruntime.InferenceSession of a two-class YOLOv8 export (crack, pothole) so
+    the real engine, preprocessing and serving path run without a model file. It "detects" the
+    white region of each letterboxed image as one pothole at 0.9, and records each call's batch size.
+    """
+
+    def __init__(self, input_size: int = 160, delay: float = 0.0):
+        self.input_size = input_size
+        self.delay = delay
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="images", shape=["batch", 3, self.input_size, self.input_size])]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name="output0")]
+
+    def get_providers(self):
+        return ["CPUExecutionProvider"]
+
+    def run(self, output_names, feeds):
+        batch = feeds["images"]
+        if batch.shape[1:] != (3, self.input_size, self.input_size):
+            # onnxruntime rejects inputs that don't match the model's fixed dimensions.
+            raise ValueError(f"Got invalid dimensions for input: images, {batch.shape}")
+        with self._lock:
+            self.batch_sizes.append(len(batch))
+        if self.delay:
+            time.sleep(self.delay)
+        output = np.zeros((len(batch), 6, 8), dtype=np.float32)  # (B, 4 + classes, anchors)
+        for i, image in enumerate(batch):
+            ys, xs = np.nonzero(image.min(axis=0) >= 0.9)
+            if xs.size:
+                x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+                output[i, :4, 0] = ((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1)
+                output[i, 5, 0] = 0.9
+        return [output]
+
+
+def jpeg(width=640, height=480, hazard=(200, 150, 328, 246)):
+    """A gray frame with one white rectangle (x1, y1, x2, y2), which FakeSession reports as a pothole."""
+    image = np.full((height, width, 3), 60, np.uint8)
+    if hazard is not None:
+        x1, y1, x2, y2 = hazard
+        image[y1:y2, x1:x2] = 255
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+
+def upload(data, name="frame.jpg"):
+    return {"file": (name, data, "image/jpeg")}
@@ -0,0 +1,38 @@
+from api.autotune import Trial, cached_config, thread_counts, tuning_key, write_config, write_env_file
+
+
+def test_thread_counts_cover_powers_of_two_and_the_full_budget():
+    assert thread_counts(1) == [1]
+    assert thread_counts(6) == [1, 2, 4, 6]
+    assert thread_counts(8) == [1, 2, 4, 8]
+
+
+def test_failed_trials_never_win():
+    ok = Trial("CPUExecutionProvider", "fp32", "m.onnx", 4, 1, 1, latency_p50_ms=20.0, throughput_ips=50.0)
+    failed = Trial("OpenVINOExecutionProvider", "fp32", "m.onnx", 4, 1, 1, error="unsupported")
+    fast_batch = Trial("CPUExecutionProvider", "fp32", "m.onnx", 4, 1, 8, latency_p50_ms=80.0, throughput_ips=100.0)
+
+    assert max([failed, ok], key=lambda t: t.score("throughput")) is ok
+    assert max([ok, fast_batch], key=lambda t: t.score("throughput")) is fast_batch
+    assert max([ok, fast_batch], key=lambda t: t.score("latency")) is ok
+    assert fast_batch.env()["BATCH_MAX_SIZE"] == "8"
+
+
+def test_tuned_configuration_is_reused_only_for_the_same_model(tmp_path):
+    model = tmp_path / "best.onnx"
+    model.write_bytes(b"weights v1")
+    key = tuning_key(model, "throughput", (1, 2, 4, 8))
+    assert key == tuning_key(model, "throughput", (1, 2, 4, 8))
+    assert key != tuning_key(model, "latency", (1, 2, 4, 8))
+    assert cached_config(tmp_path, key) is None
+
+    best = Trial("CPUExecutionProvider", "fp32", str(model), 4, 1, 4, latency_p50_ms=20.0, throughput_ips=200.0)
+    write_config(best, [best], tmp_path, "throughput", model, key)
+    (tmp_path / ".env.model").write_text("# Autotuning failed; API defaults apply\n")
+    config = cached_config(tmp_path, key)
+    assert Trial(**config["selected"]) == best
+    write_env_file(config, tmp_path)
+    assert "BATCH_MAX_SIZE=4\n" in (tmp_path / ".env.model").read_text()
+
+    model.write_bytes(b"weights v2")
+    assert cached_config(tmp_path, tuning_key(model, "throughput", (1, 2, 4, 8))) is None
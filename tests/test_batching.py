@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from api.batching import MicroBatcher
+from tests.helpers import FakeSession, jpeg, upload
+
+
+def test_requests_queued_behind_a_running_batch_share_the_next_one():
+    release = threading.Event()
+    calls = []
+
+    def run_batch(stacked):
+        calls.append(len(stacked))
+        if len(calls) == 1:
+            release.wait(5)
+        return stacked * 10
+
+    async def scenario():
+        executor = ThreadPoolExecutor(max_workers=1)
+        batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=1000, executor=executor)
+        await batcher.start()
+        try:
+            first = asyncio.ensure_future(batcher.submit(np.full(2, 1.0)))
+            await asyncio.sleep(0.05)
+            rest = [asyncio.ensure_future(batcher.submit(np.full(2, float(i)))) for i in (2, 3, 4)]
+            await asyncio.sleep(0.05)
+            release.set()
+            results = await asyncio.gather(first, *rest)
+        finally:
+            await batcher.stop()
+            executor.shutdown()
+        assert calls == [1, 3]
+        assert [r.rows[0] for r in results] == [10.0, 20.0, 30.0, 40.0]
+        assert [r.batch_size for r in results] == [1, 3, 3, 3]
+
+    asyncio.run(scenario())
+
+
+def test_lone_request_on_an_idle_batcher_does_not_wait_for_companions():
+    async def scenario():
+        batcher = MicroBatcher(lambda stacked: stacked, max_batch_size=8, max_wait_ms=2000)
+        await batcher.start()
+        try:
+            started = time.perf_counter()
+            result = await batcher.submit(np.zeros(2))
+            elapsed = time.perf_counter() - started
+        finally:
+            await batcher.stop()
+        assert result.batch_size == 1 and elapsed < 0.5
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_uploads_are_coalesced_into_fewer_model_calls(serve):
+    session = FakeSession(delay=0.1)
+    with serve(session=session, RESULT_CACHE_ENABLED="0") as (client, _):
+        frames = [jpeg(hazard=(100 + 20 * i, 100, 200 + 20 * i, 200)) for i in range(6)]
+        responses = [None] * len(frames)
+
+        def send(i):
+            responses[i] = client.post(f"/detect/s{i}", files=upload(frames[i]))
+
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(len(frames))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert all(r.status_code == 200 and r.json()["detections_count"] == 1 for r in responses)
+    assert sum(session.batch_sizes) == len(frames) and len(session.batch_sizes) < len(frames)
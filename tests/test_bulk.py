@@ -0,0 +1,92 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from api.bulk import BulkRunner, JsonlWriter, discover
+
+
+class FakeEngine:
+    """Reports one detection per frame whose score is the frame's mean brightness; can fail on a given call."""
+
+    input_size = 32
+    model_version = "fake"
+
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.batch_sizes = []
+        self.fail_on_call = fail_on_call
+
+    def run(self, batch):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("worker killed")
+        self.batch_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+    def postprocess_batch(self, rows, params, sizes):
+        return [[{"label": "pothole", "score": round(float(row[0]), 2)}] for row in rows]
+
+
+def write_video(path, frames=30, fps=10):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 8, np.uint8))
+    writer.release()
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_video_frames_are_sampled_by_stride_with_timestamps(tmp_path):
+    write_video(tmp_path / "drive.avi")
+    (tmp_path / "stills").mkdir()
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / "stills" / f"{i}.png"), np.full((40, 80, 3), 200, np.uint8))
+    out = tmp_path / "out.jsonl"
+    engine = FakeEngine()
+
+    summary = BulkRunner(engine, JsonlWriter(out), tmp_path / "ckpt.json", stride=5, batch_size=4).run(
+        discover([tmp_path]))
+
+    records = read_jsonl(out)
+    video = [r for r in records if r["source"].endswith("drive.avi")]
+    assert [r["frame"] for r in video] == [0, 5, 10, 15, 20, 25]
+    assert [r["timestamp_ms"] for r in video] == [0.0, 500.0, 1000.0, 1500.0, 2000.0, 2500.0]
+    # Brightness rises with the frame index, so each record carries its own frame's result.
+    scores = [r["detections"][0]["score"] for r in video]
+    assert scores == sorted(scores) and scores[0] < scores[-1]
+    stills = [r for r in records if r["timestamp_ms"] is None]
+    assert [r["frame"] for r in stills] == [0] and (stills[0]["width"], stills[0]["height"]) == (80, 40)
+    assert summary["frames"] == 7 and max(engine.batch_sizes) <= 4
+
+
+def test_interrupted_run_resumes_without_losing_or_repeating_frames(tmp_path):
+    write_video(tmp_path / "a.avi")
+    write_video(tmp_path / "b.avi", frames=12)
+    sources = discover([tmp_path])
+
+    expected = tmp_path / "clean.jsonl"
+    BulkRunner(FakeEngine(), JsonlWriter(expected), tmp_path / "clean.ckpt", stride=2, batch_size=3).run(sources)
+
+    out, checkpoint = tmp_path / "out.jsonl", tmp_path / "out.ckpt"
+    crashing = BulkRunner(FakeEngine(fail_on_call=5), JsonlWriter(out), checkpoint, stride=2, batch_size=3,
+                          checkpoint_every=3)
+    with pytest.raises(RuntimeError):
+        crashing.run(sources)
+    partial = json.loads(checkpoint.read_text())
+    assert partial["sources"][str(tmp_path / "a.avi")]["next_frame"] == 23  # frames 0-22 committed
+
+    resumed = FakeEngine()
+    BulkRunner(resumed, JsonlWriter(out), checkpoint, stride=2, batch_size=3).run(sources)
+    assert read_jsonl(out) == read_jsonl(expected)
+    assert sum(resumed.batch_sizes) == 3 + 6  # only a.avi's last frames and all of b.avi
+
+    # A finished run resumes to nothing; a different stride refuses the checkpoint.
+    again = FakeEngine()
+    BulkRunner(again, JsonlWriter(out), checkpoint, stride=2).run(sources)
+    assert again.calls == 0 and read_jsonl(out) == read_jsonl(expected)
+    with pytest.raises(ValueError):
+        BulkRunner(FakeEngine(), JsonlWriter(out), checkpoint, stride=3).run(sources)
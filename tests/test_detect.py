@@ -0,0 +1,32 @@
+import numpy as np
+
+from tests.helpers import jpeg, upload
+
+
+def test_detect_returns_model_detections_in_original_pixels(serve):
+    with serve() as (client, session):
+        response = client.post("/detect/s1", files=upload(jpeg()))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["original_image_size"] == {"width": 640, "height": 480}
+    assert body["detections_count"] == 1
+    (found,) = body["detections"]
+    assert (found["label"], found["class_id"], found["score"]) == ("pothole", 1, 0.9)
+    # One model pixel is 4 original pixels at a 160 letterbox.
+    assert np.allclose(found["box"], [200, 150, 328, 246], atol=8)
+    assert set(body["timings"]) >= {"decode", "preprocess", "inference", "postprocess"}
+    assert session.batch_sizes == [1]
+
+
+def test_detect_rejects_empty_and_undecodable_uploads(serve):
+    with serve() as (client, session):
+        assert client.post("/detect/s1", files=upload(b"")).status_code == 400
+        assert client.post("/detect/s1", files=upload(b"not an image")).status_code == 400
+        assert session.batch_sizes == []
+
+
+def test_frame_without_hazards_has_no_detections(serve):
+    with serve() as (client, _):
+        body = client.post("/detect/s1", files=upload(jpeg(hazard=None))).json()
+    assert body["detections"] == [] and body["detections_count"] == 0
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import numpy as np
+
+from tests.helpers import FakeSession, jpeg, upload
+
+
+def uploads(*frames):
+    return [("files", (f"frame{i}.jpg", data, "image/jpeg")) for i, data in enumerate(frames)]
+
+
+def test_batch_runs_valid_images_in_one_model_call_and_reports_bad_ones(serve):
+    with serve() as (client, session):
+        response = client.post("/detect-batch", files=uploads(
+            jpeg(), b"not an image", jpeg(hazard=(40, 40, 120, 120)), jpeg(hazard=None)))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 4 and body["batch_size"] == 3
+    assert session.batch_sizes == [3]
+
+    first, broken, second, empty = body["results"]
+    assert broken == {"filename": "frame1.jpg", "error": "Invalid image data", "detections": []}
+    assert np.allclose(first["detections"][0]["box"], [200, 150, 328, 246], atol=8)
+    assert np.allclose(second["detections"][0]["box"], [40, 40, 120, 120], atol=8)
+    assert empty["detections"] == [] and empty["filename"] == "frame3.jpg"
+
+
+def test_batch_rejects_more_files_than_allowed(serve):
+    with serve(MAX_BATCH_FILES="2") as (client, session):
+        response = client.post("/detect-batch", files=uploads(jpeg(), jpeg(), jpeg()))
+    assert response.status_code == 413 and session.batch_sizes == []
+
+
+def test_batch_in_mock_mode_returns_canned_detections(serve):
+    with serve(MOCK_INFERENCE="1") as (client, session):
+        response = client.post("/detect-batch", files=uploads(jpeg(), b"not an image"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["model_version"] == "mock" and body["batch_size"] == 1
+    good, broken = body["results"]
+    assert good["detections_count"] == 2 and good["original_image_size"] == {"width": 640, "height": 480}
+    assert broken["error"] == "Invalid image data"
+    assert session.batch_sizes == []
+
+
+def test_large_batches_run_in_chunks_of_batch_max_size(serve):
+    frames = [jpeg(), b"not an image", jpeg(), jpeg(hazard=None), jpeg()]
+    with serve(BATCH_MAX_SIZE="2") as (client, session):
+        body = client.post("/detect-batch", files=uploads(*frames)).json()
+
+    assert session.batch_sizes == [1, 2, 1]
+    assert body["batch_size"] == 4 and [r.get("error") for r in body["results"]][1] == "Invalid image data"
+    assert [r["detections_count"] for i, r in enumerate(body["results"]) if i != 1] == [1, 1, 0, 1]
+
+
+def test_batch_takes_one_admission_slot_per_chunk(serve):
+    with serve(session=FakeSession(delay=0.3), BATCH_MAX_SIZE="1", MAX_PENDING_REQUESTS="3") as (client, _):
+        busy = []
+        live = threading.Thread(target=lambda: busy.append(client.post("/detect/s1", files=upload(jpeg()))))
+        live.start()
+        for _ in range(100):
+            if client.get("/stats").json()["workers"]["in_flight"]:
+                break
+            time.sleep(0.005)
+        rejected = client.post("/detect-batch", files=uploads(jpeg(), jpeg(), jpeg()))
+        live.join()
+        admitted = client.post("/detect-batch", files=uploads(jpeg(), jpeg(), jpeg()))
+
+    assert rejected.status_code == 503 and "Retry-After" in rejected.headers
+    assert busy[0].status_code == 200 and admitted.status_code == 200
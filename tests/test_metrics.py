@@ -0,0 +1,79 @@
+import threading
+import time
+
+from api.metrics import Registry
+from api.profiling import SlowRequestProfiler
+
+
+def test_prometheus_text_exposition():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("handler", "status"))
+    latency = registry.histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.01, 0.1))
+    registry.callback("queue_depth", "Queue.", lambda: 3)
+    registry.callback("cache_total", "Cache.", lambda: {("hit",): 2, ("miss",): 1}, kind="counter",
+                      labelnames=("result",))
+
+    requests.inc("detect", "200")
+    requests.inc("detect", "200")
+    requests.inc('we"ird', "500")
+    for value in (0.005, 0.01, 0.05, 2.0):
+        latency.observe(value, "decode")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{handler="detect",status="200"} 2' in lines
+    assert 'requests_total{handler="we\\"ird",status="500"} 1' in lines
+    # Buckets are cumulative and `le` is inclusive.
+    assert 'latency_seconds_bucket{stage="decode",le="0.01"} 2' in lines
+    assert 'latency_seconds_bucket{stage="decode",le="0.1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="decode",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{stage="decode"} 4' in lines
+    assert "queue_depth 3" in lines
+    assert 'cache_total{result="miss"} 1' in lines
+
+
+def test_slow_request_profile_is_written_as_collapsed_stacks(tmp_path):
+    profiler = SlowRequestProfiler(tmp_path, threshold_ms=50, interval_ms=1, cooldown_seconds=0)
+    profiler.start()
+    stop = threading.Event()
+
+    def busy_stage():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_stage, name="decode-worker")
+    start = time.perf_counter()
+    worker.start()
+    time.sleep(0.15)
+    stop.set()
+    worker.join()
+    end = time.perf_counter()
+    profiler.stop()
+
+    assert profiler.request_finished("detect", start, start + 0.01) is None  # fast request: no profile
+    path = profiler.request_finished("detect", start, end)
+    lines = path.read_text().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.startswith("decode-worker;") and "busy_stage (test_metrics.py:" in stack
+    assert int(count) > 10
+
+
+def test_slow_request_profile_is_written_off_the_calling_thread_while_sampling(tmp_path):
+    profiler = SlowRequestProfiler(tmp_path, threshold_ms=50, interval_ms=2)
+    profiler.start()
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < 0.1:
+            sum(range(1000))
+        end = time.perf_counter()
+        path = profiler.request_finished("detect", start, end)
+        assert profiler.request_finished("detect", start, end + 0.1) is None  # cooldown
+        for _ in range(100):
+            if path.exists():
+                break
+            time.sleep(0.01)
+    finally:
+        profiler.stop()
+
+    lines = path.read_text().splitlines()
+    assert any("(test_metrics.py:" in line for line in lines)
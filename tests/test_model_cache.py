@@ -0,0 +1,51 @@
+from api import model_cache
+
+PROVIDER = "CPUExecutionProvider"
+
+
+def test_miss_then_hit_after_commit(tmp_path):
+    model = tmp_path / "best0608.onnx"
+    model.write_bytes(b"model-v1")
+    cache_dir = tmp_path / "cache"
+
+    entry = model_cache.lookup(model, cache_dir, PROVIDER)
+    assert entry.status == "miss" and entry.load_path == model
+    entry.save_path.write_bytes(b"optimized")  # what ONNX Runtime does via optimized_model_filepath
+    model_cache.commit(entry, model)
+
+    hit = model_cache.lookup(model, cache_dir, PROVIDER)
+    assert hit.status == "hit" and hit.save_path is None
+    assert hit.load_path.read_bytes() == b"optimized"
+
+
+def test_key_changes_with_model_bytes_and_provider(tmp_path):
+    model = tmp_path / "best0608.onnx"
+    model.write_bytes(b"model-v1")
+    first = model_cache.cache_key(model, PROVIDER)
+    assert model_cache.cache_key(model, "OpenVINOExecutionProvider") != first
+    model.write_bytes(b"model-v2")
+    assert model_cache.cache_key(model, PROVIDER) != first
+
+
+def test_disabled_without_cache_dir(tmp_path):
+    model = tmp_path / "m.onnx"
+    model.write_bytes(b"x")
+    entry = model_cache.lookup(model, None, PROVIDER)
+    assert entry.status == "disabled" and entry.load_path == model
+
+
+def test_shared_weights_variant_is_cached_separately(tmp_path):
+    model = tmp_path / "best0608.onnx"
+    model.write_bytes(b"model-v1")
+    cache_dir = tmp_path / "cache"
+
+    entry = model_cache.lookup(model, cache_dir, PROVIDER, external_weights=True)
+    assert entry.status == "miss" and entry.weights_file.endswith(".weights")
+    entry.save_path.write_bytes(b"graph")
+    (cache_dir / entry.weights_file).write_bytes(b"weights")
+    model_cache.commit(entry, model)
+
+    hit = model_cache.lookup(model, cache_dir, PROVIDER, external_weights=True)
+    assert hit.status == "hit" and hit.load_path.name.endswith(".shared.onnx")
+    # Inline-weights workers don't pick up the shared graph, and vice versa.
+    assert model_cache.lookup(model, cache_dir, PROVIDER).status == "miss"
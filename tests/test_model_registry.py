@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import api.app
+from api.model_registry import ModelRegistry, ServedModel, detection_agreement
+from tests.helpers import FakeSession, jpeg, upload
+
+
+def fake_registry(tmp_path, loaded, unloaded):
+    async def load(path):
+        await asyncio.sleep(0)
+        loaded.append(path.name)
+        return ServedModel(path.name, SimpleNamespace(model_version=f"v-{path.stem}", input_size=640))
+
+    async def unload(model):
+        unloaded.append(model.name)
+
+    for name in ("a.onnx", "b.onnx"):
+        (tmp_path / name).write_bytes(b"onnx")
+    return ModelRegistry(load, unload, model_dir=tmp_path)
+
+
+def test_swap_keeps_pinned_requests_on_their_model_until_they_finish(tmp_path):
+    async def scenario():
+        loaded, unloaded, swapped = [], [], []
+        models = fake_registry(tmp_path, loaded, unloaded)
+        models.on_swap = lambda model: swapped.append(model.name)
+        await models.activate(models.resolve("a.onnx"))
+
+        with models.use() as request:
+            await models.activate(models.resolve("b.onnx"))
+            assert models.active.name == "b.onnx" and request.name == "a.onnx"
+            await asyncio.sleep(0.01)
+            assert unloaded == []  # still serving the pinned request
+        await asyncio.sleep(0.01)
+        assert unloaded == ["a.onnx"] and swapped == ["a.onnx", "b.onnx"]
+        assert models.stats()["active"]["version"] == "v-b"
+
+        await models.close()
+        assert unloaded == ["a.onnx", "b.onnx"]
+
+    asyncio.run(scenario())
+
+
+def test_shadowed_candidate_is_compared_then_promoted_without_reloading(tmp_path):
+    async def scenario():
+        loaded, unloaded = [], []
+        models = fake_registry(tmp_path, loaded, unloaded)
+        await models.activate(models.resolve("a.onnx"))
+        await models.set_candidate(models.resolve("b.onnx"), fraction=1.0)
+
+        active = [{"box": [0, 0, 10, 10], "label": "pothole"}, {"box": [50, 50, 60, 60], "label": "crack"}]
+        shifted = [{"box": [1, 1, 11, 11], "label": "pothole"}]
+
+        async def run(candidate):
+            assert candidate.name == "b.onnx"
+            return shifted, 12.0
+
+        for _ in range(3):
+            assert models.shadow_frame(run, active, 8.0)
+        await asyncio.sleep(0.01)
+        shadow = models.stats()["shadow"]
+        assert shadow["frames"] == 3 and shadow["agreement"] == pytest.approx(2 / 3, abs=1e-4)
+        assert shadow["inference_ms"]["candidate"]["p50"] == 12.0
+
+        await models.promote()
+        await asyncio.sleep(0.01)
+        assert models.active.name == "b.onnx" and models.candidate is None
+        assert loaded == ["a.onnx", "b.onnx"] and unloaded == ["a.onnx"]
+        assert not models.shadow_frame(run, active, 8.0)
+
+    asyncio.run(scenario())
+
+
+def test_failed_load_keeps_serving_and_only_model_files_resolve(tmp_path):
+    async def scenario():
+        models = fake_registry(tmp_path, [], [])
+        await models.activate(models.resolve("a.onnx"))
+        (tmp_path / "broken.onnx").write_bytes(b"")
+
+        async def broken(path):
+            raise RuntimeError("bad protobuf")
+
+        models._load = broken
+        with pytest.raises(RuntimeError):
+            await models.activate(models.resolve("broken.onnx"))
+        assert models.active.name == "a.onnx" and "bad protobuf" in models.last_error
+
+        for name in ("../a.onnx", "missing.onnx", "a.txt", ""):
+            with pytest.raises(ValueError):
+                models.resolve(name)
+
+    asyncio.run(scenario())
+
+
+def test_detection_agreement():
+    box = {"box": [0, 0, 10, 10], "label": "pothole"}
+    assert detection_agreement([], []) == 1.0
+    assert detection_agreement([box], []) == 0.0
+    assert detection_agreement([box], [{**box, "label": "crack"}]) == 0.0
+    assert detection_agreement([box, {"box": [20, 20, 30, 30], "label": "crack"}], [box]) == pytest.approx(2 / 3)
+
+
+def test_request_in_flight_keeps_its_models_input_size_across_a_swap(serve, monkeypatch, tmp_path):
+    entered, release = threading.Event(), threading.Event()
+    frame_signature = api.app.frame_signature
+
+    def slow_signature(data):
+        entered.set()
+        release.wait(5)
+        return frame_signature(data)
+
+    with serve(RESULT_CACHE_ENABLED="0") as (client, small):
+        monkeypatch.setattr("api.app.frame_signature", slow_signature)
+        large = FakeSession(input_size=320)
+        monkeypatch.setattr("api.inference.create_session", lambda *args, **kwargs: large)
+        (tmp_path / "large.onnx").write_bytes(b"another model")
+
+        responses = []
+        request = threading.Thread(
+            target=lambda: responses.append(client.post("/detect/s1", files=upload(jpeg()))))
+        request.start()
+        assert entered.wait(5)  # pinned to the 160-px model, not yet preprocessed
+        client.portal.call(api.app.app.state.models.activate, tmp_path / "large.onnx")
+        large.batch_sizes.clear()
+        release.set()
+        request.join()
+
+        assert responses[0].status_code == 200 and responses[0].json()["detections_count"] == 1
+        assert small.batch_sizes == [1] and large.batch_sizes == []
+        monkeypatch.setattr("api.app.frame_signature", frame_signature)
+        assert client.post("/detect/s2", files=upload(jpeg(hazard=(10, 10, 90, 90)))).status_code == 200
+        assert large.batch_sizes == [1]
@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+from api.motion import MotionGate, frame_signature
+from tests.helpers import upload
+
+
+def frame(hazard=(200, 150, 328, 246), background=60):
+    image = np.full((480, 640, 3), background, np.uint8)
+    x1, y1, x2, y2 = hazard
+    image[y1:y2, x1:x2] = 255
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+
+
+def test_gate_reuses_near_duplicates_but_not_changed_frames():
+    gate = MotionGate(threshold=2.0, max_reuse=2)
+    gate.update("s1", frame_signature(frame()), [{"label": "pothole"}], 640, 480)
+
+    # A global brightness change is not motion.
+    assert gate.lookup("s1", frame_signature(frame(background=66))) is not None
+    assert gate.lookup("s1", frame_signature(frame(hazard=(320, 150, 448, 246)))) is None
+    assert gate.lookup("s2", frame_signature(frame())) is None
+    assert gate.lookup("s1", frame_signature(frame())) is not None
+    assert gate.lookup("s1", frame_signature(frame())) is None  # max_reuse reached
+    assert gate.stats()["reused"] == 2
+
+
+def test_near_duplicate_frame_skips_the_model_and_changed_frame_does_not(serve):
+    with serve() as (client, session):
+        first = client.post("/detect/s1", files=upload(frame())).json()
+        repeat = client.post("/detect/s1", files=upload(frame(background=62))).json()
+        assert session.batch_sizes == [1]
+        moved = client.post("/detect/s1", files=upload(frame(hazard=(320, 150, 448, 246)))).json()
+        assert session.batch_sizes == [1, 1]
+        summary = client.get("/session/s1/summary").json()
+
+    assert repeat["reused"] and not moved["reused"]
+    assert repeat["detections"] == first["detections"]
+    assert moved["detections"][0]["box"][0] > first["detections"][0]["box"][0] + 100
+    # The repeated frame is a tracker hit, so the static pothole is reported, but not counted twice.
+    assert summary["stats"]["total_detections"] == 2 and summary["stats"]["reused_frames"] == 1
+    assert [report["sightings"] for report in summary["reports"]] == [2]
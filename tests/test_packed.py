@@ -0,0 +1,67 @@
+from api.packed import HEADER, MEDIA_TYPE, accepts_packed, pack_response, unpack_response
+from tests.helpers import jpeg, upload
+
+
+def make_response(detections, new_reports=None):
+    return {
+        "detections": detections,
+        "original_image_size": {"width": 1920, "height": 1080},
+        "processing_time": 23.5,
+        "reused": False,
+        "has_new_reports": bool(new_reports),
+        "new_reports": new_reports or [],
+    }
+
+
+def test_round_trip_keeps_boxes_classes_and_scores():
+    detections = [
+        {"box": [10.5, 20.0, 110.0, 220.5], "label": "pothole", "score": 0.9123, "class_id": 1},
+        {"box": [0.0, 0.0, 1919.0, 1079.0], "label": "crack", "score": 0.31, "class_id": 0},
+    ]
+    payload = pack_response(make_response(detections), frame_id=42)
+    assert len(payload) == HEADER.size + 20 * len(detections)
+
+    decoded = unpack_response(payload)
+    assert decoded["frame_id"] == 42
+    assert decoded["original_image_size"] == {"width": 1920, "height": 1080}
+    assert [d["box"] for d in decoded["detections"]] == [d["box"] for d in detections]
+    assert [d["class_id"] for d in decoded["detections"]] == [1, 0]
+    for got, want in zip(decoded["detections"], detections):
+        assert abs(got["score"] - want["score"]) < 1e-3  # float16
+
+
+def test_new_reports_travel_in_the_extra_section():
+    reports = [{"report_id": "r1", "hazard_type": "pothole"}]
+    decoded = unpack_response(pack_response(make_response([], new_reports=reports)))
+    assert decoded["detections"] == []
+    assert decoded["has_new_reports"] is True
+    assert decoded["new_reports"] == reports
+
+
+def test_qos_hint_and_model_version_travel_in_the_extra_section():
+    qos = {"level": "minimal", "next_frame_ms": 400, "max_dimension": 480, "jpeg_quality": 60}
+    response = {**make_response([]), "qos": qos, "model_version": "3f2a9c1e0b7d"}
+    decoded = unpack_response(pack_response(response))
+    assert decoded["qos"] == qos and decoded["model_version"] == "3f2a9c1e0b7d"
+    assert decoded["has_new_reports"] is False and decoded["new_reports"] == []
+
+    plain = unpack_response(pack_response(make_response([])))
+    assert "qos" not in plain and "model_version" not in plain
+
+
+def test_packed_session_response_matches_json_response(serve):
+    with serve() as (client, _):
+        data = jpeg()
+        as_json = client.post("/detect/s1", files=upload(data)).json()
+        packed = client.post("/detect/s2", files=upload(data), headers={"Accept": MEDIA_TYPE})
+    decoded = unpack_response(packed.content)
+    assert decoded["model_version"] == as_json["model_version"]
+    assert decoded["qos"].keys() == as_json["qos"].keys()
+
+
+def test_accept_negotiation_requires_explicit_media_type():
+    assert accepts_packed("application/x-hazard-detections")
+    assert accepts_packed("application/json;q=0.5, application/x-hazard-detections")
+    assert not accepts_packed("application/x-hazard-detections;q=0")
+    assert not accepts_packed("*/*")
+    assert not accepts_packed(None)
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from api.postprocess import postprocess_batch
+from api.preprocess import compute_letterbox_params
+
+FIXTURES = Path(__file__).resolve().parents[1] / "public" / "tests" / "fixtures"
+
+
+def raw_output(images, num_classes=2, anchors=64, objectness=False):
+    """A YOLOv8 (B, 4 + nc, N) output, or YOLOv5 (B, N, 5 + nc), holding (xyxy box, score, class) per image."""
+    rows = np.zeros((len(images), anchors, 4 + num_classes), dtype=np.float32)
+    for b, detections in enumerate(images):
+        for n, (x1, y1, x2, y2, score, class_id) in enumerate(detections):
+            rows[b, n, :4] = ((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1)
+            rows[b, n, 4 + int(class_id)] = score
+    if objectness:
+        return np.concatenate([rows[..., :4], np.ones_like(rows[..., :1]), rows[..., 4:]], axis=-1)
+    return rows.transpose(0, 2, 1)
+
+
+def test_matches_browser_letterbox_and_box_mapping():
+    cases = json.loads((FIXTURES / "postprocess_golden.json").read_text())["cases"]
+    for target in sorted({case["target"] for case in cases}):
+        batch = [case for case in cases if case["target"] == target]
+        params = []
+        for case in batch:
+            p = compute_letterbox_params(case["width"], case["height"], target)
+            expected = case["params"]
+            assert (p.new_width, p.new_height, p.offset_x, p.offset_y) == (
+                expected["newW"], expected["newH"], expected["offsetX"], expected["offsetY"]), case
+            params.append(p)
+
+        # Descending scores so each image's detections come back in fixture order.
+        output = raw_output([[(*box, 0.9 - 0.1 * i, 0) for i, box in enumerate(case["model_boxes"])]
+                             for case in batch])
+        results = postprocess_batch(output, params, [(c["width"], c["height"]) for c in batch], 2,
+                                    confidence_threshold=0.25, iou_threshold=0.99)
+        for case, found in zip(batch, results):
+            np.testing.assert_allclose(found.boxes, case["image_boxes"], atol=0.05, err_msg=str(case))
+
+
+def test_round_trips_api_fixture_detections():
+    # success_yolo_array.json holds [x1, y1, x2, y2, score, class_id] rows for a 640x480 frame.
+    expected = json.loads((FIXTURES / "success_yolo_array.json").read_text())["results"]
+    params = compute_letterbox_params(640, 480, 640)
+    model_space = [(x1, y1 + params.offset_y, x2, y2 + params.offset_y, s, c) for x1, y1, x2, y2, s, c in expected]
+
+    for objectness in (False, True):
+        (found,) = postprocess_batch(raw_output([model_space], objectness=objectness), [params], [(640, 480)], 2)
+        got = np.column_stack([found.boxes, found.scores, found.class_ids])
+        np.testing.assert_allclose(got, expected, atol=1e-5)
+
+
+def test_nms_is_per_image_and_per_class():
+    box = (100, 100, 200, 200)
+    shifted = (105, 105, 205, 205)
+    image = [(*box, 0.9, 0), (*shifted, 0.8, 0), (*shifted, 0.7, 1), (300, 300, 310, 310, 0.1, 0)]
+    params = compute_letterbox_params(640, 640, 640)
+    first, second, empty = postprocess_batch(raw_output([image, image, []]), [params] * 3, [(640, 640)] * 3, 2)
+
+    for found in (first, second):
+        # The overlapping class-0 box is suppressed, the class-1 one is not; 0.1 is under the threshold.
+        assert found.class_ids.tolist() == [0, 1]
+        np.testing.assert_allclose(found.scores, [0.9, 0.7])
+        np.testing.assert_allclose(found.boxes, [box, shifted])
+    assert len(empty.boxes) == 0
+
+    crowded = [(10 * i, 0, 10 * i + 8, 8, 0.5 + i / 100, 0) for i in range(20)]
+    (found,) = postprocess_batch(raw_output([crowded]), [params], [(640, 640)], 2, max_detections=5)
+    np.testing.assert_allclose(found.scores, [0.69, 0.68, 0.67, 0.66, 0.65], rtol=1e-5)
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+from api.preprocess import (
+    TensorPool, decode_image, jpeg_dimensions, letterbox, prepare_image, reduction_factor,
+)
+from tests.helpers import jpeg, upload
+
+
+def test_jpeg_dimensions_are_read_from_the_header():
+    assert jpeg_dimensions(jpeg(1280, 960)) == (1280, 960)
+    png = cv2.imencode(".png", np.zeros((10, 20, 3), np.uint8))[1].tobytes()
+    assert jpeg_dimensions(png) is None and jpeg_dimensions(b"\xff\xd8") is None
+
+
+def test_reduction_factor_keeps_at_least_the_letterboxed_size():
+    assert reduction_factor(1280, 960, 160) == 8
+    assert reduction_factor(1280, 960, 640) == 2
+    assert reduction_factor(640, 480, 640) == 1
+
+
+def test_reduced_decode_matches_a_full_decode_in_original_coordinates():
+    data = jpeg(1280, 960, hazard=(400, 300, 656, 492))
+    prepared = prepare_image(data, 160)
+    assert prepared.decode_factor == 8
+    assert (prepared.width, prepared.height) == (1280, 960)
+
+    full, params = letterbox(decode_image(data), 160)
+    assert prepared.params == params
+    assert np.abs(prepared.tensor - full).mean() < 0.02
+
+
+def test_boxes_from_a_reduced_decode_map_back_to_the_upload(serve):
+    with serve() as (client, _):
+        body = client.post("/detect/s1", files=upload(jpeg(1280, 960, hazard=(400, 300, 656, 492)))).json()
+    assert body["original_image_size"] == {"width": 1280, "height": 960}
+    (found,) = body["detections"]
+    # One model pixel is 8 original pixels at a 160 letterbox.
+    assert np.allclose(found["box"], [400, 300, 656, 492], atol=16)
+
+
+def test_tensor_pool_reuses_released_tensors_up_to_capacity():
+    pool = TensorPool(160, capacity=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert first.shape == (3, 160, 160) and pool.allocated == 2
+    pool.release(first)
+    pool.release(second)  # beyond capacity: dropped
+    assert pool.acquire() is first
+    assert pool.acquire() is not second and pool.allocated == 3
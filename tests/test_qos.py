@@ -0,0 +1,54 @@
+from api.qos import LEVELS, QosController
+
+
+def simulate(controller, sessions, frames, service_ms):
+    """Each frame of each session costs `service_ms(load)` of server latency; returns the last hints."""
+    hints = {}
+    for _ in range(frames):
+        for session_id in sessions:
+            hints[session_id] = controller.advise(session_id, service_ms(controller.load()))
+    return hints
+
+
+def test_sessions_back_off_together_under_load_and_recover():
+    load = {"value": 0.9}
+    controller = QosController(load=lambda: load["value"], target_latency_ms=300, recover_frames=5, hold_frames=2)
+    sessions = [f"s{i}" for i in range(20)]
+
+    hints = simulate(controller, sessions, 12, lambda _: 120)
+    assert {h["level"] for h in hints.values()} == {"minimal"}
+    assert all(h["next_frame_ms"] >= LEVELS[-1].frame_interval_ms for h in hints.values())
+    assert controller.stats()["sessions_by_level"]["minimal"] == 20
+
+    # Load drops: one step up per `recover_frames` calm frames, never a jump back to full.
+    load["value"] = 0.1
+    first = simulate(controller, sessions, 5, lambda _: 80)
+    assert {h["level"] for h in first.values()} == {"low"}
+    hints = simulate(controller, sessions, 20, lambda _: 80)
+    assert {h["level"] for h in hints.values()} == {"full"}
+    assert hints["s0"] == {"level": "full", "next_frame_ms": 100, "max_dimension": 1280, "jpeg_quality": 85}
+
+
+def test_slow_session_degrades_alone_and_interval_tracks_latency():
+    controller = QosController(load=lambda: 0.2, target_latency_ms=300, hold_frames=2)
+    for _ in range(10):
+        fast = controller.advise("fast", 60)
+        slow = controller.advise("slow", 900)
+    assert fast["level"] == "full"
+    assert slow["level"] == "minimal"
+    # The hint never asks for frames faster than the session is served.
+    assert slow["next_frame_ms"] >= 800
+
+
+def test_hold_frames_limit_step_rate_and_band_between_thresholds_is_stable():
+    load = {"value": 0.9}
+    controller = QosController(load=lambda: load["value"], hold_frames=3, recover_frames=3)
+    levels = [controller.advise("s", 100)["level"] for _ in range(7)]
+    assert levels == ["reduced", "reduced", "reduced", "low", "low", "low", "minimal"]
+
+    # Between the low and high load marks nothing moves in either direction.
+    load["value"] = 0.6
+    assert {controller.advise("s", 100)["level"] for _ in range(20)} == {"minimal"}
+
+    controller.forget("s")
+    assert controller.advise("s", 100)["level"] == "full"  # a forgotten session starts over
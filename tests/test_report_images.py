@@ -0,0 +1,143 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from api.report_images import FrameStore, ReportImages, render
+from api.sessions import SessionManager
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def inline(fn, *args):
+    return fn(*args)
+
+
+def jpeg(width=640, height=480):
+    image = np.full((height, width, 3), 90, dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def decode(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_frames_are_written_in_background_and_released_with_last_report(tmp_path):
+    async def scenario():
+        images = ReportImages(FrameStore(tmp_path))
+        await images.start()
+        frame = jpeg()
+        key = images.keep_frame(frame, references=2)
+        assert await images.frame(key) == frame  # readable before the write lands
+        await images.flush()
+        assert images.store.get(key) == frame
+        assert await images.frame(key) == frame
+
+        images.release([key])
+        await images.flush()
+        assert images.store.get(key) == frame  # one report still points at it
+        images.release([key])
+        await images.flush()
+        assert images.store.get(key) is None
+        assert await images.frame(key) is None
+        await images.stop()
+
+    run(scenario())
+
+
+def test_full_queue_drops_frames_instead_of_buffering(tmp_path):
+    async def scenario():
+        images = ReportImages(FrameStore(tmp_path), max_pending=2)
+        await images.start()
+        keys = [images.keep_frame(jpeg()) for _ in range(3)]  # the writer hasn't run yet
+        assert keys[2] is None and None not in keys[:2]
+        assert images.stats()["dropped"] == 1
+        await images.stop()
+        assert images.stats()["written"] == 2
+
+    run(scenario())
+
+
+def test_views_render_once_and_thumbnail_is_small(tmp_path):
+    async def scenario():
+        images = ReportImages(FrameStore(tmp_path), thumbnail_size=160)
+        await images.start()
+        frame = jpeg(1280, 960)
+        key = images.keep_frame(frame)
+        box = [100.0, 100.0, 400.0, 300.0]
+
+        assert await images.view("image", key, box, "pothole 90%", inline) == frame
+        plot = await images.view("plot", key, box, "pothole 90%", inline)
+        assert decode(plot).shape == (960, 1280, 3)
+        assert decode(plot)[200, 100, 2] > 200  # the box edge is drawn in red
+        thumbnail = await images.view("thumbnail", key, box, "pothole 90%", inline)
+        assert max(decode(thumbnail).shape[:2]) <= 160
+
+        assert await images.view("plot", key, box, "pothole 90%", inline) == plot
+        assert images.stats()["rendered"] == 3 and images.stats()["render_cache_hits"] == 1
+
+        images.release([key])
+        assert images.stats()["render_cache_bytes"] == 0
+        await images.stop()
+
+    run(scenario())
+
+
+def test_render_rejects_undecodable_frames():
+    assert render("plot", b"not an image", [0, 0, 1, 1], "x") is None
+
+
+def test_evicted_sessions_release_their_frames():
+    released = []
+    manager = SessionManager(ttl_seconds=0, max_sessions=1, on_evict=lambda s: released.extend(s.frame_keys()))
+    first = manager.start()
+    first.record_frame([{"box": [0, 0, 10, 10], "label": "pothole", "score": 0.9}])
+    (report,) = first.record_frame([{"box": [0, 0, 10, 10], "label": "pothole", "score": 0.9}])
+    report.frame_key = "abc"
+    manager.start()
+    assert released == ["abc"]
+    assert manager.evicted == 1
+
+
+def test_saved_views_outlive_the_session_and_the_process(tmp_path):
+    report_id = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    box = [100.0, 100.0, 400.0, 300.0]
+
+    async def scenario():
+        images = ReportImages(FrameStore(tmp_path))
+        await images.start()
+        frame = jpeg()
+        key = images.keep_frame(frame, references=2)
+        image_key = images.save_view(key, report_id, box, "pothole 90%")
+        assert image_key == f"{key}/{report_id}"
+        assert await images.saved_view("image", image_key, inline) == frame  # before the writes land
+
+        images.release([key, key])  # the session is evicted
+        await images.flush()
+        assert images.store.get(key) == frame
+        assert images.stats()["saved"] == 0
+        await images.stop()
+
+        restarted = ReportImages(FrameStore(tmp_path))
+        await restarted.start()
+        plot = await restarted.saved_view("plot", image_key, inline)
+        assert decode(plot)[200, 100, 2] > 200
+        assert await restarted.saved_view("plot", f"{key}/{report_id[:-1]}0", inline) is None
+        assert await restarted.saved_view("plot", f"../{report_id}", inline) is None
+        await restarted.stop()
+
+    run(scenario())
+
+
+def test_released_frames_cannot_be_saved(tmp_path):
+    async def scenario():
+        images = ReportImages(FrameStore(tmp_path))
+        await images.start()
+        key = images.keep_frame(jpeg())
+        images.release([key])
+        assert images.save_view(key, "0f8fad5b-d9cb-469f-a165-70867728950e", [0, 0, 1, 1], "x") is None
+        await images.stop()
+
+    run(scenario())
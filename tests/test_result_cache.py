@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+from api.result_cache import ResultCache, engine_fingerprint
+from tests.helpers import jpeg, upload
+
+DETECTIONS = [{"box": [1.0, 2.0, 3.0, 4.0], "label": "pothole", "score": 0.9, "class_id": 1}]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeRedis:
+    """The two redis.asyncio calls the cache makes, backed by a dict shared between caches."""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value.encode()
+
+
+def test_lru_eviction_ttl_and_hit_rate():
+    async def scenario():
+        cache = ResultCache(max_entries=2, ttl_seconds=60)
+        keys = [cache.key(bytes([i]) * 100, "v1") for i in range(3)]
+        for key in keys:
+            await cache.put(key, DETECTIONS, 640, 480)
+        assert await cache.get(keys[0]) is None  # evicted as least recently used
+        hit = await cache.get(keys[2])
+        assert (hit.detections, hit.width, hit.height) == (DETECTIONS, 640, 480)
+
+        cache.ttl = 0
+        cache._entries[keys[2]].stored_at -= 1
+        assert await cache.get(keys[2]) is None
+        return cache.stats()
+
+    stats = run(scenario())
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["hit_rate"] == 0.3333
+
+
+def test_key_depends_on_bytes_and_engine_configuration():
+    engine = SimpleNamespace(model_version="abc123", input_size=640, confidence_threshold=0.25,
+                             iou_threshold=0.45, max_detections=100)
+    fingerprint = engine_fingerprint(engine)
+    key = ResultCache.key(b"jpeg", fingerprint)
+    assert ResultCache.key(b"jpeg", fingerprint) == key
+    assert ResultCache.key(b"jpeg!", fingerprint) != key
+    engine.confidence_threshold = 0.5
+    assert ResultCache.key(b"jpeg", engine_fingerprint(engine)) != key
+    engine.model_version = "def456"
+    assert ResultCache.key(b"jpeg", engine_fingerprint(engine)) != key
+
+
+def test_redis_shares_results_between_workers_and_failures_degrade_to_memory():
+    async def scenario():
+        redis = FakeRedis()
+        first, second = ResultCache(redis_client=redis), ResultCache(redis_client=redis)
+        key = first.key(b"jpeg", "v1")
+        await first.put(key, DETECTIONS, 1920, 1080)
+        shared = await second.get(key)
+        assert shared.detections == DETECTIONS and second.redis_hits == 1
+        assert await second.get(key) is not None and second.redis_hits == 1  # now served from memory
+
+        down = ResultCache(redis_client=FakeRedis(fail=True))
+        await down.put(key, DETECTIONS, 1920, 1080)
+        assert await down.get(key) is not None
+        assert await down.get(down.key(b"other", "v1")) is None
+        return down.stats()
+
+    stats = run(scenario())
+    assert stats["redis_errors"] == 2 and stats["backend"] == "memory+redis"
+
+
+def test_cache_hits_from_other_sessions_and_retries_are_recorded(serve):
+    data = jpeg()
+    with serve() as (client, session):
+        responses = [client.post(f"/detect/{sid}", files=upload(data)).json() for sid in ("s1", "s2", "s1", "s2")]
+        summaries = [client.get(f"/session/{sid}/summary").json() for sid in ("s1", "s2")]
+
+    assert session.batch_sizes == [1]
+    assert [r["reused"] for r in responses] == [False, True, True, True]
+    for summary in summaries:
+        assert summary["stats"]["total_detections"] == 2 and summary["stats"]["reused_frames"] == 0
+        assert [report["sightings"] for report in summary["reports"]] == [2]
@@ -0,0 +1,46 @@
+from api.serve import cpu_partitions, shared_environment, worker_environment
+from tests.helpers import jpeg, upload
+
+
+def test_cpu_partitions_split_contiguously():
+    assert cpu_partitions(range(8), 3) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert cpu_partitions([2, 3, 6, 7], 2) == [[2, 3], [6, 7]]
+    assert cpu_partitions(range(4), 1) == [[0, 1, 2, 3]]
+    # More workers than CPUs: every worker still gets one CPU.
+    assert cpu_partitions([0, 1], 3) == [[0], [1], [0]]
+
+
+def test_worker_threads_follow_partition_unless_configured():
+    env = worker_environment([4, 5], env={})
+    assert env == {"SHARE_MODEL_WEIGHTS": "1", "ORT_INTRA_OP_THREADS": "2", "WORKER_POOL_SIZE": "2"}
+    env = worker_environment([4, 5], env={"ORT_INTRA_OP_THREADS": "1"})
+    assert "ORT_INTRA_OP_THREADS" not in env and env["WORKER_POOL_SIZE"] == "2"
+    assert worker_environment(None, env={}) == {"SHARE_MODEL_WEIGHTS": "1"}
+
+
+def test_autotuned_threads_are_capped_at_the_worker_slice():
+    env = worker_environment([0, 1], env={"AUTOTUNE_INTRA_OP_THREADS": "8"})
+    assert env["ORT_INTRA_OP_THREADS"] == "2"
+    env = worker_environment([0, 1, 2, 3], env={"AUTOTUNE_INTRA_OP_THREADS": "3"})
+    assert env["ORT_INTRA_OP_THREADS"] == "3"
+    env = worker_environment([0, 1], env={"AUTOTUNE_INTRA_OP_THREADS": "8", "ORT_INTRA_OP_THREADS": "4"})
+    assert "ORT_INTRA_OP_THREADS" not in env
+
+
+def test_workers_share_a_model_selection_file_unless_one_is_configured():
+    assert shared_environment(1, "/run/x", env={}) == {"SERVE_WORKERS": "1"}
+    assert shared_environment(4, "/run/x", env={}) == {"SERVE_WORKERS": "4",
+                                                       "MODEL_SELECTION_FILE": "/run/x/model-selection.json"}
+    assert "MODEL_SELECTION_FILE" not in shared_environment(4, "/run/x", env={"MODEL_SELECTION_FILE": "/data/s.json"})
+
+
+def test_session_endpoints_are_refused_behind_several_workers(serve):
+    with serve(SERVE_WORKERS="2") as (client, session):
+        assert client.post("/session/start").status_code == 501
+        assert client.post("/detect/s1", files=upload(jpeg())).status_code == 501
+        assert client.get("/session/s1/summary").status_code == 501
+        assert client.post("/session/s1/end").status_code == 501
+        assert client.post("/session/s1/report/r1/confirm").status_code == 501
+        batch = client.post("/detect-batch", files=[("files", ("a.jpg", jpeg(), "image/jpeg"))])
+    assert batch.status_code == 200 and batch.json()["results"][0]["detections"]
+    assert session.batch_sizes == [1]
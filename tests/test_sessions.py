@@ -0,0 +1,88 @@
+import time
+
+from api.sessions import REPORT_CONFIRMED, HazardTracker, SessionManager
+
+
+def det(box, label="pothole", score=0.9):
+    return {"box": box, "label": label, "score": score}
+
+
+def test_same_hazard_across_frames_becomes_one_report():
+    manager = SessionManager(tracker_min_hits=2)
+    session = manager.start()
+
+    assert session.record_frame([det([100, 100, 200, 200])]) == []
+    reports = session.record_frame([det([105, 102, 205, 204])])
+    assert len(reports) == 1
+    for shift in range(3):
+        assert session.record_frame([det([110 + shift, 104, 210 + shift, 206])]) == []
+
+    assert len(session.reports) == 1
+    assert reports[0].sightings == 5
+    stats = session.stats()
+    assert stats["unique_hazards"] == 1
+    assert stats["total_detections"] == 5
+    assert stats["pending_reports"] == 1
+
+
+def test_tracker_keeps_labels_and_distant_boxes_apart():
+    tracker = HazardTracker(min_hits=1)
+    first = tracker.update([det([0, 0, 50, 50]), det([300, 300, 350, 350])])
+    assert len(first) == 2
+    second = tracker.update([det([0, 0, 50, 50], label="crack")])
+    assert len(second) == 1
+    assert second[0].label == "crack"
+
+
+def test_single_frame_flicker_is_not_reported():
+    session = SessionManager(tracker_min_hits=2).start()
+    session.record_frame([det([0, 0, 40, 40])])
+    session.record_frame([])
+    assert session.stats()["unique_hazards"] == 0
+
+
+def test_reused_frames_do_not_inflate_totals():
+    session = SessionManager().start()
+    session.record_frame([det([0, 0, 40, 40])])
+    session.record_frame([det([0, 0, 40, 40])], reused=True)
+    stats = session.stats()
+    assert stats["total_frames"] == 2
+    assert stats["reused_frames"] == 1
+    assert stats["total_detections"] == 1
+
+
+def test_gated_frames_still_count_as_tracker_hits():
+    session = SessionManager(tracker_min_hits=2).start()
+    assert session.record_frame([det([0, 0, 40, 40])]) == []
+    reports = session.record_frame([det([0, 0, 40, 40])], reused=True)
+    assert len(reports) == 1 and reports[0].sightings == 2
+    assert session.stats()["total_detections"] == 1
+
+
+def test_report_status_counters_move_incrementally():
+    session = SessionManager(tracker_min_hits=1).start()
+    report = session.record_frame([det([0, 0, 40, 40])])[0]
+    session.set_report_status(report.report_id, REPORT_CONFIRMED)
+    session.set_report_status(report.report_id, REPORT_CONFIRMED)
+    stats = session.stats()
+    assert stats["pending_reports"] == 0
+    assert stats["confirmed_reports"] == 1
+    assert session.set_report_status("missing", REPORT_CONFIRMED) is None
+
+
+def test_idle_sessions_are_evicted_after_ttl():
+    manager = SessionManager(ttl_seconds=60)
+    idle = manager.start()
+    busy = manager.start()
+    idle.last_activity = time.monotonic() - 120
+
+    assert manager.evict_expired() == [idle.session_id]
+    assert manager.get(idle.session_id) is None
+    assert manager.get(busy.session_id) is busy
+
+
+def test_ended_session_stays_readable():
+    manager = SessionManager()
+    session = manager.start("abc")
+    manager.end("abc")
+    assert manager.get("abc").summary()["active"] is False
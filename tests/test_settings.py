@@ -0,0 +1,23 @@
+from api.settings import resolve_model_path, variant_path
+
+
+def test_variant_is_served_when_present(tmp_path):
+    base = tmp_path / "best0608.onnx"
+    base.write_bytes(b"fp32")
+    variant_path(base, "int8-static").write_bytes(b"int8")
+
+    assert resolve_model_path(None, str(tmp_path)) == base
+    assert resolve_model_path(None, str(tmp_path), "int8-static") == tmp_path / "best0608.int8-static.onnx"
+    assert resolve_model_path(str(base), None, "fp32") == base
+
+
+def test_missing_variant_falls_back_to_base(tmp_path):
+    base = tmp_path / "best0608.onnx"
+    base.write_bytes(b"fp32")
+    assert resolve_model_path(str(base), None, "int8-dynamic") == base
+
+
+def test_variants_are_never_picked_as_the_base_model(tmp_path):
+    (tmp_path / "custom.int8-static.onnx").write_bytes(b"int8")
+    (tmp_path / "custom.onnx").write_bytes(b"fp32")
+    assert resolve_model_path(None, str(tmp_path)) == tmp_path / "custom.onnx"
@@ -0,0 +1,68 @@
+import asyncio
+
+from api.streaming import FrameStream, StreamStats, compact_result
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_latest_frame_wins_when_pipeline_is_full():
+    async def scenario():
+        release = asyncio.Event()
+        processed = []
+
+        async def process(frame):
+            await release.wait()
+            processed.append(frame.frame_id)
+
+        stream = FrameStream(process, max_in_flight=2)
+        displaced = [stream.push(b"frame") for _ in range(5)]
+        assert stream.in_flight == 2
+        # Frames 1-2 run, 3 and 4 were each replaced by a newer frame, 5 waits.
+        assert [f.frame_id if f else None for f in displaced] == [None, None, None, 3, 4]
+        assert stream.dropped == 2
+
+        release.set()
+        while stream.in_flight:
+            await asyncio.sleep(0)
+        return processed, stream
+
+    processed, stream = run(scenario())
+    assert sorted(processed) == [1, 2, 5]
+    assert stream.processed == 3
+
+
+def test_close_cancels_in_flight_frames():
+    async def scenario():
+        async def process(frame):
+            await asyncio.sleep(10)
+
+        stream = FrameStream(process, max_in_flight=1)
+        stats = StreamStats()
+        stats.open(stream)
+        stream.push(b"a")
+        stream.push(b"b")
+        await asyncio.sleep(0)
+        await stream.close()
+        stats.close(stream)
+        return stream, stats.stats()
+
+    stream, stats = run(scenario())
+    assert stream.in_flight == 0
+    assert stats["active"] == 0 and stats["frames"] == 2
+
+
+def test_compact_result_packs_detections_as_tuples():
+    response = {
+        "detections": [{"box": [1.0, 2.0, 3.0, 4.0], "label": "pothole", "score": 0.9, "class_id": 1}],
+        "original_image_size": {"width": 640, "height": 480},
+        "processing_time": 12.5,
+        "reused": False,
+        "has_new_reports": False,
+    }
+    message = compact_result(7, response)
+    assert message["frame_id"] == 7
+    assert message["detections"] == [[1.0, 2.0, 3.0, 4.0, 0.9, 1]]
+    assert message["size"] == [640, 480]
+    assert "new_reports" not in message
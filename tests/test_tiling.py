@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+from api.preprocess import image_dimensions
+from api.tiling import TilingPolicy, merge_boxes, prepare_tiles
+
+
+def test_auto_policy_tiles_only_large_frames():
+    policy = TilingPolicy(mode="auto", tile_scale=2.0, overlap=0.2, min_downscale=3.0)
+    assert policy.windows(1920, 1080, 640) is None
+    windows = policy.windows(3840, 2160, 640)
+    assert len(windows) == 8  # 4 x 2 tiles of 1280 px
+    assert {w[0] for w in windows} == {0, 853, 1707, 2560} and {w[1] for w in windows} == {0, 880}
+    assert max(w[2] for w in windows) == 3840 and max(w[3] for w in windows) == 2160
+    # Neighbouring tiles overlap by at least 20% of the tile side.
+    assert all(1280 - (b - a) >= 256 for a, b in [(0, 853), (853, 1707), (1707, 2560)])
+
+    assert TilingPolicy(mode="always").windows(1920, 1080, 640) is not None
+    assert policy.with_mode("off").windows(3840, 2160, 640) is None
+
+
+def test_merge_joins_tile_cut_boxes_per_class():
+    boxes = np.array([
+        [100, 100, 300, 200],  # whole object, seen in the full-frame pass
+        [100, 100, 180, 200],  # the same object cut off at a tile edge
+        [110, 105, 290, 205],  # another tile's view of it
+        [100, 100, 300, 200],  # same place, other class
+    ], dtype=np.float32)
+    scores = np.array([0.9, 0.6, 0.8, 0.7], dtype=np.float32)
+    class_ids = np.array([0, 0, 0, 1])
+
+    merged, merged_scores, merged_classes = merge_boxes(boxes, scores, class_ids, 0.5, "wbf")
+    assert merged_classes.tolist() == [0, 1] and merged_scores.tolist() == [scores[0], scores[3]]
+    weights = scores[:3, None]
+    np.testing.assert_allclose(merged[0], (boxes[:3] * weights).sum(axis=0) / weights.sum(), rtol=1e-5)
+
+    kept, _, _ = merge_boxes(boxes, scores, class_ids, 0.5, "nms")
+    np.testing.assert_array_equal(kept, boxes[[0, 3]])
+
+
+def test_prepare_tiles_batches_frame_and_tiles():
+    image = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    image[:, 1920:] = 255
+    ok, jpeg = cv2.imencode(".jpg", image)
+    assert ok
+    policy = TilingPolicy(mode="auto")
+    assert policy.should_tile(jpeg.tobytes(), 640)
+
+    tiles = prepare_tiles(jpeg.tobytes(), 640, policy)
+    assert (tiles.width, tiles.height) == (3840, 2160)
+    assert tiles.windows[0] == (0, 0, 3840, 2160) and len(tiles.windows) == 9
+    assert tiles.tensors.shape == (9, 3, 640, 640)
+    # The first tile is all black, the last all white; the whole frame is letterboxed at 1/6 scale.
+    assert tiles.tensors[1, :, 320, 320].max() < 0.05 and tiles.tensors[8, :, 320, 320].min() > 0.95
+    assert abs(tiles.params[0].scale - 640 / 3840) < 1e-9 and tiles.params[1].scale == 0.5
+
+
+def test_non_jpeg_uploads_are_only_tiled_above_the_threshold():
+    policy = TilingPolicy(mode="auto")
+    small = np.zeros((480, 640, 3), dtype=np.uint8)
+    large = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    for ext, params in ((".png", []), (".webp", [cv2.IMWRITE_WEBP_QUALITY, 80]), (".bmp", [])):
+        assert not policy.should_tile(cv2.imencode(ext, small, params)[1].tobytes(), 640), ext
+        assert policy.should_tile(cv2.imencode(ext, large, params)[1].tobytes(), 640), ext
+    assert image_dimensions(cv2.imencode(".webp", small, [cv2.IMWRITE_WEBP_QUALITY, 101])[1].tobytes()) == (640, 480)
+    assert image_dimensions(b"GIF89a") is None
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.workers import Overloaded, WorkerPool
+from tests.helpers import FakeSession, jpeg, upload
+
+
+def test_admit_rejects_beyond_max_pending_and_frees_slots():
+    pool = WorkerPool(max_workers=1, max_pending=2, retry_after=3)
+    try:
+        with pool.admit(), pool.admit():
+            with pytest.raises(Overloaded) as rejected:
+                with pool.admit():
+                    pass
+            assert rejected.value.retry_after == 3 and pool.in_flight == 2
+        with pool.admit():
+            assert pool.in_flight == 1
+        assert pool.stats()["rejected"] == 1 and pool.in_flight == 0
+    finally:
+        pool.shutdown()
+
+
+def test_bulk_admission_charges_several_slots_capped_at_the_pool():
+    pool = WorkerPool(max_workers=1, max_pending=4)
+    try:
+        with pool.admit(slots=3):
+            assert pool.in_flight == 3
+            with pytest.raises(Overloaded):
+                with pool.admit(slots=2):
+                    pass
+        with pool.admit(slots=10):  # more than the pool holds: runs alone
+            assert pool.in_flight == 4
+        assert pool.in_flight == 0
+    finally:
+        pool.shutdown()
+
+
+def test_saturated_pool_answers_503_with_retry_after(serve):
+    session = FakeSession(delay=0.3)
+    with serve(session=session, MAX_PENDING_REQUESTS="1", RETRY_AFTER_SECONDS="2") as (client, _):
+        busy = {}
+
+        def send():
+            busy["response"] = client.post("/detect/s1", files=upload(jpeg()))
+
+        slow = threading.Thread(target=send)
+        slow.start()
+        for _ in range(100):
+            if client.get("/stats").json()["workers"]["in_flight"]:
+                break
+            time.sleep(0.005)
+        rejected = client.post("/detect/s2", files=upload(jpeg(hazard=None)))
+        assert client.get("/health").status_code == 200
+        slow.join()
+
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "2"
+    assert busy["response"].status_code == 200
+
+
+def test_process_pool_warm_up_starts_every_worker():
+    pool = WorkerPool(kind="process", max_workers=2)
+    try:
+        asyncio.run(asyncio.wait_for(pool.warm_up(), 60))
+    finally:
+        pool.shutdown()
+
+
+def test_api_on_a_process_pool_becomes_ready_and_detects(serve):
+    with serve(WORKER_POOL_KIND="process", WORKER_POOL_SIZE="2") as (client, session):
+        response = client.post("/detect/s1", files=upload(jpeg()))
+    assert response.status_code == 200 and response.json()["detections_count"] == 1
+    assert session.batch_sizes == [1]
+
+
+def test_shadow_work_does_not_queue_behind_live_inference():
+    pool = WorkerPool(max_workers=1, inference_workers=1)
+    release = threading.Event()
+
+    async def scenario():
+        live = asyncio.ensure_future(pool.run_inference(release.wait, 5))
+        await asyncio.sleep(0.01)
+        shadow = await asyncio.wait_for(pool.run_shadow(threading.current_thread), 1)
+        release.set()
+        await live
+        return shadow.name
+
+    try:
+        assert asyncio.run(scenario()).startswith("detect-shadow")
+    finally:
+        release.set()
+        pool.shutdown()